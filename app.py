@@ -2,37 +2,38 @@ import streamlit as st
 import time
 import datetime
 import extra_streamlit_components as stx
-from modules.rag_engine import RAGEngine
-from modules.storage_client import StorageClient
-from modules.llm_client import LLMClient
+from modules.rag_engine import get_rag_engine, merge_date_results
+from modules.storage_client import get_storage_client
+from modules.storage_manifest import pdf_candidate
+from modules.llm_client import get_llm_client
 from modules.models import MODELS, DEFAULT_MODEL_ID, get_model_by_id
 from modules.translations import TRANSLATIONS
 from streamlit_tree_select import tree_select
 from modules.tree_utils import build_folder_tree, load_folders_from_json
-from modules.chat_history import ChatHistoryManager
+from modules.chat_history import get_history_manager
+from modules.answer_cache import get_answer_cache, get_response_cache
+from modules.tracing import get_tracer
+from modules.query_planner import plan_query, plan_standard_query, local_search_terms, detect_language
+from modules.preview_service import get_preview_service, PREVIEW_LATE_WAIT_SECONDS
+from modules.model_router import route_model
+from modules.date_parser import extract_date_filter, RANGE_SEPARATOR
+from modules.history_compactor import compact_history, start_summary_update, empty_summary_state
 import os
 from pathlib import Path
 
 # Helper Functions
-def convert_to_pdf_path(file_path: str) -> str:
+def get_file_links(sources: list) -> dict:
     """
-    Convert markdown file paths to their PDF equivalents.
-    - .md files: xxx/file.md → xxx/pdf/file.pdf
+    File to link for each source without a Google Drive link, with its signed URL.
+    - .md files: xxx/file.md → xxx/pdf/file.pdf, or the .md itself if no PDF is uploaded
     - .txt files: keep as-is (no PDF version)
-    
-    Args:
-        file_path: Original file path from database (e.g., "data/.../file.md")
-    
+
     Returns:
-        Converted path if .md, otherwise original path
+        {file_path: (display path, URL or None)} (see StorageClient.get_display_links)
     """
-    if file_path.endswith('.md'):
-        path_obj = Path(file_path)
-        # Insert 'pdf/' directory before filename and change extension
-        pdf_path = path_obj.parent / 'pdf' / path_obj.with_suffix('.pdf').name
-        return str(pdf_path)
-    # Keep .txt and other formats as-is
-    return file_path
+    return st.session_state.storage.get_display_links([
+        source['file_path'] for source in sources if not source.get('google_drive_link')
+    ])
 
 # Page Config
 st.set_page_config(
@@ -51,6 +52,112 @@ st.set_page_config(
 # cookie_manager = get_manager()
 cookie_manager = stx.CookieManager()
 
+def load_message_page(conversation_id: str, before_id: int = None) -> list:
+    """
+    Fetches one page of a stored conversation (the newest messages, or those
+    older than before_id) in UI format and records the pagination cursor.
+    """
+    msgs, older_count = st.session_state.history_manager.get_messages_page(conversation_id, before_id=before_id)
+    page = []
+    for m in msgs:
+        msg_obj = {"role": m["role"], "content": m["content"]}
+        if m.get("sources"):
+            msg_obj["sources"] = m["sources"]
+        page.append(msg_obj)
+    # Stored sources are compact references: restore text only where no preview exists
+    st.session_state.history_manager.hydrate_sources(page)
+    get_preview_service().hydrate_messages(page)
+    if msgs:
+        st.session_state.history_cursor = msgs[0]["id"]
+    # Older messages not loaded (also the index offset for the rolling summary)
+    st.session_state.history_offset = older_count
+    return page
+
+
+def open_conversation(conversation_id: str):
+    """Loads a stored conversation (latest page only; older messages on demand)."""
+    st.session_state.current_conversation_id = conversation_id
+    st.session_state.history_cursor = None
+    st.session_state.messages = load_message_page(conversation_id)
+    st.session_state.history_summary = st.session_state.history_manager.get_summary(conversation_id)
+
+
+def adopt_summary_update():
+    """
+    Takes over the rolling summary computed in the background after an
+    earlier turn, if it has finished and still belongs to this conversation.
+    """
+    job = st.session_state.get("summary_job")
+    if not job or not job["future"].done():
+        return
+    st.session_state.summary_job = None
+    if job["conversation_id"] != st.session_state.current_conversation_id:
+        return
+    if job["base_count"] != st.session_state.history_summary.get("summary_message_count"):
+        return
+    try:
+        st.session_state.history_summary = job["future"].result()
+    except Exception as e:
+        print(f"History summary update failed: {e!r}")
+
+
+def render_source_list(sources: list, file_links: dict = None):
+    """
+    Sources expander under an answer (file links, scores, previews).
+    file_links: links already signed for these sources (see get_file_links);
+    signed here when not given.
+    """
+    if file_links is None:
+        file_links = get_file_links(sources)
+    with st.expander(t["view_sources"], expanded=False):
+        for i, source in enumerate(sources):
+            file_path = source['file_path']
+            similarity = source['similarity']
+            doc_id = source.get('id') # Ensure your RAG search returns 'id'
+
+            # Get document-level metadata if available
+            chunk_count = source.get('chunk_count')
+            doc_score = source.get('doc_score')
+
+            # PDF rendition (or the original) for display
+            display_path, signed_url = file_links.get(file_path) or (pdf_candidate(file_path)[0], None)
+            # CLEANUP: Show only filename
+            display_name = os.path.basename(display_path)
+
+            # CONTENT PREVIEW
+            # Check for translated preview first
+            if 'translated_preview' in source:
+                preview = source['translated_preview']
+            else:
+                content = source.get('content', '')
+                # If aggregated, might be in 'all_chunks'
+                if not content and 'all_chunks' in source and source['all_chunks']:
+                     content = source['all_chunks'][0].get('content', '')
+
+                preview = content[:200].replace('\n', ' ') + "..." if content else ""
+
+            # Check for Google Drive link first
+            url = source.get('google_drive_link')
+            if not url:
+                # Fallback to signed URL (use converted path)
+                url = signed_url
+
+            # Display with chunk count if available
+            score_display = f"{doc_score:.2f}" if doc_score else f"{similarity:.2f}"
+            chunk_info = f", {chunk_count} chunks" if chunk_count and chunk_count > 1 else ""
+
+            st.markdown(f"**{i+1}. {display_name}** (Score: {score_display}{chunk_info})")
+            if preview:
+                st.caption(f"_{preview}_")
+
+            if url:
+                st.markdown(f"[{t['open_file']}]({url})")
+            else:
+                # Show debug info in tooltip
+                debug_msg = st.session_state.storage.get_debug_info(display_path)
+                st.markdown(f"*{t['link_unavailable']}*", help=debug_msg)
+
+
 def check_password():
     """Returns `True` if the user had the correct password."""
     
@@ -110,17 +217,26 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 
 if "history_manager" not in st.session_state:
-    st.session_state.history_manager = ChatHistoryManager()
+    # Engines are process-wide singletons; session_state only holds references
+    st.session_state.history_manager = get_history_manager()
 
 if "current_conversation_id" not in st.session_state:
     st.session_state.current_conversation_id = None
 
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = empty_summary_state()
+
+if "history_offset" not in st.session_state:
+    # Paginated loading: id of the oldest loaded message and how many older ones remain
+    st.session_state.history_cursor = None
+    st.session_state.history_offset = 0
+
 if "rag" not in st.session_state:
     # Initialize engines only once
     try:
-        st.session_state.rag = RAGEngine()
-        st.session_state.storage = StorageClient()
-        st.session_state.llm = LLMClient()
+        st.session_state.rag = get_rag_engine()
+        st.session_state.storage = get_storage_client()
+        st.session_state.llm = get_llm_client()
         st.session_state.initialized = True
     except Exception as e:
         t_temp = TRANSLATIONS.get(st.session_state.get('language', 'English'), TRANSLATIONS['English'])
@@ -145,12 +261,40 @@ with st.sidebar:
             if st.button(f"➕ {t['new_chat']}", use_container_width=True):
                 st.session_state.messages = []
                 st.session_state.current_conversation_id = None
+                st.session_state.history_summary = empty_summary_state()
+                st.session_state.history_cursor = None
+                st.session_state.history_offset = 0
                 st.rerun()
         
         # Toggle for delete mode
         with col_manage:
             delete_mode = st.toggle("🗑️", key="delete_mode_toggle", help=t["enable_delete_mode"])
 
+        # Search across all past conversations (titles and messages)
+        search_query = st.text_input(t["search_history"], key="history_search_query", placeholder=t["search_history_placeholder"])
+        if search_query.strip():
+            search = st.session_state.get("history_search")
+            if not search or search["query"] != search_query:
+                results, has_more = st.session_state.history_manager.search(search_query)
+                search = {"query": search_query, "results": results, "has_more": has_more}
+                st.session_state.history_search = search
+
+            if not search["results"]:
+                st.caption(t["search_history_no_results"])
+            for hit in search["results"]:
+                hit_title = hit['title'] if len(hit['title']) <= 25 else hit['title'][:25] + "..."
+                if st.button(f"🔎 {hit_title}", key=f"search_{hit['id']}", use_container_width=True):
+                    open_conversation(hit['id'])
+                    st.rerun()
+                if hit.get('snippet'):
+                    st.caption(hit['snippet'][:120].replace('\n', ' '))
+            if search["has_more"] and st.button(t["search_history_more"], key="history_search_more"):
+                more, has_more = st.session_state.history_manager.search(search_query, offset=len(search["results"]))
+                search["results"].extend(more)
+                search["has_more"] = has_more
+                st.rerun()
+            st.markdown("---")
+
         recent_convos = st.session_state.history_manager.get_recent_conversations()
         
         if not recent_convos:
@@ -173,6 +317,9 @@ with st.sidebar:
                         if st.session_state.current_conversation_id == convo['id']:
                             st.session_state.messages = []
                             st.session_state.current_conversation_id = None
+                            st.session_state.history_summary = empty_summary_state()
+                            st.session_state.history_cursor = None
+                            st.session_state.history_offset = 0
                         st.rerun()
             else:
                 # Normal mode: Click to load
@@ -180,16 +327,7 @@ with st.sidebar:
                 type_prefix = "📂" if st.session_state.current_conversation_id == convo['id'] else "📄"
                 
                 if st.button(f"{type_prefix} {title}", key=convo['id'], use_container_width=True):
-                    # Load conversation
-                    st.session_state.current_conversation_id = convo['id']
-                    msgs = st.session_state.history_manager.get_messages(convo['id'])
-                    # Convert DB format to UI format
-                    st.session_state.messages = []
-                    for m in msgs:
-                        msg_obj = {"role": m["role"], "content": m["content"]}
-                        if m.get("sources"):
-                            msg_obj["sources"] = m["sources"]
-                        st.session_state.messages.append(msg_obj)
+                    open_conversation(convo['id'])
                     st.rerun()
 
     # Navigation
@@ -324,6 +462,10 @@ with st.sidebar:
         
         if st.button(t["clear_history"]):
             st.session_state.messages = []
+            st.session_state.history_summary = empty_summary_state()
+            st.session_state.summary_job = None
+            st.session_state.history_cursor = None
+            st.session_state.history_offset = 0
             st.rerun()
 
 if page == t.get("nav_docs", "Documentation"):
@@ -431,49 +573,25 @@ elif page == t["nav_chat"]:
     st.markdown(t["app_intro"])
 
     # Display Chat History
+    if st.session_state.current_conversation_id and st.session_state.history_offset:
+        if st.button(t["load_older"].format(count=st.session_state.history_offset)):
+            older = load_message_page(st.session_state.current_conversation_id, before_id=st.session_state.history_cursor)
+            st.session_state.messages = older + st.session_state.messages
+            st.rerun()
+
+    # Sign every file link shown below in one batch (cached across reruns)
+    file_links = get_file_links([
+        source for message in st.session_state.messages for source in message.get("sources") or []
+    ])
+
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            if message.get("cached"):
+                st.caption(t["cached_marker"])
             # If there are source documents attached to the message, display them
             if "sources" in message:
-                with st.expander(t["view_sources"]):
-                    for i, source in enumerate(message["sources"]):
-                        file_path = source['file_path']
-                        similarity = source['similarity']
-                        doc_score = source.get('doc_score')
-                        chunk_count = source.get('chunk_count')
-                        
-                        # Convert to PDF path for display
-                        display_path = convert_to_pdf_path(file_path)
-                        display_name = os.path.basename(display_path)
-                        
-                        # Content Preview
-                        if 'translated_preview' in source:
-                            preview = source['translated_preview']
-                        else:
-                            content = source.get('content', '')
-                            if not content and 'all_chunks' in source and source['all_chunks']:
-                                 content = source['all_chunks'][0].get('content', '')
-                            preview = content[:200].replace('\n', ' ') + "..." if content else ""
-                        
-                        # Check for Google Drive link first
-                        url = source.get('google_drive_link')
-                        if not url:
-                            # Fallback to signed URL (use converted path)
-                            url = st.session_state.storage.get_signed_url(display_path)
-                        
-                        # Display
-                        score_val = doc_score if doc_score else similarity
-                        chunk_info = f", {chunk_count} chunks" if chunk_count and chunk_count > 1 else ""
-                        
-                        st.markdown(f"**{i+1}. {display_name}** (Score: {score_val:.2f}{chunk_info})")
-                        if preview:
-                            st.caption(f"_{preview}_")
-                            
-                        if url:
-                            st.markdown(f"[{t['open_file']}]({url})")
-                        else:
-                            st.markdown(f"*{t['link_unavailable']}*")
+                render_source_list(message["sources"], file_links)
 
     # Chat Input
     if prompt := st.chat_input(t["chat_placeholder"]):
@@ -496,131 +614,213 @@ elif page == t["nav_chat"]:
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # 2. Assistant Response
-        with st.chat_message("assistant"):
+        # 2. Assistant Response (traced per stage; see modules/tracing.py)
+        with st.chat_message("assistant"), get_tracer().trace("chat_turn", deep_search=use_deep_search, model=selected_model.api_id):
             message_placeholder = st.empty()
             message_placeholder.markdown(t["searching"])
             
-            # Get recent history for context (exclude current message)
-            recent_history = st.session_state.messages[:-1][-5:] if len(st.session_state.messages) > 1 else []
+            # Get recent history for context (exclude current message):
+            # the last few messages verbatim plus a rolling summary of everything older
+            adopt_summary_update()
+            recent_history, history_summary = compact_history(
+                st.session_state.messages[:-1],
+                st.session_state.history_summary,
+                offset=st.session_state.history_offset
+            )
             
-            # A. Optimize Query
-            start_time = time.time()
-            print(f"[{time.strftime('%X')}] Starting query optimization...")
+            # 0. Semantic Answer Cache (standalone questions only - follow-ups depend on history)
+            answer_cache = get_answer_cache()
+            cached = None
+            cached_response = None
+            preview_job = None
+            degraded = False
+            partial = False
+            prompt_embedding = None
+            search_settings = {"deep_search": use_deep_search, "match_count": match_count, "threshold": threshold}
+            if not recent_history:
+                if answer_cache.needs_corpus_check():
+                    answer_cache.set_corpus_version(st.session_state.rag.get_corpus_version())
+                prompt_embedding = st.session_state.rag.embed_query(prompt)
+                cached = answer_cache.lookup(prompt, prompt_embedding, selected_folders, selected_model.api_id, search_settings)
+
+            if cached:
+                print(f"[{time.strftime('%X')}] Answer cache hit (similarity {cached['similarity']:.3f}): {cached['query']}")
+                response_text = cached["answer"]
+                sources = cached["sources"]
+                get_preview_service().fill_known(sources, detect_language(prompt))
+            else:
+                # A. Optimize Query
+                start_time = time.time()
+                print(f"[{time.strftime('%X')}] Starting query optimization...")
             
-            if use_deep_search:
-                # Deep Search Mode
-                query_variants = st.session_state.llm.expand_query_multilingual(
-                    prompt, 
-                    recent_history, 
-                    model_id=selected_model.api_id
-                )
-                print(f"[{time.strftime('%X')}] Deep Search Variants: {query_variants}")
+                if use_deep_search:
+                    # Deep Search Mode
+                    # Local planner first; the LLM expansion only runs for follow-ups or when translation is needed
+                    query_variants = plan_query(prompt, recent_history)
+                    speculative = None
+                    if query_variants is None:
+                        # Speculative retrieval: start the raw-query vector search and the local
+                        # keyword/date fast paths now, in parallel with the LLM expansion
+                        local_terms = local_search_terms(prompt)
+                        speculative = st.session_state.rag.start_speculative_search(
+                            prompt,
+                            match_count=match_count,
+                            threshold=threshold,
+                            folder_filters=selected_folders if selected_folders else None,
+                            keywords=local_terms["keywords"],
+                            date_filter=local_terms["date_filter"]
+                        )
+                        query_variants = st.session_state.llm.expand_query_multilingual(
+                            prompt, 
+                            recent_history, 
+                            model_id=route_model("expand_query", selected_model.api_id),
+                            history_summary=history_summary
+                        )
+                        # A date written in the question itself is parsed locally (no guessed years)
+                        if local_terms["date_filter"]:
+                            query_variants = dict(query_variants, date_filter=local_terms["date_filter"])
+                    print(f"[{time.strftime('%X')}] Deep Search Variants: {query_variants}")
                 
-                with st.expander(f"🔍 {t['deep_search_details']}", expanded=False):
-                    st.write(f"{t['searching_with']}:")
-                    st.json(query_variants)
+                    with st.expander(f"🔍 {t['deep_search_details']}", expanded=False):
+                        st.write(f"{t['searching_with']}:")
+                        st.json(query_variants)
                 
-                # B. Retrieve Context (Multilingual)
-                search_start = time.time()
-                results = st.session_state.rag.search_multilingual(
-                    query_variants,
-                    match_count=match_count,
-                    threshold=threshold,
-                    folder_filters=selected_folders if selected_folders else None
-                )
+                    # B. Retrieve Context (Multilingual)
+                    search_start = time.time()
+                    with get_tracer().span("search.multilingual"):
+                        results = st.session_state.rag.search_multilingual(
+                            query_variants,
+                            match_count=match_count,
+                            threshold=threshold,
+                            folder_filters=selected_folders if selected_folders else None,
+                            speculative=speculative
+                        )
                 
-                # For the LLM generation, we use the ORIGINAL query intent but pass the rich context
-                # We can pass the 'translated' query as the 'optimized_query' for the LLM to understand context better if it was JP
-                optimized_query = query_variants.get('translated', prompt)
+                    # For the LLM generation, we use the ORIGINAL query intent but pass the rich context
+                    # We can pass the 'translated' query as the 'optimized_query' for the LLM to understand context better if it was JP
+                    optimized_query = query_variants.get('translated') or prompt
 
-            else:
-                # Standard Mode
-                optimization_result = st.session_state.llm.optimize_query(
-                    prompt, 
-                    recent_history, 
-                    model_id=selected_model.api_id
-                )
-                optimized_query = optimization_result.get("query", prompt)
-                date_filter = optimization_result.get("date_filter")
+                else:
+                    # Standard Mode
+                    # Standalone questions need no rewrite; only follow-ups go to the LLM
+                    optimization_result = plan_standard_query(prompt, recent_history)
+                    if optimization_result is None:
+                        optimization_result = st.session_state.llm.optimize_query(
+                            prompt, 
+                            recent_history, 
+                            model_id=route_model("optimize_query", selected_model.api_id),
+                            history_summary=history_summary
+                        )
+                    optimized_query = optimization_result.get("query", prompt)
+                    # Dates in the question are parsed locally; the LLM date only covers references to earlier turns
+                    date_filter = extract_date_filter(prompt) or optimization_result.get("date_filter")
                 
-                print(f"[{time.strftime('%X')}] Optimization done ({time.time() - start_time:.2f}s): {optimized_query} (Date: {date_filter})")
+                    print(f"[{time.strftime('%X')}] Optimization done ({time.time() - start_time:.2f}s): {optimized_query} (Date: {date_filter})")
                 
-                if optimized_query != prompt:
-                    st.caption(f"🔍 Searched for: {optimized_query}")
+                    if optimized_query != prompt:
+                        st.caption(f"🔍 Searched for: {optimized_query}")
                 
-                # B. Retrieve Context (Standard + Date)
-                search_start = time.time()
-                print(f"[{time.strftime('%X')}] Starting vector search with {len(selected_folders)} folders selected...")
+                    # B. Retrieve Context (Standard + Date)
+                    search_start = time.time()
+                    print(f"[{time.strftime('%X')}] Starting vector search with {len(selected_folders)} folders selected...")
                 
-                # 1. Vector Search
-                results = st.session_state.rag.search(
-                    optimized_query, 
-                    match_count=match_count, 
-                    threshold=threshold,
-                    folder_filters=selected_folders if selected_folders else None
-                )
+                    # 1. Vector Search
+                    results = st.session_state.rag.search(
+                        optimized_query, 
+                        match_count=match_count, 
+                        threshold=threshold,
+                        folder_filters=selected_folders if selected_folders else None
+                    )
                 
-                # 2. Date Search (if applicable)
-                if date_filter:
-                    print(f"[{time.strftime('%X')}] Performing date search for: {date_filter}")
-                    date_results = st.session_state.rag.search_date(date_filter, match_count=match_count)
+                    # 2. Date Search (if applicable)
+                    if date_filter:
+                        print(f"[{time.strftime('%X')}] Performing date search for: {date_filter}")
+                        date_results = st.session_state.rag.search_date(date_filter, match_count=match_count)
                     
-                    # Merge results (prioritize date results)
-                    # Create a map of existing IDs to avoid duplicates
-                    existing_ids = {r['id'] for r in results}
-                    
-                    for dr in date_results:
-                        if dr['id'] not in existing_ids:
-                            results.insert(0, dr) # Add to top
-                            existing_ids.add(dr['id'])
-                        else:
-                            # If it exists, update score to the boosted date score
-                            for r in results:
-                                if r['id'] == dr['id']:
-                                    r['similarity'] = max(r['similarity'], dr['similarity'])
-                                    break
-                    
-                    # Re-sort by similarity
-                    results.sort(key=lambda x: x['similarity'], reverse=True)
-                    results = results[:match_count] # Trim to match_count
+                        # A single day goes first; a range boosts results dated inside it (merge_date_results)
+                        result_dates = None
+                        if RANGE_SEPARATOR in date_filter:
+                            result_dates = st.session_state.rag.get_dates([r['id'] for r in results])
+                        results = merge_date_results(results, date_results, date_filter, match_count, result_dates)
 
-            print(f"[{time.strftime('%X')}] Search complete ({time.time() - search_start:.2f}s). Found {len(results)} unique results.")
+                print(f"[{time.strftime('%X')}] Search complete ({time.time() - search_start:.2f}s). Found {len(results)} unique results.")
             
-            if not results:
-                response_text = t["no_results"]
-                sources = []
-            else:
-                # C. Generate Answer
-                gen_start = time.time()
-                print(f"[{time.strftime('%X')}] Generating answer...")
-                message_placeholder.markdown(t["analyzing"].format(model=selected_model.name))
+                if not results:
+                    response_text = t["no_results"]
+                    sources = []
+                else:
+                    # C. Generate Answer
+                    gen_start = time.time()
+                    print(f"[{time.strftime('%X')}] Generating answer...")
+                    message_placeholder.markdown(t["analyzing"].format(model=selected_model.name))
+
+                    # Same question over the same retrieved evidence with the same model -> reuse the answer
+                    language = detect_language(prompt)
+                    response_cache = get_response_cache()
+                    response_key = response_cache.make_key(prompt, results, selected_model.api_id, language, recent_history, history_summary)
+                    cached_response = response_cache.get(response_key)
                 
-                # UPDATED CALL: Unpack tuple
-                response_text, previews = st.session_state.llm.generate_response(
-                    prompt, 
-                    results, 
-                    history=recent_history,
-                    model_id=selected_model.api_id
-                )
+                    if cached_response:
+                        print(f"[{time.strftime('%X')}] Response cache hit")
+                        response_text = cached_response["answer"]
+                        get_preview_service().apply(results, cached_response["previews"])
+                        # Previews that were still running when the answer was cached
+                        get_preview_service().fill_known(results, language)
+                    else:
+                        # Previews come from a separate cheap call running alongside the answer
+                        preview_service = get_preview_service()
+                        preview_job = preview_service.start(results, language)
+
+                        # Stream the answer into the placeholder as it arrives
+                        response_text, complete = st.session_state.llm.generate_response_stream(
+                            prompt, 
+                            results, 
+                            history=recent_history,
+                            model_id=selected_model.api_id,
+                            on_answer=lambda answer_so_far: message_placeholder.markdown(answer_so_far + "▌"),
+                            history_summary=history_summary
+                        )
                 
-                # Inject previews into results
-                for i, res in enumerate(results):
-                    idx = str(i + 1)
-                    if idx in previews:
-                        res['translated_preview'] = previews[idx]
+                        # Degraded mode: the model failed or ran out of time -> show the ranked sources only
+                        degraded = response_text is None
+                        if degraded:
+                            response_text = t["degraded_answer"]
+                        elif not complete:
+                            # Cut off mid-answer: keep what was streamed, marked (also in the saved history)
+                            partial = True
+                            response_text = f"{response_text}\n\n{t['partial_answer']}"
+
+                        # Previews land on the results when their job finishes (now if it already has);
+                        # the answer doesn't wait for them, the sources below are re-rendered instead
+                        preview_service.apply_when_done(preview_job, results)
                 
-                print(f"[{time.strftime('%X')}] Generation complete ({time.time() - gen_start:.2f}s)")
-                sources = results
+                        print(f"[{time.strftime('%X')}] Generation complete ({time.time() - gen_start:.2f}s)")
+
+                        if not degraded and not partial:
+                            response_cache.put(
+                                response_key,
+                                response_text,
+                                {r['id']: r['translated_preview'] for r in results if 'translated_preview' in r}
+                            )
+                    sources = results
+
+                # Remember the answer for near-duplicate questions
+                if prompt_embedding is not None and sources and not degraded and not partial:
+                    answer_cache.store(prompt, prompt_embedding, selected_folders, selected_model.api_id, response_text, sources, search_settings)
 
             # D. Display Final Response
             message_placeholder.markdown(response_text)
+            if cached:
+                st.caption(t["cached_answer"].format(query=cached["query"]))
+            elif cached_response:
+                st.caption(t["cached_marker"])
             
             # E. Save to History
             st.session_state.messages.append({
                 "role": "assistant", 
                 "content": response_text,
-                "sources": sources
+                "sources": sources,
+                "cached": bool(cached or cached_response)
             })
             
             # Save Assistant Message to DB
@@ -631,53 +831,35 @@ elif page == t["nav_chat"]:
                     response_text,
                     sources=sources
                 )
+
+            # F. Fold messages that left the verbatim window into the rolling summary.
+            # Runs in the background; the result is adopted at the start of the next turn.
+            if not st.session_state.get("summary_job"):
+                conversation_id = st.session_state.current_conversation_id
+                history_manager = st.session_state.history_manager
+                summary_future = start_summary_update(
+                    st.session_state.llm,
+                    st.session_state.messages,
+                    st.session_state.history_summary,
+                    offset=st.session_state.history_offset,
+                    on_updated=lambda state: history_manager.save_summary(conversation_id, state)
+                )
+                if summary_future:
+                    st.session_state.summary_job = {
+                        "future": summary_future,
+                        "conversation_id": conversation_id,
+                        "base_count": st.session_state.history_summary.get("summary_message_count")
+                    }
         
         # D. Display Sources (Immediate view)
         if sources:
-            with st.expander(t["view_sources"], expanded=False):
-                for i, source in enumerate(sources):
-                    file_path = source['file_path']
-                    similarity = source['similarity']
-                    doc_id = source.get('id') # Ensure your RAG search returns 'id'
-                    
-                    # Get document-level metadata if available
-                    chunk_count = source.get('chunk_count')
-                    doc_score = source.get('doc_score')
-                    
-                    # Convert to PDF path for display
-                    display_path = convert_to_pdf_path(file_path)
-                    # CLEANUP: Show only filename
-                    display_name = os.path.basename(display_path)
-                    
-                    # CONTENT PREVIEW
-                    # Check for translated preview first
-                    if 'translated_preview' in source:
-                        preview = source['translated_preview']
-                    else:
-                        content = source.get('content', '')
-                        # If aggregated, might be in 'all_chunks'
-                        if not content and 'all_chunks' in source and source['all_chunks']:
-                             content = source['all_chunks'][0].get('content', '')
-                        
-                        preview = content[:200].replace('\n', ' ') + "..." if content else ""
-
-                    # Check for Google Drive link first
-                    url = source.get('google_drive_link')
-                    if not url:
-                        # Fallback to signed URL (use converted path)
-                        url = st.session_state.storage.get_signed_url(display_path)
-                    
-                    # Display with chunk count if available
-                    score_display = f"{doc_score:.2f}" if doc_score else f"{similarity:.2f}"
-                    chunk_info = f", {chunk_count} chunks" if chunk_count and chunk_count > 1 else ""
-                    
-                    st.markdown(f"**{i+1}. {display_name}** (Score: {score_display}{chunk_info})")
-                    if preview:
-                        st.caption(f"_{preview}_")
-                    
-                    if url:
-                        st.markdown(f"[{t['open_file']}]({url})")
-                    else:
-                        # Show debug info in tooltip
-                        debug_msg = st.session_state.storage.get_debug_info(display_path)
-                        st.markdown(f"*{t['link_unavailable']}*", help=debug_msg)
+            sources_placeholder = st.empty()
+            with sources_placeholder.container():
+                render_source_list(sources)
+            # Previews that missed the wait are filled in as soon as they arrive
+            if preview_job is not None and not preview_job.done():
+                late_previews = get_preview_service().collect(preview_job, timeout=PREVIEW_LATE_WAIT_SECONDS)
+                if late_previews:
+                    get_preview_service().apply(sources, late_previews)
+                    with sources_placeholder.container():
+                        render_source_list(sources)
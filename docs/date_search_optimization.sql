@@ -31,3 +31,34 @@ begin
   limit match_count;
 end;
 $$;
+
+-- Same as match_documents_by_date for an inclusive date range
+-- ("Dec 18-20", "last week", "先月"; see modules/date_parser.py).
+create or replace function match_documents_by_date_range (
+  start_date text,
+  end_date text,
+  match_count int
+)
+returns table (
+  id bigint,
+  content text,
+  file_path text,
+  similarity real,
+  google_drive_link text
+)
+language plpgsql
+as $$
+begin
+  return query
+  select
+    v.id,
+    v.content,
+    v.file_path,
+    2.0::real as similarity,
+    v.google_drive_link
+  from evidence_vectors v
+  where v.date_prefix between start_date::date and end_date::date
+  order by length(v.content) desc
+  limit match_count;
+end;
+$$;
@@ -0,0 +1,234 @@
+import re
+import json
+import time
+import hashlib
+import datetime
+import threading
+import numpy as np
+import streamlit as st
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from modules.preview_store import content_hash
+from modules.query_cache import normalize_history
+from modules.date_parser import extract_date_filter, find_date_mentions
+from modules.query_planner import detect_language
+
+# Paraphrases of the same question ("what happened on Dec 18" / "12月18日に何があった")
+# land very close together in E5 space; unrelated questions rarely exceed ~0.9.
+DEFAULT_SIMILARITY_THRESHOLD = 0.93
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+# How often (seconds) the corpus fingerprint is re-read from the database
+CORPUS_CHECK_INTERVAL = 300
+
+# Response cache (exact retrieved context)
+RESPONSE_TTL_SECONDS = 7 * 24 * 3600
+RESPONSE_MAX_ENTRIES = 1000
+
+# Entities that must match exactly for a semantic hit: numbers and katakana
+# runs (foreign names). Capitalized words and kanji runs are mostly common
+# nouns ("Board", 契約書) and would keep paraphrases apart; other names are
+# left to the similarity threshold.
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*')
+_NAME_RE = re.compile(r'[ァ-ヺ][ァ-ヺー]+')
+
+
+def query_entities(query: str) -> tuple:
+    """
+    The parts of a question that E5 similarity glosses over: the date it asks
+    about, other numbers and katakana names. "What happened on Dec 18" and
+    "... Dec 19" embed above the threshold but get different entities.
+    """
+    text = query.strip()
+    # Date mentions are compared through the resolved date_filter, not their digits
+    for mention in reversed(find_date_mentions(text, datetime.date.today())):
+        text = text[:mention.start] + " " + text[mention.end:]
+    numbers = sorted(set(_NUMBER_RE.findall(text)))
+    names = sorted(set(_NAME_RE.findall(text)))
+    return (extract_date_filter(query), tuple(numbers), tuple(names))
+
+
+class SemanticAnswerCache:
+    """
+    Process-wide cache of final answers keyed on the query embedding.
+
+    A lookup hits when a stored question is within `threshold` cosine similarity
+    of the new question AND was asked with the same folder selection, model and
+    search settings, in the same language (the answer's language), AND
+    mentions the same dates, numbers and names (query_entities).
+    Entries expire after `ttl_seconds` and are all dropped when the corpus
+    fingerprint changes (i.e. after a re-ingest).
+    """
+
+    def __init__(self, threshold: float = DEFAULT_SIMILARITY_THRESHOLD, ttl_seconds: int = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._corpus_version: Optional[str] = None
+        self._corpus_checked_at = 0.0
+
+    @staticmethod
+    def _scope(query: str, folders: Optional[List[str]], model_id: str, settings: Dict[str, Any] = None) -> tuple:
+        """
+        Normalizes the non-semantic part of the key. `settings` holds the
+        retrieval options the answer depends on (deep_search, match_count, threshold).
+        """
+        return (
+            tuple(sorted(folders)) if folders else (),
+            model_id,
+            tuple(sorted((settings or {}).items())),
+            detect_language(query),
+            query_entities(query)
+        )
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def needs_corpus_check(self) -> bool:
+        """True if the corpus fingerprint should be re-read before the next lookup."""
+        return time.time() - self._corpus_checked_at > CORPUS_CHECK_INTERVAL
+
+    def set_corpus_version(self, version: Optional[str]):
+        """
+        Records the current corpus fingerprint. If it differs from the one the
+        cached answers were generated against, the cache is invalidated.
+        """
+        with self._lock:
+            self._corpus_checked_at = time.time()
+            if version is None:
+                return
+            if self._corpus_version is not None and version != self._corpus_version:
+                print(f"Corpus changed ({self._corpus_version} -> {version}), invalidating answer cache")
+                self._entries = []
+            self._corpus_version = version
+
+    def invalidate(self):
+        """Drops every cached answer."""
+        with self._lock:
+            self._entries = []
+
+    def lookup(self, query: str, embedding: List[float], folders: Optional[List[str]], model_id: str, settings: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the closest cached entry ({'answer', 'sources', 'query', 'similarity'})
+        or None if nothing is close enough.
+        """
+        scope = self._scope(query, folders, model_id, settings)
+        query_vec = self._normalize(embedding)
+        now = time.time()
+
+        with self._lock:
+            # Drop expired entries while we are here
+            self._entries = [e for e in self._entries if now - e['created_at'] < self.ttl_seconds]
+
+            best, best_score = None, self.threshold
+            for entry in self._entries:
+                if entry['scope'] != scope:
+                    continue
+                score = float(np.dot(query_vec, entry['embedding']))
+                if score >= best_score:
+                    best, best_score = entry, score
+
+            if best is None:
+                return None
+
+            return {
+                "answer": best['answer'],
+                "sources": [dict(s) for s in best['sources']],
+                "query": best['query'],
+                "similarity": best_score
+            }
+
+    def store(self, query: str, embedding: List[float], folders: Optional[List[str]], model_id: str, answer: str, sources: List[Dict[str, Any]], settings: Dict[str, Any] = None):
+        """Adds an answer to the cache, evicting the oldest entries beyond max_entries."""
+        entry = {
+            "query": query,
+            "embedding": self._normalize(embedding),
+            "scope": self._scope(query, folders, model_id, settings),
+            "answer": answer,
+            "sources": [dict(s) for s in sources],
+            "created_at": time.time()
+        }
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the question."""
+    return re.sub(r'[\s?？!！.。]+$', '', " ".join(query.lower().split()))
+
+
+class ResponseCache:
+    """
+    Exact cache of generated answers keyed on (normalized query, ordered
+    retrieved chunk ids + content hashes, model_id, language), plus the
+    conversation context for follow-ups.
+
+    Unlike SemanticAnswerCache this is checked after retrieval: the same
+    question over the same evidence with the same model gives the same answer,
+    so generation can be skipped. A re-ingested chunk changes its content hash
+    and therefore the key. Entries expire after `ttl_seconds`; beyond
+    `max_entries` the least recently used entry is evicted.
+    """
+
+    def __init__(self, ttl_seconds: int = RESPONSE_TTL_SECONDS, max_entries: int = RESPONSE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(query: str, results: List[Dict[str, Any]], model_id: str, language: str, history: List[Dict[str, Any]] = None, history_summary: str = None) -> str:
+        chunks = [[r.get('id'), content_hash(r.get('content') or '')] for r in results]
+        payload = json.dumps(
+            [normalize_query(query), chunks, model_id, language, normalize_history(history), history_summary or ""],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns {'answer', 'previews'} or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry['created_at'] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return {"answer": entry['answer'], "previews": dict(entry['previews'])}
+
+    def put(self, key: str, answer: str, previews: Dict[Any, str] = None):
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "previews": dict(previews or {}),
+                "created_at": time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drops every cached response."""
+        with self._lock:
+            self._entries.clear()
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Returns the process-wide response cache shared by all sessions."""
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_answer_cache() -> SemanticAnswerCache:
+    """Returns the process-wide answer cache shared by all sessions."""
+    return SemanticAnswerCache()
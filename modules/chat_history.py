@@ -1,18 +1,51 @@
 import streamlit as st
-from supabase import create_client, Client
-from typing import List, Dict, Any, Optional
+from supabase import Client
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
+import time
+import datetime
+import threading
+from modules.clients import get_supabase_client
+from modules.history_writer import HistoryWriter
+from modules.tracing import get_tracer
+
+# Fields kept per source in messages.sources. Chunk text is not stored (it is
+# already in evidence_vectors); hydrate_sources() re-reads it when needed.
+SOURCE_REF_FIELDS = ("id", "file_path", "similarity", "doc_score", "chunk_count", "translated_preview", "google_drive_link")
+SOURCE_FETCH_BATCH = 200
+# Messages per page when opening a conversation ("load older" fetches the next page)
+MESSAGE_PAGE_SIZE = 20
+MESSAGE_COLUMNS = "id, role, content, sources, created_at"
+# The sidebar list is re-read at most this often (writes from this process invalidate it)
+CONVERSATION_LIST_TTL_SECONDS = 30
+CONVERSATION_LIST_COLUMNS = "id, title, updated_at"
+# Conversations per page of search results
+SEARCH_PAGE_SIZE = 10
+
+
+def compact_sources(sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Reduces search results to the references shown in the sources panel."""
+    return [{k: s[k] for k in SOURCE_REF_FIELDS if s.get(k) is not None} for s in sources]
+
 
 class ChatHistoryManager:
     def __init__(self):
-        self.url = st.secrets["SUPABASE_URL"]
-        self.key = st.secrets["SUPABASE_KEY"]
-        self.client: Client = create_client(self.url, self.key)
+        self.client: Client = get_supabase_client()
+        # Messages are persisted off the request thread
+        self.writer = HistoryWriter(self.client, on_written=lambda rows: self.invalidate_conversation_list())
+        self._list_cache: Dict[int, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._list_lock = threading.Lock()
+
+    def invalidate_conversation_list(self):
+        """Drops the cached sidebar list (after creating, renaming, deleting or writing to a conversation)."""
+        with self._list_lock:
+            self._list_cache.clear()
 
     def create_conversation(self, title: str = "New Conversation") -> str:
         """Creates a new conversation and returns its ID."""
         try:
             response = self.client.table("conversations").insert({"title": title}).execute()
+            self.invalidate_conversation_list()
             if response.data:
                 return response.data[0]["id"]
         except Exception as e:
@@ -20,62 +53,179 @@ class ChatHistoryManager:
         return None
 
     def add_message(self, conversation_id: str, role: str, content: str, sources: List[Dict[str, Any]] = None):
-        """Adds a message to a conversation."""
+        """
+        Queues a message for the background writer and returns immediately.
+        created_at is stamped here so batched rows keep their real order.
+        """
         if not conversation_id:
             return
-            
-        try:
-            data = {
-                "conversation_id": conversation_id,
-                "role": role,
-                "content": content,
-                "sources": sources
-            }
-            self.client.table("messages").insert(data).execute()
-            
-            # Update conversation timestamp
-            self.client.table("conversations").update({"updated_at": "now()"}).eq("id", conversation_id).execute()
-            
-        except Exception as e:
-            print(f"Error adding message: {e}")
+
+        self.writer.enqueue({
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "sources": compact_sources(sources) if sources else sources,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        })
 
     def get_recent_conversations(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """Fetches recent conversations."""
+        """
+        Fetches recent conversations (id, title, updated_at) for the sidebar.
+        Cached for CONVERSATION_LIST_TTL_SECONDS, since it is rendered on every rerun.
+        """
+        with self._list_lock:
+            cached = self._list_cache.get(limit)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
         try:
             response = self.client.table("conversations") \
-                .select("*") \
+                .select(CONVERSATION_LIST_COLUMNS) \
                 .order("updated_at", desc=True) \
                 .limit(limit) \
                 .execute()
-            return response.data
+            conversations = response.data or []
+            with self._list_lock:
+                self._list_cache[limit] = (time.monotonic() + CONVERSATION_LIST_TTL_SECONDS, conversations)
+            return conversations
         except Exception as e:
             print(f"Error fetching conversations: {e}")
             return []
 
     def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
-        """Fetches all messages for a conversation."""
+        """Fetches all messages for a conversation (including ones still queued for writing)."""
+        self.writer.flush(conversation_id)
         try:
             response = self.client.table("messages") \
-                .select("*") \
+                .select(MESSAGE_COLUMNS) \
                 .eq("conversation_id", conversation_id) \
                 .order("created_at", desc=False) \
+                .order("id", desc=False) \
                 .execute()
             return response.data
         except Exception as e:
             print(f"Error fetching messages: {e}")
             return []
 
+    def get_messages_page(self, conversation_id: str, before_id: int = None, limit: int = MESSAGE_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Keyset-paginated messages: the `limit` newest messages with id < before_id
+        (the newest overall when before_id is None), oldest first.
+        Returns (messages, number of older messages not yet loaded).
+        """
+        self.writer.flush(conversation_id)
+        try:
+            query = self.client.table("messages") \
+                .select(MESSAGE_COLUMNS, count="exact") \
+                .eq("conversation_id", conversation_id)
+            if before_id is not None:
+                query = query.lt("id", before_id)
+            response = query.order("id", desc=True).limit(limit).execute()
+            page = list(reversed(response.data or []))
+            total = response.count if response.count is not None else len(page)
+            return page, max(0, total - len(page))
+        except Exception as e:
+            print(f"Error fetching messages: {e}")
+            return [], 0
+
+    def search(self, query: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Ranked search over conversation titles and message content
+        (search_conversations RPC; tsvector + trigram indexes).
+        Returns (results, has_more); each result has id, title, updated_at,
+        message_id, snippet and rank.
+        """
+        query = (query or "").strip()
+        if not query:
+            return [], False
+        # Queued messages should be findable too
+        self.writer.flush()
+        try:
+            with get_tracer().span("history.search") as span:
+                response = self.client.rpc("search_conversations", {
+                    "search_query": query,
+                    "match_count": limit + 1,  # one extra row tells whether another page exists
+                    "match_offset": offset
+                }).execute()
+                results = response.data or []
+                span["attrs"]["results"] = len(results)
+            return results[:limit], len(results) > limit
+        except Exception as e:
+            print(f"Error searching conversations: {e}")
+            return [], False
+
+    def hydrate_sources(self, messages: List[Dict[str, Any]]):
+        """
+        Restores chunk text for loaded sources that have no preview (the
+        sources panel falls back to the text, and previews are looked up by it).
+        One bulk read per SOURCE_FETCH_BATCH ids; sources with previews are skipped.
+        """
+        missing = {}
+        for msg in messages:
+            for source in msg.get("sources") or []:
+                if 'translated_preview' not in source and not source.get('content') and source.get('id') is not None:
+                    missing.setdefault(source['id'], []).append(source)
+        if not missing:
+            return
+
+        ids = list(missing)
+        try:
+            for start in range(0, len(ids), SOURCE_FETCH_BATCH):
+                response = self.client.table("evidence_vectors") \
+                    .select("id, content") \
+                    .in_("id", ids[start:start + SOURCE_FETCH_BATCH]) \
+                    .execute()
+                for row in response.data or []:
+                    for source in missing.get(row["id"], []):
+                        source['content'] = row.get("content") or ''
+        except Exception as e:
+            print(f"Error loading source content: {e}")
+
+    def get_summary(self, conversation_id: str) -> Dict[str, Any]:
+        """Fetches the rolling history summary of a conversation."""
+        try:
+            response = self.client.table("conversations") \
+                .select("summary, summary_message_count") \
+                .eq("id", conversation_id) \
+                .execute()
+            if response.data:
+                row = response.data[0]
+                return {"summary": row.get("summary"), "summary_message_count": row.get("summary_message_count") or 0}
+        except Exception as e:
+            print(f"Error fetching summary: {e}")
+        return {"summary": None, "summary_message_count": 0}
+
+    def save_summary(self, conversation_id: str, summary_state: Dict[str, Any]):
+        """Stores the rolling history summary of a conversation."""
+        if not conversation_id:
+            return
+        try:
+            self.client.table("conversations").update({
+                "summary": summary_state.get("summary"),
+                "summary_message_count": summary_state.get("summary_message_count") or 0
+            }).eq("id", conversation_id).execute()
+        except Exception as e:
+            print(f"Error saving summary: {e}")
+
     def update_title(self, conversation_id: str, title: str):
         """Updates the title of a conversation."""
         try:
             self.client.table("conversations").update({"title": title}).eq("id", conversation_id).execute()
+            self.invalidate_conversation_list()
         except Exception as e:
             print(f"Error updating title: {e}")
 
     def delete_conversation(self, conversation_id: str):
         """Deletes a conversation and its messages."""
+        # Queued messages would otherwise be inserted after the delete and fail
+        self.writer.flush(conversation_id)
         try:
             self.client.table("conversations").delete().eq("id", conversation_id).execute()
+            self.invalidate_conversation_list()
         except Exception as e:
             print(f"Error deleting conversation: {e}")
 
+
+@st.cache_resource
+def get_history_manager() -> ChatHistoryManager:
+    """Returns the process-wide ChatHistoryManager shared by all sessions."""
+    return ChatHistoryManager()
@@ -0,0 +1,138 @@
+import os
+import threading
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from supabase import create_client, Client
+from anthropic import Anthropic, DefaultHttpxClient
+import httpx
+from typing import Optional
+
+# Process-wide limits. Every browser session shares these, so socket and thread
+# counts scale with server processes instead of logged-in users.
+MAX_CONCURRENT_SEARCHES = 12
+MAX_LLM_CONNECTIONS = 10
+MAX_BACKGROUND_TASKS = 4
+MAX_HEDGED_CALLS = 8
+
+_lock = threading.Lock()
+_supabase_client: Optional[Client] = None
+_anthropic_client: Optional[Anthropic] = None
+_search_executor: Optional[ThreadPoolExecutor] = None
+_background_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_setting(name: str, default=None):
+    """
+    Reads a setting from Streamlit secrets, falling back to the environment
+    (scripts and benchmarks run without a secrets file).
+    """
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        value = None
+    return value if value is not None else os.getenv(name, default)
+
+
+def use_fake_backend() -> bool:
+    """FAKE_BACKEND=1 swaps Supabase and Anthropic for the in-process fakes (modules/fake_backend.py)."""
+    return str(get_setting("FAKE_BACKEND", "")).lower() in ("1", "true", "yes")
+
+
+def get_supabase_client() -> Client:
+    """
+    Returns the shared Supabase client (one HTTP connection pool per process).
+    """
+    global _supabase_client
+    if _supabase_client is None:
+        with _lock:
+            if _supabase_client is None and use_fake_backend():
+                from modules.fake_backend import get_fake_supabase
+                _supabase_client = get_fake_supabase()
+            elif _supabase_client is None:
+                _supabase_client = create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+    return _supabase_client
+
+
+def get_anthropic_client() -> Optional[Anthropic]:
+    """
+    Returns the shared Anthropic client, or None if no API key is configured.
+    The underlying httpx pool is capped at MAX_LLM_CONNECTIONS; extra calls
+    wait for a free connection instead of opening new sockets.
+    """
+    global _anthropic_client
+    if _anthropic_client is None and use_fake_backend():
+        from modules.fake_backend import get_fake_anthropic
+        with _lock:
+            if _anthropic_client is None:
+                _anthropic_client = get_fake_anthropic()
+    if _anthropic_client is None:
+        api_key = st.secrets.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            return None
+        with _lock:
+            if _anthropic_client is None:
+                _anthropic_client = Anthropic(
+                    api_key=api_key,
+                    # Timeouts and retries are applied per call (modules/resilience.py)
+                    max_retries=0,
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=MAX_LLM_CONNECTIONS,
+                            max_keepalive_connections=MAX_LLM_CONNECTIONS
+                        )
+                    )
+                )
+    return _anthropic_client
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """
+    Returns the shared thread pool used for parallel database searches.
+    Bounds the number of in-flight search RPCs across all sessions.
+
+    Tasks running on this pool must not block on other tasks submitted to it.
+    """
+    global _search_executor
+    if _search_executor is None:
+        with _lock:
+            if _search_executor is None:
+                _search_executor = ThreadPoolExecutor(
+                    max_workers=MAX_CONCURRENT_SEARCHES,
+                    thread_name_prefix="search"
+                )
+    return _search_executor
+
+
+def get_background_executor() -> ThreadPoolExecutor:
+    """
+    Returns the shared thread pool for auxiliary LLM calls (e.g. source previews)
+    that run alongside the main answer. Kept separate from the search pool so
+    slow LLM calls never hold up retrieval.
+    """
+    global _background_executor
+    if _background_executor is None:
+        with _lock:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(
+                    max_workers=MAX_BACKGROUND_TASKS,
+                    thread_name_prefix="background"
+                )
+    return _background_executor
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """
+    Returns the thread pool that runs hedged LLM requests (see
+    resilience.hedged_call). Separate from the background pool so queued
+    preview jobs never delay a call on the critical path.
+    """
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=MAX_HEDGED_CALLS,
+                    thread_name_prefix="hedge"
+                )
+    return _hedge_executor
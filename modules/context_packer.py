@@ -0,0 +1,107 @@
+import re
+from typing import List, Dict, Any
+from modules.models import get_model_by_id
+
+# Ingest uses 1000-char chunks with 200-char overlap (scripts/ingest_vectors.py)
+MAX_OVERLAP_CHARS = 200
+MIN_OVERLAP_CHARS = 20
+
+_CJK_RE = re.compile(r'[぀-ヿ一-鿿々＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate without a tokenizer: ~4 chars per token for latin
+    text, ~1 token per CJK character.
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    for n in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:n]):
+            return n
+    return 0
+
+
+def _merge_file_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Stitches chunks of one file that overlap into contiguous sections.
+    Each section keeps the source numbers of every chunk it contains.
+    """
+    sections = [{"numbers": [c["number"]], "text": c["text"]} for c in chunks]
+
+    merged = True
+    while merged and len(sections) > 1:
+        merged = False
+        for i in range(len(sections)):
+            for j in range(len(sections)):
+                if i == j:
+                    continue
+                n = _overlap(sections[i]["text"], sections[j]["text"])
+                if n:
+                    sections[i]["text"] += sections[j]["text"][n:]
+                    sections[i]["numbers"] += sections[j]["numbers"]
+                    del sections[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return sections
+
+
+def pack_context(context_chunks: List[Dict[str, Any]], model_id: str, token_budget: int = None) -> str:
+    """
+    Builds the evidence context for generation.
+
+    - Chunks are numbered 1..N in retrieval order (the previews and the UI rely on this).
+    - Overlapping chunks from the same file_path are merged into one section
+      labelled with all their numbers ("SOURCE 2, 5"), dropping the repeated text.
+    - Sections are added in rank order until the model's context budget
+      (models.py `context_budget_tokens`, or `token_budget`) is used up.
+
+    Merging only matters for standard search, which returns several chunks
+    per file. Deep search (RAGEngine.search_multilingual) has already reduced
+    each file to its best chunk in aggregate_by_document, so there the packer
+    only applies the budget.
+    """
+    budget = token_budget or get_model_by_id(model_id).context_budget_tokens
+
+    by_file: Dict[str, List[Dict[str, Any]]] = {}
+    for i, chunk in enumerate(context_chunks):
+        source = chunk.get('file_path', 'Unknown File')
+        by_file.setdefault(source, []).append({
+            "number": i + 1,
+            "text": (chunk.get('content') or '').strip()
+        })
+
+    sections = []
+    for source, chunks in by_file.items():
+        for section in _merge_file_chunks(chunks):
+            section["source"] = source
+            section["numbers"].sort()
+            sections.append(section)
+
+    # Best-ranked sections first (lowest source number)
+    sections.sort(key=lambda s: s["numbers"][0])
+
+    context_text = ""
+    used = 0
+    skipped = []
+    for section in sections:
+        numbers = ", ".join(str(n) for n in section["numbers"])
+        block = f"--- SOURCE {numbers}: {section['source']} ---\n{section['text']}\n\n"
+        cost = estimate_tokens(block)
+        if used + cost > budget and context_text:
+            skipped.extend(section["numbers"])
+            continue
+        context_text += block
+        used += cost
+
+    if skipped:
+        print(f"Context budget ({budget} tokens) reached; omitted sources {sorted(skipped)}")
+
+    return context_text
@@ -0,0 +1,405 @@
+import re
+import calendar
+import datetime
+from typing import Optional, Tuple, List
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
+    "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7,
+    "aug": 8, "august": 8, "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10,
+    "nov": 11, "november": 11, "dec": 12, "december": 12
+}
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thurs": 3, "friday": 4, "fri": 4, "saturday": 5, "sat": 5,
+    "sunday": 6, "sun": 6
+}
+WEEKDAYS_JA = {"月": 0, "火": 1, "水": 2, "木": 3, "金": 4, "土": 5, "日": 6}
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12, "fourteen": 14, "thirty": 30
+}
+# Separator of a range in a date_filter string ("2025-12-18..2025-12-20")
+RANGE_SEPARATOR = ".."
+# 今年5月, 去年の12月18日
+RELATIVE_YEARS_JA = {"一昨年": -2, "去年": -1, "昨年": -1, "今年": 0}
+
+_MONTH_RE = r'(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?'
+_DAY_RE = r'(\d{1,2})(?:st|nd|rd|th)?'
+_NUM_RE = r'(\d+|' + '|'.join(NUMBER_WORDS) + r')'
+_WEEKDAY_RE = r'(' + '|'.join(sorted(WEEKDAYS, key=len, reverse=True)) + r')\b'
+_REL_YEAR_JA_RE = r'(' + '|'.join(RELATIVE_YEARS_JA) + r')\s*の?\s*'
+# "May 3 times", "March 2 miles": a count, not a day
+_NOT_A_DAY_RE = r'(?!\s*(?:times?|x\b|%|percent|people|persons?|pages?|items?|hours?|minutes?|days?|weeks?|months?|years?|miles?|km\b))'
+
+# Absolute date mentions, most specific first. Precision: day / month / year.
+# Mentions without a year get the most recent non-future year (infer_year).
+_PATTERNS = [
+    ("ymd", "day", re.compile(r'(?<!\d)(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?!\d)')),
+    ("ymd", "day", re.compile(r'(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日')),
+    ("mdy", "day", re.compile(r'\b' + _MONTH_RE + r'\s+' + _DAY_RE + r',?\s+(\d{4})(?!\d)', re.IGNORECASE)),
+    ("dmy", "day", re.compile(r'(?<!\d)' + _DAY_RE + r'\s+(?:of\s+)?' + _MONTH_RE + r',?\s+(\d{4})(?!\d)', re.IGNORECASE)),
+    ("rel_ymd", "day", re.compile(_REL_YEAR_JA_RE + r'(\d{1,2})\s*月\s*(\d{1,2})\s*日')),
+    ("md", "day", re.compile(r'(?<!\d)(\d{1,2})\s*月\s*(\d{1,2})\s*日')),
+    ("md_name", "day", re.compile(r'\b' + _MONTH_RE + r'\s+' + _DAY_RE + r'(?![\d:])' + _NOT_A_DAY_RE, re.IGNORECASE)),
+    ("dm_name", "day", re.compile(r'(?<!\d)' + _DAY_RE + r'\s+(?:of\s+)?' + _MONTH_RE + r'(?![a-z])', re.IGNORECASE)),
+    ("md_slash", "day", re.compile(r'(?<![\d/.\-])(\d{1,2})/(\d{1,2})(?![\d/])')),
+    ("ym", "month", re.compile(r'(\d{4})\s*年\s*(\d{1,2})\s*月(?!\s*\d)')),
+    ("ym", "month", re.compile(r'(?<!\d)(\d{4})[-/](\d{1,2})(?![\d/\-])')),
+    ("my", "month", re.compile(r'\b' + _MONTH_RE + r',?\s+(\d{4})(?!\d)', re.IGNORECASE)),
+    ("rel_ym", "month", re.compile(_REL_YEAR_JA_RE + r'(\d{1,2})\s*月(?!\s*\d|曜)')),
+    ("m", "month", re.compile(r'(?<![\d年])(\d{1,2})\s*月(?!\s*\d|曜)')),
+    # Bare English month names need a preposition ("may" is also a verb)
+    ("m_name", "month", re.compile(r'\b(?:in|during|since|throughout|early|mid|late|of)\s+(?:-\s*)?' + _MONTH_RE + r'(?![a-z])', re.IGNORECASE)),
+    # Range ends ("from March to May"); the preposition stays outside the mention.
+    # m_name_to only counts right after another mention (find_date_mentions)
+    ("m_name_range", "month", re.compile(r'(?:(?<=\bfrom )|(?<=\bbetween ))' + _MONTH_RE + r'(?![a-z])', re.IGNORECASE)),
+    ("m_name_to", "month", re.compile(r'(?:(?<=\bto )|(?<=\buntil )|(?<=\btill )|(?<=\bthrough )|(?<=\band ))' + _MONTH_RE + r'(?![a-z])', re.IGNORECASE)),
+    ("y", "year", re.compile(r'(?<!\d)(\d{4})\s*年(?!\s*\d)')),
+    ("y", "year", re.compile(r'\b(?:in|during|since|throughout|of)\s+(\d{4})(?!\d|[-/])', re.IGNORECASE)),
+]
+
+# A bare "12/18" is also a fraction or a section number ("1/2 of the emails",
+# "section 3/4"): it only counts as a date next to date words, a weekday or another date
+_SLASH_BEFORE_RE = re.compile(
+    r'(?:\b(?:on|since|from|until|till|by|before|after|dated|between)'
+    r'|\d{1,2}/\d{1,2}\s*(?:-|–|—|~|〜|～|to|through|thru|until|and))\s*$',
+    re.IGNORECASE
+)
+_SLASH_AFTER_RE = re.compile(
+    r'^\s*(?:(?:-|–|—|~|〜|～|to|through|thru|until|and)\s*\d{1,2}/\d{1,2}'
+    r'|[(（]\s*(?:' + '|'.join(sorted(WEEKDAYS, key=len, reverse=True)) + r'|[月火水木金土日])'
+    r'|に|から|まで|以降|の(?:会議|メール|打ち合わせ|面談))',
+    re.IGNORECASE
+)
+
+# Text allowed between two mentions of one range
+_RANGE_JOIN_RE = re.compile(r'^\s*(?:-|–|—|~|〜|～|to|until|till|through|thru|and|から|より)\s*(?:の間)?\s*$', re.IGNORECASE)
+# "Dec 18-20", "12月18日〜20日", "18th to 20th"
+_DAY_CONTINUATION_RE = re.compile(r'^\s*(?:-|–|—|~|〜|～|to|until|through|から)\s*(\d{1,2})(?:st|nd|rd|th|日)?(?![\d月/年:])', re.IGNORECASE)
+_SINCE_BEFORE_RE = re.compile(r'\b(?:since|after|starting)\s+$', re.IGNORECASE)
+_SINCE_AFTER_RE = re.compile(r'^\s*(?:以降|以来|から今|from then on|onwards?|and later)', re.IGNORECASE)
+
+
+class DateMention:
+    """A date expression found in the text, resolved to an inclusive range."""
+
+    def __init__(self, start: int, end: int, first: datetime.date, last: datetime.date, precision: str, explicit_year: bool):
+        self.start = start
+        self.end = end
+        self.first = first
+        self.last = last
+        self.precision = precision
+        self.explicit_year = explicit_year
+
+
+def infer_year(month: int, day: int, today: datetime.date) -> int:
+    """
+    Year for a date written without one: the most recent occurrence that is
+    not in the future (evidence describes past events). Feb 29 goes back to
+    the last leap year.
+    """
+    for year in range(today.year, today.year - 8, -1):
+        try:
+            candidate = datetime.date(year, month, day)
+        except ValueError:
+            continue
+        if candidate <= today:
+            return year
+    return today.year
+
+
+def _month_word_ok(word: str) -> bool:
+    """
+    Lowercase full month names are ordinary words as often as not ("we may
+    3 times", "march 5 miles"): without other date context only "May" or an
+    abbreviation ("dec") counts.
+    """
+    word = word.rstrip('.')
+    return word[0].isupper() or (word.lower() != "may" and len(word) <= 4)
+
+
+def _build(year: int, month: int, day: int) -> Optional[datetime.date]:
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _month_range(year: int, month: int) -> Optional[Tuple[datetime.date, datetime.date]]:
+    if not 1 <= month <= 12:
+        return None
+    return datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _resolve(kind: str, groups: tuple, today: datetime.date) -> Optional[Tuple[datetime.date, datetime.date]]:
+    """Turns a pattern match into an inclusive (first, last) date range."""
+    if kind == "ymd":
+        day = _build(int(groups[0]), int(groups[1]), int(groups[2]))
+    elif kind == "mdy":
+        day = _build(int(groups[2]), MONTHS[groups[0].lower()], int(groups[1]))
+    elif kind == "dmy":
+        day = _build(int(groups[2]), MONTHS[groups[1].lower()], int(groups[0]))
+    elif kind == "rel_ymd":
+        day = _build(today.year + RELATIVE_YEARS_JA[groups[0]], int(groups[1]), int(groups[2]))
+    elif kind == "rel_ym":
+        return _month_range(today.year + RELATIVE_YEARS_JA[groups[0]], int(groups[1]))
+    elif kind in ("md", "md_slash", "md_name", "dm_name"):
+        if kind in ("md", "md_slash"):
+            month, dom = int(groups[0]), int(groups[1])
+        elif kind == "md_name":
+            month, dom = MONTHS[groups[0].lower()], int(groups[1])
+        else:
+            month, dom = MONTHS[groups[1].lower()], int(groups[0])
+        day = _build(infer_year(month, dom, today), month, dom)
+    elif kind == "ym":
+        return _month_range(int(groups[0]), int(groups[1]))
+    elif kind == "my":
+        return _month_range(int(groups[1]), MONTHS[groups[0].lower()])
+    elif kind in ("m", "m_name", "m_name_range", "m_name_to"):
+        month = int(groups[0]) if kind == "m" else MONTHS[groups[0].lower()]
+        if not 1 <= month <= 12:
+            return None
+        return _month_range(infer_year(month, 1, today), month)
+    else:  # y
+        year = int(groups[0])
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+    return (day, day) if day else None
+
+
+def find_date_mentions(text: str, today: datetime.date) -> List[DateMention]:
+    """All non-overlapping absolute date mentions, in text order."""
+    mentions: List[DateMention] = []
+    for kind, precision, pattern in _PATTERNS:
+        for match in pattern.finditer(text):
+            if any(match.start() < m.end and m.start < match.end() for m in mentions):
+                continue
+            if kind == "md_slash" and not (_SLASH_BEFORE_RE.search(text[:match.start()]) or _SLASH_AFTER_RE.match(text[match.end():])):
+                continue
+            if kind == "md_name" and not (_month_word_ok(match.group(1)) or re.search(r'\d(?:st|nd|rd|th)', match.group(0))):
+                continue
+            if kind in ("m_name_range", "m_name_to") and not _month_word_ok(match.group(1)):
+                continue
+            if kind == "m_name_to" and not any(_RANGE_JOIN_RE.match(text[m.end:match.start()]) for m in mentions if m.end <= match.start()):
+                continue
+            resolved = _resolve(kind, match.groups(), today)
+            if not resolved:
+                continue
+            explicit_year = kind in ("ymd", "mdy", "dmy", "ym", "my", "y", "rel_ymd", "rel_ym")
+            mentions.append(DateMention(match.start(), match.end(), resolved[0], resolved[1], precision, explicit_year))
+    mentions.sort(key=lambda m: m.start)
+    return mentions
+
+
+def _week_range(day: datetime.date) -> Tuple[datetime.date, datetime.date]:
+    monday = day - datetime.timedelta(days=day.weekday())
+    return monday, monday + datetime.timedelta(days=6)
+
+
+def _shift_months(day: datetime.date, months: int) -> Tuple[int, int]:
+    index = day.year * 12 + day.month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def _number(token: str) -> int:
+    return int(token) if token.isdigit() else NUMBER_WORDS[token.lower()]
+
+
+def _not_future(day: datetime.date, today: datetime.date) -> datetime.date:
+    """The same weekday a week earlier if `day` is still ahead ("this Friday" on a Tuesday)."""
+    return day - datetime.timedelta(weeks=1) if day > today else day
+
+
+def _previous_weekday(today: datetime.date, weekday: int) -> datetime.date:
+    """Most recent given weekday strictly before today."""
+    delta = (today.weekday() - weekday) % 7 or 7
+    return today - datetime.timedelta(days=delta)
+
+
+def _relative_range(text: str, today: datetime.date) -> Optional[Tuple[datetime.date, datetime.date]]:
+    """Resolves relative expressions ("yesterday", "先週", "3 days ago", "last Friday")."""
+    lowered = text.lower()
+    day = datetime.timedelta(days=1)
+
+    # Japanese
+    match = re.search(r'(\d+)\s*日前', text)
+    if match:
+        d = today - int(match.group(1)) * day
+        return d, d
+    match = re.search(r'(\d+)\s*週間前', text)
+    if match:
+        return _week_range(today - datetime.timedelta(weeks=int(match.group(1))))
+    match = re.search(r'(\d+)\s*(?:ヶ|か|カ|ケ|箇)月前', text)
+    if match:
+        return _month_range(*_shift_months(today, -int(match.group(1))))
+    match = re.search(r'(?:過去|直近|この)\s*(\d+)\s*日(?:間)?', text)
+    if match:
+        return today - (int(match.group(1)) - 1) * day, today
+    match = re.search(r'(先週|今週)\s*の?\s*([月火水木金土日])曜', text)
+    if match:
+        monday = _week_range(today)[0] - (datetime.timedelta(weeks=1) if match.group(1) == "先週" else datetime.timedelta(0))
+        d = _not_future(monday + WEEKDAYS_JA[match.group(2)] * day, today)
+        return d, d
+    if "一昨日" in text or "おととい" in text:
+        d = today - 2 * day
+        return d, d
+    if "昨日" in text:
+        d = today - day
+        return d, d
+    if "今日" in text or "本日" in text:
+        return today, today
+    if "先週末" in text:
+        saturday = _week_range(today)[0] - 2 * day
+        return saturday, saturday + day
+    if "先週" in text:
+        return _week_range(today - datetime.timedelta(weeks=1))
+    if "今週" in text:
+        return _week_range(today)[0], today
+    if "先々月" in text:
+        return _month_range(*_shift_months(today, -2))
+    if "先月" in text:
+        return _month_range(*_shift_months(today, -1))
+    if "今月" in text:
+        return datetime.date(today.year, today.month, 1), today
+    if "一昨年" in text:
+        return datetime.date(today.year - 2, 1, 1), datetime.date(today.year - 2, 12, 31)
+    if "去年" in text or "昨年" in text:
+        return datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31)
+    if "今年" in text:
+        return datetime.date(today.year, 1, 1), today
+
+    # English
+    if re.search(r'\bday before yesterday\b', lowered):
+        d = today - 2 * day
+        return d, d
+    if re.search(r'\byesterday\b', lowered):
+        d = today - day
+        return d, d
+    if re.search(r'\btoday\b', lowered):
+        return today, today
+    match = re.search(r'\b' + _NUM_RE + r'\s+days?\s+ago\b', lowered)
+    if match:
+        d = today - _number(match.group(1)) * day
+        return d, d
+    match = re.search(r'\b' + _NUM_RE + r'\s+weeks?\s+ago\b', lowered)
+    if match:
+        return _week_range(today - datetime.timedelta(weeks=_number(match.group(1))))
+    match = re.search(r'\b' + _NUM_RE + r'\s+months?\s+ago\b', lowered)
+    if match:
+        return _month_range(*_shift_months(today, -_number(match.group(1))))
+    match = re.search(r'\b(?:past|last|previous)\s+' + _NUM_RE + r'\s+days\b', lowered)
+    if match:
+        return today - (_number(match.group(1)) - 1) * day, today
+    match = re.search(r'\b(?:past|last|previous)\s+' + _NUM_RE + r'\s+weeks\b', lowered)
+    if match:
+        return today - datetime.timedelta(weeks=_number(match.group(1))) + day, today
+    match = re.search(r'\b(last|this|previous)\s+' + _WEEKDAY_RE, lowered)
+    if match:
+        weekday = WEEKDAYS[match.group(2)]
+        if match.group(1) == "this":
+            d = _not_future(_week_range(today)[0] + weekday * day, today)
+        else:
+            d = _previous_weekday(today, weekday)
+        return d, d
+    match = re.search(r'\bon\s+' + _WEEKDAY_RE, lowered)
+    if match:
+        d = _previous_weekday(today, WEEKDAYS[match.group(1)])
+        return d, d
+    if re.search(r'\b(?:last|previous)\s+weekend\b', lowered):
+        saturday = _week_range(today)[0] - 2 * day
+        return saturday, saturday + day
+    if re.search(r'\b(?:last|previous)\s+week\b', lowered):
+        return _week_range(today - datetime.timedelta(weeks=1))
+    if re.search(r'\bthis\s+week\b', lowered):
+        return _week_range(today)[0], today
+    if re.search(r'\b(?:last|previous)\s+month\b', lowered):
+        return _month_range(*_shift_months(today, -1))
+    if re.search(r'\bthis\s+month\b', lowered):
+        return datetime.date(today.year, today.month, 1), today
+    if re.search(r'\b(?:last|previous)\s+year\b', lowered):
+        return datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31)
+    if re.search(r'\bthis\s+year\b', lowered):
+        return datetime.date(today.year, 1, 1), today
+    return None
+
+
+def extract_date_range(text: str, today: datetime.date = None) -> Optional[Tuple[datetime.date, datetime.date]]:
+    """
+    Extracts the date range a JP/EN query is about, as inclusive (first, last) dates.
+
+    Handles single dates (ISO, 2025年12月18日, 12月18日, Dec 18th, 18 December 2025, 12/18),
+    months and years (December 2025, 2025年12月, 12月, 今年5月, in 2025), ranges
+    ("Dec 18-20", "from Dec 18 to Jan 3", "from March to May", "12月18日〜20日",
+    "since Dec 18", "12月18日以降")
+    and relative terms (yesterday, 先週, 3 days ago, last Friday, 先月).
+    Returns None if no date is mentioned.
+    """
+    today = today or datetime.date.today()
+    mentions = find_date_mentions(text, today)
+
+    if not mentions:
+        return _relative_range(text, today)
+
+    first = mentions[0]
+
+    # "A - B", "from A to B", "A から B", "between A and B"
+    if len(mentions) > 1 and _RANGE_JOIN_RE.match(text[first.end:mentions[1].start]):
+        second = mentions[1]
+        start, end = first.first, second.last
+        if end < start and not first.explicit_year:
+            # "Dec 18 - Jan 3" crosses new year: the start is in the year before
+            start = _build(start.year - 1, start.month, start.day) or start
+        elif end < start and not second.explicit_year:
+            end = _build(end.year + 1, end.month, end.day) or end
+        if start <= end:
+            return start, end
+
+    # "Dec 18-20", "12月18日〜20日"
+    if first.precision == "day":
+        match = _DAY_CONTINUATION_RE.match(text[first.end:])
+        if match:
+            end = _build(first.first.year, first.first.month, int(match.group(1)))
+            if end and end > first.first:
+                return first.first, end
+
+    # "since Dec 18", "12月18日以降"
+    since = _SINCE_BEFORE_RE.search(text[:first.start]) or re.match(r'since\b', text[first.start:], re.IGNORECASE)
+    if since or _SINCE_AFTER_RE.match(text[first.end:]):
+        if first.first <= today:
+            return first.first, today
+
+    return first.first, first.last
+
+
+def format_date_filter(date_range: Optional[Tuple[datetime.date, datetime.date]]) -> Optional[str]:
+    """(first, last) -> "YYYY-MM-DD" for a single day, "YYYY-MM-DD..YYYY-MM-DD" for a range."""
+    if not date_range:
+        return None
+    start, end = date_range
+    if start == end:
+        return start.isoformat()
+    return f"{start.isoformat()}{RANGE_SEPARATOR}{end.isoformat()}"
+
+
+def parse_date_filter(date_filter: str) -> Tuple[str, str]:
+    """Inverse of format_date_filter: returns ISO (first, last)."""
+    if RANGE_SEPARATOR in date_filter:
+        start, end = date_filter.split(RANGE_SEPARATOR, 1)
+        return start.strip(), end.strip()
+    return date_filter, date_filter
+
+
+def extract_date_filter(text: str, today: datetime.date = None) -> Optional[str]:
+    """date_filter string for the search pipeline (see format_date_filter), or None."""
+    return format_date_filter(extract_date_range(text, today))
+
+
+def extract_date(text: str, today: datetime.date = None) -> Optional[str]:
+    """
+    Extracts the first specific calendar date mentioned in a JP/EN query.
+    Returns "YYYY-MM-DD", or None if there is no date or the query is about a range.
+    """
+    date_range = extract_date_range(text, today)
+    if date_range and date_range[0] == date_range[1]:
+        return date_range[0].isoformat()
+    return None
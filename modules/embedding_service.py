@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+import time
+import streamlit as st
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+from modules.clients import get_setting
+
+# Max texts per forward pass
+MAX_BATCH_SIZE = 32
+# How long to keep collecting once concurrent requests have been observed
+MAX_WAIT_MS = 5
+# Default wait in encode(): a lost request fails instead of hanging the session
+ENCODE_TIMEOUT = 90
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces encode requests from all sessions into batched forward passes.
+
+    Background dispatcher threads own the encoder (one for an in-process model,
+    one per worker process in worker mode). Callers get a Future back from
+    `submit()` (or block on `encode()`). When only one request is waiting it is
+    encoded immediately, so single-user latency is unchanged; when several
+    arrive together the worker waits up to MAX_WAIT_MS for stragglers and runs
+    them as one batch.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], Sequence], max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS, num_threads: int = 1):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"embedding-batcher-{i}", daemon=True)
+            for i in range(num_threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queues a text for encoding and returns a Future resolving to its embedding (list of floats)."""
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str, timeout: float = ENCODE_TIMEOUT) -> List[float]:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect_batch(self) -> List[tuple]:
+        batch = [self._queue.get()]
+
+        # Take everything that is already waiting
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # Concurrency observed: give other sessions a short window to join
+        if 1 < len(batch) < self.max_batch_size:
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            # Skip requests whose caller has already given up
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                embeddings = self.encode_fn([text for text, _ in batch])
+            except Exception as e:
+                print(f"Embedding batch error ({len(batch)} texts): {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            if len(embeddings) != len(batch):
+                error = RuntimeError(f"Encoder returned {len(embeddings)} embeddings for {len(batch)} texts")
+                print(f"Embedding batch error: {error}")
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding))
+
+
+def get_embedding_worker_count() -> int:
+    """
+    Number of out-of-process embedding workers (EMBEDDING_WORKERS secret or env var).
+    0 (default) keeps the model inside the Streamlit process.
+    """
+    value = get_setting("EMBEDDING_WORKERS", 0)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+@st.cache_resource
+def get_embedding_worker_pool(num_workers: int):
+    """Returns the process-wide pool of embedding worker processes, once a worker has loaded the model."""
+    from modules.embedding_workers import EmbeddingWorkerPool
+    pool = EmbeddingWorkerPool(num_workers)
+    pool.wait_ready()
+    return pool
+
+
+@st.cache_resource
+def get_embedding_batcher(_model=None) -> EmbeddingBatcher:
+    """
+    Returns the process-wide batcher. Encodes with the given in-process
+    SentenceTransformer, or with worker processes when EMBEDDING_WORKERS > 0.
+    (`_model` is not hashed by Streamlit; there is one model per process.)
+    """
+    num_workers = get_embedding_worker_count()
+    if num_workers:
+        pool = get_embedding_worker_pool(num_workers)
+        # One dispatcher per worker so every process can be busy at once
+        return EmbeddingBatcher(pool.encode, num_threads=num_workers)
+    return EmbeddingBatcher(lambda texts: _model.encode(texts, batch_size=MAX_BATCH_SIZE))
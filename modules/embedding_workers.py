@@ -0,0 +1,253 @@
+"""
+Out-of-process embedding workers.
+
+Each worker process owns its own copy of the E5 model, so encoding no longer
+competes with Streamlit reruns for the server's GIL. Each worker has its own
+pipe: the pool hands a request to an idle worker and the embeddings come back
+through a shared-memory block allocated by the caller, so only a small status
+tuple is pickled. Private pipes (no queue shared between processes) mean a
+worker that dies can't leave a lock held that the others wait on.
+
+Note: every worker loads the full model (~1.1GB RAM). Keep EMBEDDING_WORKERS at
+0 on the Streamlit Cloud free tier. With FAKE_EMBEDDER=hash the workers use
+the offline HashingEmbedder instead (benchmarks, tests).
+"""
+
+import os
+import atexit
+import itertools
+import multiprocessing as mp
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait as wait_connections
+from typing import List
+
+import numpy as np
+
+MODEL_NAME = 'intfloat/multilingual-e5-base'
+EMBEDDING_DIM = 768
+# Seconds to wait for a worker before failing the request
+REQUEST_TIMEOUT = 60
+# Seconds to wait for the first worker to load the model (includes the download)
+MODEL_LOAD_TIMEOUT = 600
+# How often the listener also checks for workers that exited
+WATCH_INTERVAL = 2.0
+
+
+class WorkerDied(RuntimeError):
+    """The worker encoding a request exited; encoding is retried on another one."""
+
+
+def _load_model(model_name: str):
+    if os.getenv("FAKE_EMBEDDER") == "hash":
+        from modules.fake_backend import HashingEmbedder
+        return HashingEmbedder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def _worker_main(model_name: str, conn):
+    """Worker process loop: encode texts and write them into the caller's shared memory."""
+    model = _load_model(model_name)
+    conn.send(("ready", 0, None))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, texts, shm_name = task
+        try:
+            embeddings = np.asarray(model.encode(texts, batch_size=len(texts), convert_to_numpy=True), dtype=np.float32)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray(embeddings.shape, dtype=np.float32, buffer=shm.buf)
+                out[:] = embeddings
+            finally:
+                shm.close()
+            conn.send((task_id, embeddings.shape[0], None))
+        except Exception as e:
+            conn.send((task_id, 0, repr(e)))
+
+
+class EmbeddingWorkerPool:
+    """
+    Pool of encoder processes. `encode()` is thread-safe and can be called
+    from several dispatcher threads at once; each request goes to an idle
+    worker (waiting for one if all are busy).
+
+    Workers report when their model is loaded (wait_ready); a worker that dies
+    is respawned and the request it was encoding moves to another worker.
+    """
+
+    def __init__(self, num_workers: int, model_name: str = MODEL_NAME, dim: int = EMBEDDING_DIM):
+        self.num_workers = num_workers
+        self.model_name = model_name
+        self.dim = dim
+        # spawn: never fork the Streamlit server (threads, sockets, torch state)
+        self._ctx = mp.get_context("spawn")
+        self._pending = {}
+        self._ids = itertools.count()
+        # Guarded by _cond: worker index -> process / pipe end, indexes with a
+        # loaded model, loaded and not encoding, and index -> task id being encoded
+        self._cond = threading.Condition()
+        self._processes = {}
+        self._conns = {}
+        self._ready = set()
+        self._idle = set()
+        self._assigned = {}
+        self._closing = False
+
+        for index in range(num_workers):
+            self._spawn(index)
+
+        self._listener = threading.Thread(target=self._listen, name="embedding-results", daemon=True)
+        self._listener.start()
+        atexit.register(self.shutdown)
+
+    def _spawn(self, index: int):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.model_name, child_conn),
+            daemon=True,
+            name=f"embedding-worker-{index}"
+        )
+        process.start()
+        # Only the worker holds the other end, so its exit shows up as EOF here
+        child_conn.close()
+        with self._cond:
+            self._processes[index] = process
+            self._conns[index] = parent_conn
+
+    def wait_ready(self, timeout: float = MODEL_LOAD_TIMEOUT) -> bool:
+        """Blocks until at least one worker has loaded the model. False on timeout."""
+        with self._cond:
+            ready = self._cond.wait_for(lambda: self._ready, timeout)
+        if not ready:
+            print(f"Embedding workers: no model loaded after {timeout}s")
+        return bool(ready)
+
+    def _finish(self, task_id, count: int = 0, error: Exception = None):
+        with self._cond:
+            future = self._pending.pop(task_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(count)
+
+    def _restart(self, index: int):
+        """Fails the request a dead worker was encoding and starts a new process."""
+        with self._cond:
+            if self._closing:
+                return
+            process = self._processes[index]
+            self._conns.pop(index).close()
+            self._ready.discard(index)
+            self._idle.discard(index)
+            task_id = self._assigned.pop(index, None)
+        process.join(timeout=1)
+        print(f"Embedding worker {index} exited (code {process.exitcode}); restarting")
+        if task_id is not None:
+            self._finish(task_id, error=WorkerDied(f"Embedding worker {index} died"))
+        self._spawn(index)
+
+    def _listen(self):
+        while not self._closing:
+            with self._cond:
+                conns = {conn: index for index, conn in self._conns.items()}
+            for conn in wait_connections(list(conns), timeout=WATCH_INTERVAL):
+                index = conns[conn]
+                try:
+                    task_id, count, error = conn.recv()
+                except (EOFError, OSError):
+                    self._restart(index)
+                    continue
+                with self._cond:
+                    if task_id == "ready":
+                        self._ready.add(index)
+                    else:
+                        self._assigned.pop(index, None)
+                    self._idle.add(index)
+                    self._cond.notify_all()
+                if task_id != "ready":
+                    self._finish(task_id, count, RuntimeError(f"Embedding worker error: {error}") if error else None)
+            # A worker that exited without closing its pipe (e.g. hung and killed)
+            with self._cond:
+                dead = [i for i, p in self._processes.items() if not p.is_alive() and i in self._conns]
+            for index in dead:
+                self._restart(index)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encodes a batch of texts in a worker process. Returns an (n, dim) float32
+        array. If the worker dies meanwhile the batch is retried once on another.
+        """
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if not self.wait_ready():
+            raise TimeoutError("No embedding worker is ready")
+
+        deadline = time.monotonic() + REQUEST_TIMEOUT
+        shm = shared_memory.SharedMemory(create=True, size=len(texts) * self.dim * 4)
+        try:
+            for attempt in range(2):
+                try:
+                    count = self._run(texts, shm.name, deadline)
+                    break
+                except WorkerDied:
+                    if attempt:
+                        raise
+            # Copy out before the block is released
+            return np.ndarray((count, self.dim), dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _run(self, texts: List[str], shm_name: str, deadline: float) -> int:
+        """Hands one request to an idle worker and waits for its row count."""
+        task_id = next(self._ids)
+        future = Future()
+        with self._cond:
+            # Skip workers that exited but whose EOF the listener hasn't seen yet
+            has_idle = lambda: [i for i in self._idle if self._processes[i].is_alive()]
+            if not self._cond.wait_for(has_idle, max(0.0, deadline - time.monotonic())):
+                raise TimeoutError("No embedding worker became idle")
+            index = min(has_idle())
+            self._idle.discard(index)
+            self._assigned[index] = task_id
+            self._pending[task_id] = future
+            conn = self._conns[index]
+        try:
+            conn.send((task_id, list(texts), shm_name))
+        except (OSError, ValueError) as e:
+            # The worker died in between; the listener restarts it
+            self._finish(task_id, error=WorkerDied(f"Embedding worker {index} unavailable: {e!r}"))
+
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        finally:
+            with self._cond:
+                self._pending.pop(task_id, None)
+
+    def shutdown(self):
+        """Stops all worker processes."""
+        with self._cond:
+            self._closing = True
+            conns = list(self._conns.values())
+            processes = list(self._processes.values())
+        for conn in conns:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for p in processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
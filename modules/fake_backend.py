@@ -0,0 +1,734 @@
+"""
+In-process stand-ins for Supabase and the Anthropic messages API.
+
+Enabled with FAKE_BACKEND=1 (secret or env var): clients.py then hands these
+to the real RAGEngine / LLMClient / ChatHistoryManager / StorageClient, so
+the whole pipeline runs offline and can be benchmarked (scripts/benchmark_pipeline.py).
+
+- FakeSupabase implements the tables and RPCs the app uses
+  (match_evidence_vectors[_v2], kw_match_documents, match_documents_by_date[_range])
+  over a corpus snapshot (scripts/export_corpus_snapshot.py) or a synthetic corpus.
+- FakeAnthropic implements messages.create / messages.stream with canned,
+  prompt-shaped responses.
+- Every call sleeps for an injected latency (FakeLatency) so timings resemble
+  the hosted services. FAKE_LATENCY="rpc_vector=150,llm_ttft=800" overrides
+  single operations; FAKE_LATENCY_SCALE=0 removes all latency.
+"""
+
+import os
+import re
+import json
+import uuid
+import time
+import random
+import hashlib
+import datetime
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator
+
+EMBEDDING_DIM = 768
+
+# Milliseconds per operation (hosted Supabase / Anthropic from a laptop, roughly)
+DEFAULT_LATENCY_MS = {
+    "rpc_vector": 120.0,
+    "rpc_keyword": 200.0,
+    "rpc_date": 60.0,
+    "table": 40.0,
+    "storage": 30.0,
+    "llm_ttft": 600.0,        # time to first token
+    "llm_output_token": 12.0,  # per output token (~80 tokens/s)
+    "llm_error_rate": 0.0,     # fraction of LLM calls failing with 529 (not ms)
+}
+DEFAULT_JITTER = 0.2
+SYNTHETIC_DOCS = 300
+SYNTHETIC_CHUNKS_PER_DOC = 4
+
+
+def _now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class FakeLatency:
+    """Sleeps for configurable, jittered per-operation latencies."""
+
+    def __init__(self, profile: Dict[str, float] = None, scale: float = 1.0, jitter: float = DEFAULT_JITTER, seed: int = None):
+        self.profile = dict(DEFAULT_LATENCY_MS)
+        self.profile.update(profile or {})
+        self.scale = scale
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeLatency":
+        profile = {}
+        for item in os.getenv("FAKE_LATENCY", "").split(","):
+            if "=" in item:
+                name, value = item.split("=", 1)
+                profile[name.strip()] = float(value)
+        return cls(profile, scale=float(os.getenv("FAKE_LATENCY_SCALE", "1")))
+
+    def ms(self, op: str, count: float = 1.0) -> float:
+        base = self.profile.get(op, 0.0) * count * self.scale
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base * factor)
+
+    def sleep(self, op: str, count: float = 1.0):
+        delay = self.ms(op, count)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+    def should_fail(self) -> bool:
+        rate = self.profile.get("llm_error_rate", 0.0)
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+
+class HashingEmbedder:
+    """
+    Deterministic bag-of-tokens embedder with the SentenceTransformer.encode
+    interface. Used with FAKE_EMBEDDER=hash so benchmarks don't need the E5
+    model download; texts sharing words get similar vectors.
+    """
+
+    _TOKEN_RE = re.compile(r'[a-z0-9]+|[぀-ヿ一-鿿]', re.IGNORECASE)
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in self._TOKEN_RE.findall(text.lower()):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            index = int.from_bytes(digest[:4], 'little') % self.dim
+            vec[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        if isinstance(texts, str):
+            return self._embed(texts)
+        return np.stack([self._embed(t) for t in texts]) if texts else np.zeros((0, self.dim), dtype=np.float32)
+
+
+class FakeCorpus:
+    """evidence_vectors rows plus a normalized embedding matrix for similarity search."""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        matrix = np.asarray([r.pop("embedding") for r in rows], dtype=np.float32).reshape(len(rows), -1) if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = matrix / norms
+
+    @classmethod
+    def load(cls, path: str) -> "FakeCorpus":
+        """Loads a JSONL snapshot written by scripts/export_corpus_snapshot.py."""
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                # PostgREST returns pgvector columns as "[0.1,0.2,...]" strings
+                if isinstance(row.get("embedding"), str):
+                    row["embedding"] = json.loads(row["embedding"])
+                rows.append(row)
+        print(f"Fake backend: loaded {len(rows)} chunks from {path}")
+        return cls(rows)
+
+    @classmethod
+    def synthetic(cls, num_docs: int = SYNTHETIC_DOCS, chunks_per_doc: int = SYNTHETIC_CHUNKS_PER_DOC, seed: int = 0, embedder: HashingEmbedder = None) -> "FakeCorpus":
+        """Generates an evidence-like corpus (emails, minutes, chats) embedded with HashingEmbedder."""
+        rng = random.Random(seed)
+        embedder = embedder or HashingEmbedder()
+        people = ["Murakami", "Iwabuchi", "Tanaka", "Sato", "Suzuki", "Kobayashi", "Nakamura", "Yamamoto"]
+        topics = ["resignation", "ultimatum", "contract", "harassment", "salary", "meeting", "Vietnam", "audit",
+                  "invoice", "termination", "schedule", "complaint", "settlement", "overtime"]
+        folders = ["data/emails", "data/minutes", "data/chats", "data/reports"]
+        ja_phrases = ["会議の議事録", "退職の申し出", "最後通告", "契約の更新", "ハラスメントの報告"]
+
+        rows = []
+        start = datetime.date(2025, 1, 1)
+        next_id = 1
+        for doc in range(num_docs):
+            day = start + datetime.timedelta(days=rng.randrange(365))
+            folder = rng.choice(folders)
+            file_path = f"{folder}/{day.isoformat()}_{rng.choice(topics)}_{doc}.md"
+            for _ in range(chunks_per_doc):
+                words = [rng.choice(people), rng.choice(topics), rng.choice(topics), rng.choice(people)]
+                content = (
+                    f"{day.isoformat()} {words[0]} wrote to {words[3]} about the {words[1]} and the {words[2]}. "
+                    f"{rng.choice(ja_phrases)}について{words[0]}さんが説明した。 "
+                    + " ".join(rng.choice(topics) for _ in range(120))
+                )
+                rows.append({
+                    "id": next_id,
+                    "content": content,
+                    "file_path": file_path,
+                    "folder": folder,
+                    "document_type": "md",
+                    "google_drive_link": None,
+                    "date_prefix": day.isoformat(),
+                    "created_at": _now_iso(),
+                    "embedding": embedder.encode(content),
+                })
+                next_id += 1
+        return cls(rows)
+
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class _Executable:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self) -> FakeResponse:
+        return self._fn()
+
+
+class FakeQuery:
+    """Subset of the postgrest query builder: select/insert/update/upsert/delete + filters."""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.columns: Optional[List[str]] = None
+        self.count_mode = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.order_by = []
+        self.limit_count = None
+        self.offset = 0
+
+    # --- actions ---
+    def select(self, *columns, count: str = None) -> "FakeQuery":
+        cols = ",".join(columns) if columns else "*"
+        self.columns = None if cols.strip() == "*" else [c.strip() for c in cols.split(",") if c.strip()]
+        self.count_mode = count
+        return self
+
+    def insert(self, data) -> "FakeQuery":
+        self.action, self.payload = "insert", data
+        return self
+
+    def update(self, data) -> "FakeQuery":
+        self.action, self.payload = "update", data
+        return self
+
+    def upsert(self, data, on_conflict: str = None, **kwargs) -> "FakeQuery":
+        self.action, self.payload, self.on_conflict = "upsert", data, on_conflict
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self.action = "delete"
+        return self
+
+    # --- filters ---
+    def _filter(self, column, op, value) -> "FakeQuery":
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda a, b: a == b, value)
+
+    def neq(self, column, value):
+        return self._filter(column, lambda a, b: a != b, value)
+
+    def in_(self, column, values):
+        return self._filter(column, lambda a, b: a in b, list(values))
+
+    def lt(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a < b, value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a <= b, value)
+
+    def gt(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a > b, value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda a, b: a is not None and a >= b, value)
+
+    def ilike(self, column, pattern):
+        regex = re.compile("^" + re.escape(pattern).replace("%", ".*").replace("_", ".") + "$", re.IGNORECASE | re.DOTALL)
+        return self._filter(column, lambda a, b: a is not None and bool(b.match(str(a))), regex)
+
+    def order(self, column, desc: bool = False, **kwargs):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.limit_count = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.offset, self.limit_count = start, end - start + 1
+        return self
+
+    # --- execution ---
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(op(row.get(column), value) for column, op, value in self.filters)
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.columns is None:
+            return dict(row)
+        return {c: row.get(c) for c in self.columns}
+
+    def execute(self) -> FakeResponse:
+        self.db.latency.sleep("table")
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.action == "insert":
+                return FakeResponse(self.db._insert(self.table, self.payload))
+            if self.action == "upsert":
+                return FakeResponse(self.db._upsert(self.table, self.payload, self.on_conflict))
+
+            matched = [r for r in rows if self._matches(r)]
+            if self.action == "update":
+                values = {k: (_now_iso() if v == "now()" else v) for k, v in self.payload.items()}
+                for row in matched:
+                    row.update(values)
+                return FakeResponse([dict(r) for r in matched])
+            if self.action == "delete":
+                self.db._delete(self.table, matched)
+                return FakeResponse([dict(r) for r in matched])
+
+            for column, desc in reversed(self.order_by):
+                matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            total = len(matched)
+            end = None if self.limit_count is None else self.offset + self.limit_count
+            data = [self._project(r) for r in matched[self.offset:end]]
+            return FakeResponse(data, count=total if self.count_mode else None)
+
+
+class FakeBucket:
+    """Storage bucket: signed URLs for every object in the corpus (or explicitly added paths)."""
+
+    def __init__(self, db: "FakeSupabase", name: str):
+        self.db = db
+        self.name = name
+
+    def _paths(self) -> set:
+        return self.db.storage_objects
+
+    def create_signed_url(self, path: str, expires_in: int):
+        self.db.latency.sleep("storage")
+        token = hashlib.sha1(f"{path}:{time.time()}".encode('utf-8')).hexdigest()[:16]
+        url = f"http://fake-storage.local/{self.name}/{path}?token={token}&expires_in={expires_in}"
+        return {"signedURL": url, "signedUrl": url}
+
+    def create_signed_urls(self, paths: List[str], expires_in: int):
+        self.db.latency.sleep("storage")
+        results = []
+        for path in paths:
+            token = hashlib.sha1(f"{path}:{time.time()}".encode('utf-8')).hexdigest()[:16]
+            url = f"http://fake-storage.local/{self.name}/{path}?token={token}&expires_in={expires_in}"
+            results.append({"path": path, "signedURL": url, "signedUrl": url, "error": None})
+        return results
+
+    def list(self, folder: str = "", options: Dict[str, Any] = None):
+        self.db.latency.sleep("storage")
+        prefix = folder.rstrip("/") + "/" if folder else ""
+        entries = {}
+        for path in self._paths():
+            if path.startswith(prefix):
+                name, _, rest = path[len(prefix):].partition("/")
+                # Folders come back with id None, files with their metadata
+                if rest:
+                    entries.setdefault(name, {"name": name, "id": None, "metadata": None})
+                else:
+                    entries[name] = {"name": name, "id": hashlib.md5(path.encode('utf-8')).hexdigest(),
+                                     "metadata": {"size": 1024, "eTag": f'"{hashlib.md5(path.encode("utf-8")).hexdigest()}"'}}
+        items = [entries[n] for n in sorted(entries)]
+        offset = (options or {}).get("offset", 0)
+        limit = (options or {}).get("limit", 100)
+        return items[offset:offset + limit]
+
+
+class FakeStorage:
+    def __init__(self, db: "FakeSupabase"):
+        self.db = db
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self.db, bucket)
+
+
+class FakeSupabase:
+    """
+    Minimal in-memory Supabase client: tables, the search RPCs and storage.
+    Thread-safe; latency is injected per call.
+    """
+
+    # Foreign keys with "on delete cascade" (sql/setup_chat_history.sql)
+    CASCADES = {"conversations": [("messages", "conversation_id")]}
+
+    def __init__(self, corpus: FakeCorpus, latency: FakeLatency = None):
+        self.corpus = corpus
+        self.latency = latency or FakeLatency()
+        self.lock = threading.RLock()
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            "evidence_vectors": corpus.rows,
+            "conversations": [],
+            "messages": [],
+            "chunk_previews": [],
+        }
+        self._next_ids: Dict[str, int] = {}
+        self.storage = FakeStorage(self)
+        self.storage_objects = set()
+        for row in corpus.rows:
+            self.storage_objects.add(row["file_path"])
+            if row["file_path"].endswith(".md"):
+                parent, name = os.path.split(row["file_path"])
+                self.storage_objects.add(f"{parent}/pdf/{name[:-3]}.pdf")
+
+    # --- tables ---
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def _defaults(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = {k: (_now_iso() if v == "now()" else v) for k, v in row.items()}
+        row.setdefault("created_at", _now_iso())
+        if table == "conversations":
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("title", "New Conversation")
+            row.setdefault("updated_at", row["created_at"])
+            row.setdefault("summary", None)
+            row.setdefault("summary_message_count", 0)
+        elif "id" not in row and table != "chunk_previews":
+            self._next_ids[table] = self._next_ids.get(table, len(self.tables.get(table, []))) + 1
+            row["id"] = self._next_ids[table]
+        return row
+
+    def _insert(self, table: str, payload) -> List[Dict[str, Any]]:
+        rows = payload if isinstance(payload, list) else [payload]
+        inserted = [self._defaults(table, dict(r)) for r in rows]
+        self.tables.setdefault(table, []).extend(inserted)
+        if table == "messages":
+            self._touch_conversations({r.get("conversation_id") for r in inserted})
+        return [dict(r) for r in inserted]
+
+    def _touch_conversations(self, conversation_ids: set):
+        """Emulates the messages_touch_conversation trigger (sql/setup_chat_history.sql)."""
+        now = _now_iso()
+        for row in self.tables.get("conversations", []):
+            if row.get("id") in conversation_ids:
+                row["updated_at"] = now
+
+    def _upsert(self, table: str, payload, on_conflict: str = None) -> List[Dict[str, Any]]:
+        keys = [k.strip() for k in (on_conflict or "id").split(",")]
+        rows = self.tables.setdefault(table, [])
+        index = {tuple(r.get(k) for k in keys): r for r in rows}
+        result = []
+        for new in (payload if isinstance(payload, list) else [payload]):
+            existing = index.get(tuple(new.get(k) for k in keys))
+            if existing is not None:
+                existing.update(new)
+                result.append(dict(existing))
+            else:
+                result.extend(self._insert(table, new))
+        return result
+
+    def _delete(self, table: str, matched: List[Dict[str, Any]]):
+        ids = {id(r) for r in matched}
+        self.tables[table] = [r for r in self.tables[table] if id(r) not in ids]
+        for child, column in self.CASCADES.get(table, []):
+            parent_ids = {r.get("id") for r in matched}
+            self.tables[child] = [r for r in self.tables.get(child, []) if r.get(column) not in parent_ids]
+
+    # --- RPCs ---
+    def rpc(self, name: str, params: Dict[str, Any] = None) -> _Executable:
+        handler = getattr(self, f"_rpc_{name}", None)
+        if handler is None:
+            raise ValueError(f"Fake backend: unknown RPC {name}")
+        return _Executable(lambda: FakeResponse(handler(**(params or {}))))
+
+    @staticmethod
+    def _chunk(row: Dict[str, Any], similarity: float, with_meta: bool = True) -> Dict[str, Any]:
+        result = {
+            "id": row["id"],
+            "content": row["content"],
+            "file_path": row["file_path"],
+            "similarity": similarity,
+            "google_drive_link": row.get("google_drive_link"),
+        }
+        if with_meta:
+            result["folder"] = row.get("folder")
+            result["document_type"] = row.get("document_type")
+        return result
+
+    def _vector_search(self, query_embedding, match_threshold: float, match_count: int, keep) -> List[Dict[str, Any]]:
+        self.latency.sleep("rpc_vector")
+        if isinstance(query_embedding, str):
+            query_embedding = json.loads(query_embedding)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.corpus.embeddings @ query if len(self.corpus.rows) else np.zeros(0)
+        results = []
+        for i in np.argsort(-scores):
+            score = float(scores[i])
+            if score <= match_threshold:
+                break
+            row = self.corpus.rows[i]
+            if keep(row):
+                results.append(self._chunk(row, score))
+                if len(results) >= match_count:
+                    break
+        return results
+
+    def _rpc_match_evidence_vectors(self, query_embedding, match_threshold, match_count, filter_document_type=None, filter_folder=None):
+        def keep(row):
+            if filter_document_type and row.get("document_type") != filter_document_type:
+                return False
+            return not filter_folder or (row.get("folder") or "").lower().startswith(filter_folder.lower())
+        return self._vector_search(query_embedding, match_threshold, match_count, keep)
+
+    def _rpc_match_evidence_vectors_v2(self, query_embedding, match_threshold, match_count, filter_document_type=None, filter_folders=None):
+        folders = set(filter_folders or [])
+
+        def keep(row):
+            if filter_document_type and row.get("document_type") != filter_document_type:
+                return False
+            return not folders or row.get("folder") in folders
+        return self._vector_search(query_embedding, match_threshold, match_count, keep)
+
+    def _rpc_kw_match_documents(self, query_text, match_count):
+        self.latency.sleep("rpc_keyword")
+        keywords = {k.lower() for k in query_text.split(" ") if len(k) > 1}
+        scored = []
+        for row in self.corpus.rows:
+            content = row["content"].lower()
+            hits = sum(1 for k in keywords if k in content)
+            if hits:
+                scored.append((hits, len(row["content"]), row))
+        scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        return [self._chunk(row, 1.0, with_meta=False) for _, _, row in scored[:match_count]]
+
+    def _date_search(self, start: str, end: str, match_count: int):
+        self.latency.sleep("rpc_date")
+        rows = [r for r in self.corpus.rows if r.get("date_prefix") and start <= str(r["date_prefix"])[:10] <= end]
+        rows.sort(key=lambda r: len(r["content"]), reverse=True)
+        return [self._chunk(row, 2.0, with_meta=False) for row in rows[:match_count]]
+
+    def _rpc_match_documents_by_date(self, filter_date, match_count):
+        return self._date_search(filter_date, filter_date, match_count)
+
+    def _rpc_match_documents_by_date_range(self, start_date, end_date, match_count):
+        return self._date_search(start_date, end_date, match_count)
+
+    def _rpc_search_conversations(self, search_query, match_count=20, match_offset=0):
+        """Approximates the tsvector + trigram ranking of sql/setup_chat_history.sql."""
+        self.latency.sleep("table")
+        needle = search_query.lower()
+        terms = set(re.findall(r'\w+', needle))
+        with self.lock:
+            best = {}
+            for msg in self.tables.get("messages", []):
+                content = (msg.get("content") or "").lower()
+                words = set(re.findall(r'\w+', content))
+                rank = (len(terms & words) / len(terms) if terms else 0) * 0.1 + (0.5 if needle in content else 0)
+                if rank and rank > best.get(msg["conversation_id"], (0, None))[0]:
+                    best[msg["conversation_id"]] = (rank, msg)
+            results = []
+            for convo in self.tables.get("conversations", []):
+                title_rank = 1.0 if needle in (convo.get("title") or "").lower() else 0.0
+                message_rank, msg = best.get(convo["id"], (0.0, None))
+                if not title_rank and msg is None:
+                    continue
+                snippet = None
+                if msg:
+                    position = msg["content"].lower().find(needle)
+                    start = max(0, position - 60)
+                    snippet = msg["content"][start:start + 200]
+                results.append({
+                    "id": convo["id"], "title": convo.get("title"), "updated_at": convo.get("updated_at"),
+                    "message_id": msg["id"] if msg else None, "snippet": snippet,
+                    "rank": title_rank + message_rank
+                })
+        results.sort(key=lambda r: (r["rank"], r["updated_at"] or ""), reverse=True)
+        return results[match_offset:match_offset + match_count]
+
+
+# --- Anthropic ---
+
+class _TextBlock:
+    type = "text"
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _Usage:
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+
+
+class _Message:
+    def __init__(self, text: str, model: str, input_tokens: int):
+        self.id = f"msg_fake_{uuid.uuid4().hex[:12]}"
+        self.type = "message"
+        self.role = "assistant"
+        self.model = model
+        self.content = [_TextBlock(text)]
+        self.stop_reason = "end_turn"
+        self.usage = _Usage(input_tokens, max(1, len(text) // 4))
+
+
+def _request_text(system, messages) -> str:
+    parts = []
+    if isinstance(system, str):
+        parts.append(system)
+    elif system:
+        parts.extend(b.get("text", "") for b in system)
+    for msg in messages:
+        content = msg["content"]
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(b.get("text", "") for b in content)
+    return "\n".join(parts)
+
+
+def fake_completion(system, messages) -> str:
+    """Canned output in the format each of LLMClient's prompts asks for."""
+    last = messages[-1]["content"]
+    prompt = last if isinstance(last, str) else "\n".join(b.get("text", "") for b in last)
+    question = re.search(r"User's Question: (.*)", prompt)
+    question = question.group(1).strip() if question else ""
+
+    if system:
+        # Answer generation: cite the first few sources of the packed context
+        sources = re.findall(r'--- SOURCE ([\d, ]+): (.+?) ---', prompt)
+        lines = [f"- According to {os.path.basename(path)} (source {numbers}), the evidence is relevant to the question."
+                 for numbers, path in sources[:5]]
+        body = "\n".join(lines) or "I cannot find evidence for that in the current database."
+        return f"<root>\n<answer>\nBased on the provided evidence:\n\n{body}\n</answer>\n</root>"
+    if '"original_keywords"' in prompt:
+        keywords = " ".join(w for w in re.findall(r'\w+', question) if len(w) > 3)
+        return json.dumps({
+            "original": question, "original_keywords": keywords or question,
+            "translated": question, "translated_keywords": keywords or question,
+            "date_filter": None
+        }, ensure_ascii=False)
+    if '"query"' in prompt and '"date_filter"' in prompt:
+        return json.dumps({"query": question, "date_filter": None}, ensure_ascii=False)
+    if '<preview index=' in prompt:
+        count = len(re.findall(r'--- SOURCE \d+', prompt))
+        return "\n".join(f'<preview index="{i}">Preview of source {i}.</preview>' for i in range(1, count + 1))
+    return "Summary of the earlier conversation: the user asked about the case evidence."
+
+
+class _FakeStream:
+    def __init__(self, owner: "FakeMessages", message: _Message, timeout: Optional[float]):
+        self.owner = owner
+        self.message = message
+        self.timeout = timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        started = time.monotonic()
+        self.owner._wait(self.owner.latency.ms("llm_ttft"), self.timeout)
+        text = self.message.content[0].text
+        per_token = self.owner.latency.ms("llm_output_token") / 1000.0
+        for i in range(0, len(text), 4):
+            if per_token:
+                time.sleep(per_token)
+            yield text[i:i + 4]
+        self.elapsed = time.monotonic() - started
+
+    def get_final_message(self) -> _Message:
+        return self.message
+
+
+class FakeMessages:
+    def __init__(self, latency: FakeLatency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _wait(self, delay_ms: float, timeout: Optional[float]):
+        """Sleeps for the injected latency; raises APITimeoutError if it exceeds the call's timeout."""
+        import httpx
+        from anthropic import APITimeoutError, InternalServerError
+        request = httpx.Request("POST", "http://fake-anthropic.local/v1/messages")
+        if self.latency.should_fail():
+            time.sleep(min(delay_ms, 50.0) / 1000.0)
+            raise InternalServerError("Overloaded (fake)", response=httpx.Response(529, request=request), body=None)
+        if timeout is not None and delay_ms / 1000.0 > timeout:
+            time.sleep(timeout)
+            raise APITimeoutError(request=request)
+        time.sleep(delay_ms / 1000.0)
+
+    def _message(self, kwargs) -> _Message:
+        with self._lock:
+            self.calls += 1
+        text = fake_completion(kwargs.get("system"), kwargs["messages"])
+        input_tokens = len(_request_text(kwargs.get("system"), kwargs["messages"])) // 4
+        return _Message(text, kwargs.get("model", "fake"), input_tokens)
+
+    def create(self, timeout: float = None, **kwargs) -> _Message:
+        message = self._message(kwargs)
+        delay = self.latency.ms("llm_ttft") + self.latency.ms("llm_output_token", message.usage.output_tokens)
+        self._wait(delay, timeout)
+        return message
+
+    def stream(self, timeout: float = None, **kwargs) -> _FakeStream:
+        return _FakeStream(self, self._message(kwargs), timeout)
+
+
+class FakeAnthropic:
+    """Stand-in for anthropic.Anthropic (messages API only)."""
+
+    def __init__(self, latency: FakeLatency = None):
+        self.messages = FakeMessages(latency or FakeLatency())
+
+
+_fake_lock = threading.Lock()
+_fake_latency: Optional[FakeLatency] = None
+_fake_supabase: Optional[FakeSupabase] = None
+
+
+def get_fake_latency() -> FakeLatency:
+    global _fake_latency
+    with _fake_lock:
+        if _fake_latency is None:
+            _fake_latency = FakeLatency.from_env()
+        return _fake_latency
+
+
+def get_fake_supabase() -> FakeSupabase:
+    """
+    Process-wide fake Supabase. Loads FAKE_CORPUS_PATH (JSONL snapshot) if set,
+    otherwise generates a synthetic corpus.
+    """
+    global _fake_supabase
+    latency = get_fake_latency()
+    with _fake_lock:
+        if _fake_supabase is None:
+            path = os.getenv("FAKE_CORPUS_PATH")
+            corpus = FakeCorpus.load(path) if path else FakeCorpus.synthetic()
+            _fake_supabase = FakeSupabase(corpus, latency)
+        return _fake_supabase
+
+
+def get_fake_anthropic() -> FakeAnthropic:
+    return FakeAnthropic(get_fake_latency())
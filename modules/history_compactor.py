@@ -0,0 +1,100 @@
+import contextvars
+from concurrent.futures import Future
+from typing import List, Dict, Any, Tuple, Callable, Optional
+from modules.clients import get_background_executor
+from modules.model_router import route_model
+
+# Messages passed verbatim to the prompts (3 user/assistant turns). The window
+# moves in steps of this size, so between steps it only grows at the end and
+# the prompt prefix up to the last history message stays cacheable.
+HISTORY_KEEP_LAST = 6
+
+
+def empty_summary_state() -> Dict[str, Any]:
+    """Summary state for a new conversation."""
+    return {"summary": None, "summary_message_count": 0}
+
+
+def window_start(total: int, keep_last: int = HISTORY_KEEP_LAST) -> int:
+    """
+    Index (from the start of the conversation) of the first verbatim message
+    when `total` messages precede the current one: a multiple of keep_last that
+    leaves keep_last to 2 * keep_last - 1 messages in the window.
+    """
+    if not keep_last or total < keep_last:
+        return 0
+    return (total - keep_last) // keep_last * keep_last
+
+
+def compact_history(messages: List[Dict[str, Any]], summary_state: Dict[str, Any] = None, keep_last: int = HISTORY_KEEP_LAST, offset: int = 0) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Splits prior messages into the verbatim tail and the rolling summary of
+    everything older. Returns (recent_messages, summary_text or None).
+
+    The summary covers the messages folded in by update_rolling_summary. If
+    the summary lags behind the window (it is updated in the background), up
+    to keep_last extra messages stay verbatim; anything older that hasn't been
+    folded in is dropped for this turn.
+    `offset` is the number of older messages of the conversation not loaded
+    into `messages` (paginated history).
+    """
+    if not keep_last:
+        return [], None
+    state = summary_state or {}
+    target = window_start(offset + len(messages), keep_last)
+    folded = state.get("summary_message_count") or 0
+    start = max(target - keep_last, min(target, folded))
+    recent = messages[max(0, start - offset):]
+    if start == 0:
+        return recent, None
+    return recent, state.get("summary") or None
+
+
+def update_rolling_summary(llm, messages: List[Dict[str, Any]], summary_state: Dict[str, Any] = None, keep_last: int = HISTORY_KEEP_LAST, model_id: str = None, offset: int = 0) -> Dict[str, Any]:
+    """
+    Incrementally folds messages that have left the verbatim window into the
+    rolling summary. Only the newly aged-out messages are sent to the LLM, so
+    the cost per window step stays constant. Returns the (possibly unchanged) state.
+
+    summary_message_count counts from the start of the conversation; messages[0]
+    is message number `offset` when older messages are not loaded.
+    """
+    state = dict(summary_state or empty_summary_state())
+    already = state.get("summary_message_count") or 0
+    cutoff = window_start(offset + len(messages), keep_last)
+    if cutoff <= already:
+        return state
+
+    # Unloaded messages that were never folded in are skipped
+    new_messages = messages[max(0, already - offset):cutoff - offset]
+    if not new_messages:
+        return state
+    summary = llm.summarize_history(state.get("summary"), new_messages, model_id=model_id or route_model("summary"))
+    if summary is None:
+        # Keep the old state; the same messages are retried next turn
+        return state
+
+    return {"summary": summary, "summary_message_count": cutoff}
+
+
+def start_summary_update(llm, messages: List[Dict[str, Any]], summary_state: Dict[str, Any] = None, offset: int = 0, on_updated: Callable[[Dict[str, Any]], None] = None) -> Optional[Future]:
+    """
+    Runs update_rolling_summary on the background pool so the user doesn't
+    wait for it; the caller adopts the resulting state on the next turn
+    (compact_history keeps the unfolded messages verbatim meanwhile).
+    on_updated(new_state) is called from the worker when the summary changed
+    (e.g. to persist it). Returns None if no messages have left the window.
+    """
+    state = dict(summary_state or empty_summary_state())
+    if window_start(offset + len(messages)) <= (state.get("summary_message_count") or 0):
+        return None
+    # The session's message list keeps growing; the job works on a snapshot
+    snapshot = list(messages)
+
+    def run() -> Dict[str, Any]:
+        new_state = update_rolling_summary(llm, snapshot, state, offset=offset)
+        if on_updated and new_state.get("summary_message_count") != state.get("summary_message_count"):
+            on_updated(new_state)
+        return new_state
+
+    return get_background_executor().submit(contextvars.copy_context().run, run)
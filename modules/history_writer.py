@@ -0,0 +1,155 @@
+import time
+import queue
+import atexit
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Callable
+import httpx
+from supabase import Client
+from modules.resilience import CallPolicy, call_with_retries
+from modules.tracing import get_tracer
+
+# Rows per insert and how long the writer waits to fill a batch
+MAX_BATCH_ROWS = 50
+BATCH_WINDOW_SECONDS = 0.05
+# Background writes can afford patient retries (outages of up to a minute)
+WRITE_POLICY = CallPolicy(timeout=10.0, attempts=5, deadline=60.0, base_delay=0.5, max_delay=8.0)
+# How long reads wait for a conversation's queued messages, and shutdown for the whole queue
+READ_FLUSH_SECONDS = 5.0
+SHUTDOWN_FLUSH_SECONDS = 10.0
+
+_STOP = object()
+
+
+# SQLSTATEs worth retrying: serialization failure, deadlock, too many connections,
+# statement timeout, server shutdown/restart, and class 08 (connection exception)
+TRANSIENT_SQLSTATES = {"40001", "40P01", "53300", "57014", "57P01", "57P02", "57P03"}
+TRANSIENT_SQLSTATE_PREFIXES = ("08",)
+# PostgREST group 0: it could not connect to, or timed out waiting for, the database
+TRANSIENT_POSTGREST_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}
+
+
+def is_transient_db_error(exc: Exception) -> bool:
+    """
+    Network errors, timeouts, 5xx responses and the transient SQLSTATEs above.
+    Everything else (constraint violations like a deleted conversation, schema
+    errors, other PGRST codes, auth failures) fails the same way on retry.
+    """
+    if isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    # postgrest's APIError: a SQLSTATE, a PGRST code, or the HTTP status if the body wasn't JSON
+    code = str(getattr(exc, "code", "") or "")
+    if code.isdigit() and len(code) == 3:
+        return int(code) >= 500
+    return code in TRANSIENT_SQLSTATES or code.startswith(TRANSIENT_SQLSTATE_PREFIXES) or code in TRANSIENT_POSTGREST_CODES
+
+
+class HistoryWriter:
+    """
+    Write-behind queue for chat messages.
+
+    add_message() only enqueues; a daemon thread batches rows into one insert
+    into `messages` (conversations.updated_at is maintained by a trigger, see
+    sql/setup_chat_history.sql), retries transient failures and flushes the
+    queue at interpreter shutdown.
+
+    Reads of a conversation should call flush(conversation_id) first so they
+    see the messages still in the queue.
+    """
+
+    def __init__(self, client: Client, max_batch: int = MAX_BATCH_ROWS, window: float = BATCH_WINDOW_SECONDS, on_written: Callable[[List[Dict[str, Any]]], None] = None):
+        self.client = client
+        self.on_written = on_written
+        self.max_batch = max_batch
+        self.window = window
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: Counter = Counter()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, row: Dict[str, Any]):
+        """Queues one messages row. After close() rows are written synchronously."""
+        with self._cond:
+            self._pending[row["conversation_id"]] += 1
+        if self._closed:
+            self._write([row])
+        else:
+            self._queue.put(row)
+
+    def pending(self, conversation_id: str = None) -> int:
+        """Rows not yet written, for one conversation or in total."""
+        with self._cond:
+            return self._pending[conversation_id] if conversation_id else sum(self._pending.values())
+
+    def flush(self, conversation_id: str = None, timeout: float = READ_FLUSH_SECONDS) -> bool:
+        """Waits until the queued rows (of one conversation, or all) are written. False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.pending(conversation_id) == 0, timeout)
+
+    def close(self, timeout: float = SHUTDOWN_FLUSH_SECONDS):
+        """Writes everything still queued and stops the thread (registered with atexit)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"History writer: {self.pending()} messages not written at shutdown")
+
+    def _run(self):
+        stop = False
+        while not stop:
+            row = self._queue.get()
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        call_with_retries(
+            lambda timeout: self.client.table("messages").insert(rows).execute(),
+            WRITE_POLICY,
+            "history.insert",
+            should_retry=is_transient_db_error
+        )
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            with get_tracer().span("history.write_batch", rows=len(batch)):
+                try:
+                    self._insert(batch)
+                except Exception as e:
+                    if len(batch) == 1:
+                        raise
+                    # One bad row (e.g. its conversation was deleted) must not drop the others
+                    print(f"History writer: batch insert failed ({e!r}); writing rows individually")
+                    for row in batch:
+                        try:
+                            self.client.table("messages").insert(row).execute()
+                        except Exception as row_error:
+                            print(f"Error adding message: {row_error}")
+        except Exception as e:
+            print(f"Error adding message: {e}")
+        finally:
+            if self.on_written:
+                # e.g. the conversation list order changed (updated_at trigger)
+                self.on_written(batch)
+            with self._cond:
+                self._pending.subtract(row["conversation_id"] for row in batch)
+                self._pending = +self._pending  # drop zero counts
+                self._cond.notify_all()
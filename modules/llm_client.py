@@ -1,38 +1,117 @@
 import streamlit as st
 from anthropic import Anthropic
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import re
+import time
+import datetime
+import threading
+from modules.clients import get_anthropic_client, get_hedge_executor
+from modules.resilience import CALL_POLICIES, DeadlineExceeded, call_with_retries, hedged_call, is_retryable
+from modules.tracing import get_tracer
+from modules.query_cache import get_query_cache
+from modules.context_packer import pack_context, estimate_tokens
+from modules.models import get_model_by_id
+
+# Prompt caching: mark a content block as the end of a cacheable prefix
+CACHE_CONTROL = {"type": "ephemeral"}
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+GENERATION_SYSTEM_PROMPT = """You are a legal assistant for the 'Advocado' project. 
+Your goal is to answer the lawyer's questions ACCURATELY based ONLY on the provided evidence context.
+
+Rules:
+1. LANGUAGE: Answer in the SAME language as the user's question. If the user asks in Japanese, answer in Japanese.
+2. REASONING: The evidence is primarily in English. You must analyze the English evidence but explain your findings in the user's language.
+3. BASE your answer STRICTLY on the provided context. If the answer is not in the context, say "I cannot find evidence for that in the current database."
+4. CITE your sources. When you state a fact, reference the Source ID or File Name (e.g., "According to email-sensei.md..."). A section labelled with several source numbers (e.g., "SOURCE 2, 5") is one continuous excerpt covering all of them.
+5. Be professional, objective, and concise.
+
+OUTPUT FORMAT:
+You must output your response in XML format:
+<root>
+  <answer>
+    [Your main response goes here. Use Markdown formatting within this tag.]
+  </answer>
+</root>
+"""
 
 class LLMClient:
     """
     Handles interaction with the LLM (Anthropic Claude) to generate answers.
     """
     
-    def __init__(self):
-        api_key = st.secrets.get("ANTHROPIC_API_KEY")
-        if not api_key:
+    def __init__(self, client: Anthropic = None):
+        # Scripts pass their own client; the app uses the shared one
+        self.client: Anthropic = client if client is not None else get_anthropic_client()
+        if not self.client:
             st.error("Anthropic API Key not found in secrets.")
-            self.client = None
-        else:
-            self.client = Anthropic(api_key=api_key)
+        # Running token totals across all calls (shared instance -> guarded)
+        self.usage_totals: Dict[str, int] = {field: 0 for field in USAGE_FIELDS}
+        self.usage_totals["calls"] = 0
+        self._usage_lock = threading.Lock()
 
-    def optimize_query(self, query: str, history: List[Dict[str, Any]], model_id: str = "claude-sonnet-4-5-20250929") -> Dict[str, Any]:
+    def _record_usage(self, usage, span: Dict[str, Any] = None) -> Dict[str, int]:
         """
-        Uses the LLM to rewrite the search query based on conversation history.
-        Returns a dictionary with 'query' and 'date_filter'.
+        Adds a response's token usage (including prompt-cache reads/writes)
+        to usage_totals and the trace span. Returns the per-call numbers.
         """
-        if not self.client:
-            return {"query": query, "date_filter": None}
+        call_usage = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+        with self._usage_lock:
+            for field, value in call_usage.items():
+                self.usage_totals[field] += value
+            self.usage_totals["calls"] += 1
+        if span is not None:
+            span["attrs"].update(call_usage)
+        return call_usage
 
-        # Format history for the prompt
+    def _create(self, call: str, **request):
+        """
+        messages.create under the call's time budget (modules/resilience.py):
+        per-attempt timeout, jittered retries and, if configured, a hedged
+        duplicate request for slow responses.
+        """
+        policy = CALL_POLICIES[call]
+
+        def attempt():
+            return call_with_retries(
+                lambda timeout: self.client.messages.create(timeout=timeout, **request),
+                policy, f"llm.{call}"
+            )
+
+        if policy.hedge_after:
+            return hedged_call(attempt, policy.hedge_after, get_hedge_executor())
+        return attempt()
+
+    @staticmethod
+    def _format_history(history: List[Dict[str, Any]], history_summary: str = None) -> str:
+        """Formats the (compacted) conversation for the query-rewriting prompts."""
         history_text = ""
+        if history_summary:
+            history_text += f"SUMMARY OF EARLIER CONVERSATION: {history_summary}\n"
         if history:
             for msg in history:
                 role = msg["role"]
                 content = msg["content"]
                 history_text += f"{role.upper()}: {content}\n"
-        else:
+        if not history_text:
             history_text = "No previous conversation history."
+        return history_text
+
+    def optimize_query(self, query: str, history: List[Dict[str, Any]], model_id: str = "claude-sonnet-4-5-20250929", history_summary: str = None) -> Dict[str, Any]:
+        """
+        Uses the LLM to rewrite the search query based on conversation history.
+        Returns a dictionary with 'query' and 'date_filter'.
+        """
+        if not self.client:
+            return {"query": query, "date_filter": None}
+
+        # Same prompt at temperature 0 -> reuse the earlier rewrite
+        cached = get_query_cache().get("optimize_query", query, history, model_id, history_summary)
+        if cached:
+            return cached
+
+        # Format history for the prompt
+        history_text = self._format_history(history, history_summary)
 
         prompt = f"""Based on the following conversation history and the user's latest question, generate a specific, standalone search query to find relevant legal evidence.
         
@@ -43,7 +122,7 @@ User's Question: {query}
 
 Task:
 1. Generate an optimized search query (resolve pronouns, include keywords).
-2. Extract any specific date mentioned in the query (YYYY-MM-DD).
+2. Extract any specific date the question refers to (YYYY-MM-DD), including a date it refers to from the history. Today is {datetime.date.today().isoformat()}; a date written without a year is its most recent past occurrence.
 
 Output Format:
 Return ONLY a JSON object:
@@ -54,14 +133,17 @@ Return ONLY a JSON object:
 """
 
         try:
-            message = self.client.messages.create(
-                model=model_id,
-                max_tokens=100,
-                temperature=0.0,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            with get_tracer().span("llm.optimize_query", model=model_id) as span:
+                message = self._create(
+                    "optimize_query",
+                    model=model_id,
+                    max_tokens=100,
+                    temperature=0.0,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+                self._record_usage(message.usage, span)
             response_text = message.content[0].text.strip()
             
             # Clean up potential markdown code blocks
@@ -73,13 +155,15 @@ Return ONLY a JSON object:
                 response_text = response_text[:-3]
                 
             import json
-            return json.loads(response_text.strip())
+            result = json.loads(response_text.strip())
+            get_query_cache().put("optimize_query", query, history, model_id, result, history_summary)
+            return result
             
         except Exception as e:
             print(f"Query optimization error: {e}")
             return {"query": query, "date_filter": None}
 
-    def expand_query_multilingual(self, query: str, history: List[Dict[str, Any]], model_id: str = "claude-sonnet-4-5-20250929") -> Dict[str, str]:
+    def expand_query_multilingual(self, query: str, history: List[Dict[str, Any]], model_id: str = "claude-sonnet-4-5-20250929", history_summary: str = None) -> Dict[str, str]:
         """
         Generates 4 variants of the search query for deep multilingual search.
         Returns a dictionary with keys: 'original', 'original_keywords', 'translated', 'translated_keywords'.
@@ -87,15 +171,12 @@ Return ONLY a JSON object:
         if not self.client:
             return {"original": query}
 
+        cached = get_query_cache().get("expand_query_multilingual", query, history, model_id, history_summary)
+        if cached:
+            return cached
+
         # Format history
-        history_text = ""
-        if history:
-            for msg in history:
-                role = msg["role"]
-                content = msg["content"]
-                history_text += f"{role.upper()}: {content}\n"
-        else:
-            history_text = "No previous conversation history."
+        history_text = self._format_history(history, history_summary)
 
         prompt = f"""You are an expert legal search assistant. Your goal is to generate multiple search query variants to maximize recall in a bilingual (Japanese/English) evidence database.
 
@@ -112,8 +193,8 @@ Task:
    - "translated": The user's intent TRANSLATED into the TARGET language (if JP -> EN, if EN -> JP).
    - "translated_keywords": Key search terms extracted from the translated query (space-separated).
    - "date_filter": Extract any specific date mentioned in the query in "YYYY-MM-DD" format. If no specific date is mentioned, return null.
-     - Example: "12月18日" -> "2025-12-18" (Assume 2025 if year not specified but context implies recent/future).
-     - Example: "Dec 18th" -> "2025-12-18".
+     - Today is {datetime.date.today().isoformat()}. A date written without a year is its most recent past occurrence (never a future date).
+     - Example: "12月18日" / "Dec 18th" -> the most recent past December 18 in "YYYY-MM-DD" format.
 
 CRITICAL INSTRUCTION FOR KEYWORDS:
 - Focus on UNIQUE identifiers: Dates (e.g., "2025-12-18", "12月18日"), Names ("Murakami", "Iwabuchi"), Locations ("Vietnam"), Specific Terms ("Ultimatum", "Resignation").
@@ -133,14 +214,17 @@ Return ONLY a valid JSON object with these 5 keys. Do not add markdown formattin
 }}
 """
         try:
-            message = self.client.messages.create(
-                model=model_id,
-                max_tokens=300,
-                temperature=0.0,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            with get_tracer().span("llm.expand_query", model=model_id) as span:
+                message = self._create(
+                    "expand_query",
+                    model=model_id,
+                    max_tokens=300,
+                    temperature=0.0,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+                self._record_usage(message.usage, span)
             response_text = message.content[0].text.strip()
             
             # Clean up potential markdown code blocks if the model adds them
@@ -152,7 +236,9 @@ Return ONLY a valid JSON object with these 5 keys. Do not add markdown formattin
                 response_text = response_text[:-3]
                 
             import json
-            return json.loads(response_text.strip())
+            result = json.loads(response_text.strip())
+            get_query_cache().put("expand_query_multilingual", query, history, model_id, result, history_summary)
+            return result
             
         except Exception as e:
             print(f"Multilingual expansion error: {e}")
@@ -165,45 +251,190 @@ Return ONLY a valid JSON object with these 5 keys. Do not add markdown formattin
                 "date_filter": None
             }
 
-    def generate_response(self, query: str, context_chunks: List[Dict[str, Any]], history: List[Dict[str, Any]] = None, model_id: str = "claude-sonnet-4-5-20250929") -> tuple[str, Dict[str, str]]:
+    def summarize_history(self, previous_summary: str, messages: List[Dict[str, Any]], model_id: str = "claude-haiku-4-5-20251001") -> str:
+        """
+        Folds messages that have left the verbatim history window into the rolling summary.
+        Returns the new summary, or None on error.
+        """
+        if not self.client or not messages:
+            return previous_summary
+
+        new_text = "".join(f"{msg['role'].upper()}: {msg['content']}\n" for msg in messages)
+        prompt = f"""You maintain a running summary of a legal research conversation about case evidence.
+
+Current summary:
+{previous_summary or "(empty)"}
+
+New messages to fold in:
+{new_text}
+
+Task:
+Return an updated summary (max 200 words) that keeps names, dates, documents, open questions and conclusions needed to understand later follow-up questions. Write in the language used by the user. Return ONLY the summary text.
+"""
+        try:
+            with get_tracer().span("llm.summarize_history", model=model_id, messages=len(messages)) as span:
+                message = self._create(
+                    "summarize_history",
+                    model=model_id,
+                    max_tokens=400,
+                    temperature=0.0,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+                self._record_usage(message.usage, span)
+            return message.content[0].text.strip()
+        except Exception as e:
+            print(f"History summary error: {e}")
+            return None
+
+    def generate_previews(self, chunks: List[Dict[str, Any]], language: str, model_id: str = "claude-haiku-4-5-20251001") -> Dict[str, str]:
+        """
+        Writes a 1-sentence summary/translation of each chunk in the target language.
+        Runs separately from (and in parallel with) answer generation on a cheap model.
+        Returns: {"1": preview, "2": preview, ...} in the order of `chunks`.
+        """
+        if not self.client or not chunks:
+            return {}
+
+        target = "Japanese" if language == "ja" else "English"
+        sources_text = ""
+        for i, chunk in enumerate(chunks):
+            sources_text += f"--- SOURCE {i+1}: {chunk.get('file_path', 'Unknown File')} ---\n{chunk.get('content', '')}\n\n"
+
+        prompt = f"""For each source below, write a 1-sentence summary/translation in {target} that tells a lawyer what the excerpt is about.
+
+{sources_text}
+Output ONLY this XML, one line per source:
+<preview index="1">...</preview>
+<preview index="2">...</preview>
+"""
+        try:
+            with get_tracer().span("llm.previews", model=model_id, sources=len(chunks)) as span:
+                message = self._create(
+                    "previews",
+                    model=model_id,
+                    max_tokens=100 * len(chunks) + 100,
+                    temperature=0.0,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
+                self._record_usage(message.usage, span)
+            return self._parse_previews(message.content[0].text)
+        except Exception as e:
+            print(f"Preview generation error: {e}")
+            return {}
+
+    def generate_response(self, query: str, context_chunks: List[Dict[str, Any]], history: List[Dict[str, Any]] = None, model_id: str = "claude-sonnet-4-5-20250929", history_summary: str = None) -> str:
         """
         Generates a response based on the query and retrieved context.
-        Returns: (answer_text, dictionary_of_previews)
+        Source previews are produced separately (see generate_previews).
+        Returns: answer_text, or None if generation failed or ran out of its
+        time budget (degraded mode: the app shows the ranked sources only).
         """
         if not self.client:
-            return "Error: LLM client not initialized.", {}
+            return "Error: LLM client not initialized."
 
-        # 1. Prepare Context
-        context_text = ""
-        for i, chunk in enumerate(context_chunks):
-            source = chunk.get('file_path', 'Unknown File')
-            content = chunk.get('content', '').strip()
-            context_text += f"--- SOURCE {i+1}: {source} ---\n{content}\n\n"
+        system_blocks, final_messages = self._build_generation_request(query, context_chunks, history, model_id, history_summary)
 
-        # 2. Construct System Prompt
-        system_prompt = """You are a legal assistant for the 'Advocado' project. 
-Your goal is to answer the lawyer's questions ACCURATELY based ONLY on the provided evidence context.
+        # 3. Call API
+        try:
+            with get_tracer().span("llm.generate", model=model_id, sources=len(context_chunks)) as span:
+                message = self._create(
+                    "generate",
+                    model=model_id,
+                    max_tokens=2000,
+                    temperature=0.2,
+                    system=system_blocks,
+                    messages=final_messages
+                )
+                self._record_usage(message.usage, span)
+            raw_response = message.content[0].text
+            return self._parse_generation(raw_response)
+            
+        except Exception as e:
+            print(f"Generation error: {e!r}")
+            return None
 
-Rules:
-1. LANGUAGE: Answer in the SAME language as the user's question. If the user asks in Japanese, answer in Japanese.
-2. REASONING: The evidence is primarily in English. You must analyze the English evidence but explain your findings in the user's language.
-3. BASE your answer STRICTLY on the provided context. If the answer is not in the context, say "I cannot find evidence for that in the current database."
-4. CITE your sources. When you state a fact, reference the Source ID or File Name (e.g., "According to email-sensei.md...").
-5. Be professional, objective, and concise.
+    def generate_response_stream(self, query: str, context_chunks: List[Dict[str, Any]], history: List[Dict[str, Any]] = None, model_id: str = "claude-sonnet-4-5-20250929", on_answer: Callable[[str], None] = None, history_summary: str = None) -> Tuple[Optional[str], bool]:
+        """
+        Streaming variant of generate_response.
+        Calls on_answer(answer_so_far) as the <answer> section arrives, so the UI can
+        render tokens immediately.
+        Returns: (answer_text, complete). answer_text is None if no answer could
+        be produced within the time budget (degraded mode). If the stream breaks
+        or runs past the deadline after the answer has started, the partial
+        answer already on screen is returned with complete=False; callers must
+        not cache it.
+        """
+        if not self.client:
+            return None, False
 
-OUTPUT FORMAT:
-You must output your response in XML format:
-<root>
-  <answer>
-    [Your main response goes here. Use Markdown formatting within this tag.]
-  </answer>
-  <previews>
-    <preview index="1">[A 1-sentence summary/translation of Source 1 in the target language]</preview>
-    <preview index="2">[A 1-sentence summary/translation of Source 2 in the target language]</preview>
-    ...
-  </previews>
-</root>
-"""
+        system_blocks, final_messages = self._build_generation_request(query, context_chunks, history, model_id, history_summary)
+        parser = AnswerStreamParser()
+        policy = CALL_POLICIES["generate"]
+        # The per-attempt timeout applies to each read, so a slowly trickling
+        # stream is only stopped by checking the total budget between chunks
+        deadline = time.monotonic() + policy.deadline
+
+        try:
+            with get_tracer().span("llm.generate_stream", model=model_id, sources=len(context_chunks)) as span:
+                started = time.perf_counter()
+
+                def stream_once(timeout: float):
+                    nonlocal parser
+                    parser = AnswerStreamParser()
+                    with self.client.messages.stream(
+                        model=model_id,
+                        max_tokens=2000,
+                        temperature=0.2,
+                        system=system_blocks,
+                        messages=final_messages,
+                        timeout=timeout
+                    ) as stream:
+                        for text in stream.text_stream:
+                            if time.monotonic() > deadline:
+                                raise DeadlineExceeded(f"llm.generate_stream: deadline of {policy.deadline}s exceeded while streaming")
+                            if not parser.feed(text):
+                                continue
+                            if "time_to_first_token_ms" not in span["attrs"]:
+                                span["attrs"]["time_to_first_token_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                            if on_answer:
+                                on_answer(parser.answer)
+                        return stream.get_final_message()
+
+                message = call_with_retries(
+                    stream_once, policy, "llm.generate_stream",
+                    # A retry would restart an answer the user is already reading
+                    should_retry=lambda e: is_retryable(e) and not parser.answer
+                )
+                self._record_usage(message.usage, span)
+
+            raw_response = "".join(block.text for block in message.content if hasattr(block, "text"))
+            # Hitting max_tokens (or a stream that ended without a stop reason) cuts the answer off too
+            return self._parse_generation(raw_response), getattr(message, "stop_reason", None) not in (None, "max_tokens")
+
+        except Exception as e:
+            print(f"Generation error: {e!r}")
+            return parser.answer or None, False
+
+    def _build_generation_request(self, query: str, context_chunks: List[Dict[str, Any]], history: List[Dict[str, Any]] = None, model_id: str = "claude-sonnet-4-5-20250929", history_summary: str = None) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Builds the system blocks and message list for answer generation.
+
+        Prompt caching: the system prompt plus the verbatim history is the
+        prefix shared by consecutive turns (compact_history only appends to
+        it between window steps), so one breakpoint goes on the last history
+        message - but only once that prefix reaches the model's minimum
+        cacheable length; shorter breakpoints are ignored by the API. Parts
+        that change every turn (rolling summary, context, question) come after it.
+        """
+        # 1. Prepare Context (overlap-free, within the model's token budget)
+        context_text = pack_context(context_chunks, model_id)
+
+        # 2. Construct System Prompt
+        system_blocks = [{"type": "text", "text": GENERATION_SYSTEM_PROMPT}]
 
         # 3. Prepare Messages with History
         final_messages = []
@@ -211,46 +442,101 @@ You must output your response in XML format:
         # Add history if available (excluding the current user message)
         if history:
             for msg in history:
-                 final_messages.append({"role": msg["role"], "content": msg["content"]})
-        
+                 final_messages.append({"role": msg["role"], "content": [{"type": "text", "text": msg["content"]}]})
+            prefix_tokens = estimate_tokens(GENERATION_SYSTEM_PROMPT) + sum(estimate_tokens(msg["content"]) for msg in history)
+            if prefix_tokens >= get_model_by_id(model_id).prompt_cache_min_tokens:
+                # Breakpoint: everything up to here is identical on the next turn
+                final_messages[-1]["content"][0]["cache_control"] = CACHE_CONTROL
+
+        # The summary is rewritten as the conversation grows, so it stays out of the cached prefix
+        summary_text = f"Summary of the earlier part of this conversation:\n{history_summary}\n\n" if history_summary else ""
+
         # Add the current turn with context
         final_messages.append({
             "role": "user", 
-            "content": f"Context:\n{context_text}\n\nQuestion: {query}"
+            "content": f"{summary_text}Context:\n{context_text}\n\nQuestion: {query}"
         })
 
-        # 3. Call API
-        try:
-            message = self.client.messages.create(
-                model=model_id,
-                max_tokens=2000,
-                temperature=0.2,
-                system=system_prompt,
-                messages=final_messages
-            )
-            raw_response = message.content[0].text
-            
-            # Parse XML
-            # Extract Answer
-            answer_match = re.search(r'<answer>(.*?)</answer>', raw_response, re.DOTALL)
-            if answer_match:
-                answer_text = answer_match.group(1).strip()
-            else:
-                # Fallback: try to find text before <previews> or just return everything
-                if "<previews>" in raw_response:
-                    answer_text = raw_response.split("<previews>")[0].strip()
-                else:
-                    answer_text = raw_response
-            
-            # Extract Previews
-            previews = {}
-            preview_matches = re.finditer(r'<preview index="(\d+)">(.*?)</preview>', raw_response, re.DOTALL)
-            for match in preview_matches:
-                idx = match.group(1)
-                text = match.group(2).strip()
-                previews[idx] = text
-                
-            return answer_text, previews
-            
-        except Exception as e:
-            return f"Error generating response: {e}", {}
+        return system_blocks, final_messages
+
+    @staticmethod
+    def _parse_generation(raw_response: str) -> str:
+        """
+        Parses the <answer> XML produced by the generation prompt.
+        """
+        answer_match = re.search(r'<answer>(.*?)</answer>', raw_response, re.DOTALL)
+        if answer_match:
+            return answer_match.group(1).strip()
+        # Fallback: return everything without the XML wrapper
+        return re.sub(r'</?(root|answer)>', '', raw_response).strip()
+
+    @staticmethod
+    def _parse_previews(raw_response: str) -> Dict[str, str]:
+        """
+        Parses <preview index="N"> tags into {"N": text}.
+        """
+        previews = {}
+        preview_matches = re.finditer(r'<preview index="(\d+)">(.*?)</preview>', raw_response, re.DOTALL)
+        for match in preview_matches:
+            idx = match.group(1)
+            text = match.group(2).strip()
+            previews[idx] = text
+        return previews
+
+
+class AnswerStreamParser:
+    """
+    Incrementally extracts the text inside <answer>...</answer> from streamed XML.
+    Tags may be split across chunks, so a possible partial tag is held back
+    until the next chunk arrives.
+    """
+    OPEN_TAG = "<answer>"
+    CLOSE_TAG = "</answer>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.state = "before"  # before -> inside -> done
+        self.answer = ""
+
+    @staticmethod
+    def _partial_tag_len(text: str, tag: str) -> int:
+        """Length of the longest suffix of text that is a prefix of tag."""
+        for n in range(min(len(text), len(tag) - 1), 0, -1):
+            if text.endswith(tag[:n]):
+                return n
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        """Adds a streamed chunk; returns the newly available answer text (may be empty)."""
+        if self.state == "done":
+            return ""
+        self.buffer += chunk
+
+        if self.state == "before":
+            idx = self.buffer.find(self.OPEN_TAG)
+            if idx < 0:
+                self.buffer = self.buffer[len(self.buffer) - self._partial_tag_len(self.buffer, self.OPEN_TAG):]
+                return ""
+            self.buffer = self.buffer[idx + len(self.OPEN_TAG):]
+            self.state = "inside"
+
+        idx = self.buffer.find(self.CLOSE_TAG)
+        if idx >= 0:
+            new_text = self.buffer[:idx]
+            self.buffer = ""
+            self.state = "done"
+        else:
+            hold = self._partial_tag_len(self.buffer, self.CLOSE_TAG)
+            new_text = self.buffer[:len(self.buffer) - hold]
+            self.buffer = self.buffer[len(self.buffer) - hold:]
+
+        if not self.answer:
+            new_text = new_text.lstrip()
+        self.answer += new_text
+        return new_text
+
+
+@st.cache_resource
+def get_llm_client() -> LLMClient:
+    """Returns the process-wide LLMClient shared by all sessions."""
+    return LLMClient()
@@ -0,0 +1,41 @@
+from typing import Dict, Optional
+from modules.clients import get_setting
+from modules.models import MODELS, DEFAULT_MODEL_ID, TIER_FAST, AnthropicModel
+
+# Task -> minimum capability tier. "answer" is not listed: final answers
+# always use the model the user picked.
+TASK_MIN_TIER: Dict[str, int] = {
+    "optimize_query": TIER_FAST,
+    "expand_query": TIER_FAST,
+    "previews": TIER_FAST,
+    "summary": TIER_FAST,
+}
+
+
+def _override(task: str) -> Optional[str]:
+    """
+    Per-task model override: [MODEL_ROUTING] table in secrets.toml
+    (e.g. expand_query = "claude-sonnet-4-5-20250929") or MODEL_ROUTE_<TASK> env var.
+    """
+    routing = get_setting("MODEL_ROUTING") or {}
+    return routing.get(task) or get_setting(f"MODEL_ROUTE_{task.upper()}")
+
+
+def fastest_adequate_model(min_tier: int) -> AnthropicModel:
+    """Lowest-latency (then cheapest) non-legacy model of at least min_tier."""
+    candidates = [m for m in MODELS if not m.legacy and m.tier >= min_tier]
+    return min(candidates, key=lambda m: (m.relative_latency, m.output_cost_per_mtok))
+
+
+def route_model(task: str, selected_model_id: str = None) -> str:
+    """
+    Returns the api_id to use for a task.
+    - "answer" (or any unknown task) keeps the user's selected model.
+    - Auxiliary tasks go to the fastest adequate model, unless overridden.
+    """
+    override = _override(task)
+    if override:
+        return override
+    if task not in TASK_MIN_TIER:
+        return selected_model_id or DEFAULT_MODEL_ID
+    return fastest_adequate_model(TASK_MIN_TIER[task]).api_id
@@ -1,12 +1,35 @@
 from typing import Dict, List
 
+# Capability tiers used by the model router (model_router.py)
+TIER_FAST = 1
+TIER_BALANCED = 2
+TIER_PREMIUM = 3
+
 class AnthropicModel:
-    def __init__(self, name: str, api_id: str, description: str, context_window: str, max_output: str):
+    def __init__(self, name: str, api_id: str, description: str, context_window: str, max_output: str, context_budget_tokens: int = 30000,
+                 tier: int = TIER_BALANCED, relative_latency: float = 1.0, input_cost_per_mtok: float = 0.0, output_cost_per_mtok: float = 0.0, legacy: bool = False,
+                 prompt_cache_min_tokens: int = 1024):
         self.name = name
         self.api_id = api_id
         self.description = description
         self.context_window = context_window
         self.max_output = max_output
+        # Max evidence tokens packed into a generation prompt (see context_packer.py)
+        self.context_budget_tokens = context_budget_tokens
+        # Routing metadata: capability tier, typical latency relative to the
+        # fastest model (1.0), and USD per million input/output tokens
+        self.tier = tier
+        self.relative_latency = relative_latency
+        self.input_cost_per_mtok = input_cost_per_mtok
+        self.output_cost_per_mtok = output_cost_per_mtok
+        # Legacy models stay selectable but are never picked by the router
+        self.legacy = legacy
+        # Shortest prefix Anthropic will cache for this model; shorter breakpoints are ignored
+        self.prompt_cache_min_tokens = prompt_cache_min_tokens
+
+    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        """USD cost of a call with the given token counts."""
+        return (input_tokens * self.input_cost_per_mtok + output_tokens * self.output_cost_per_mtok) / 1_000_000
 
 # Model Definitions based on Anthropic documentation
 MODELS: List[AnthropicModel] = [
@@ -15,21 +38,38 @@ MODELS: List[AnthropicModel] = [
         api_id="claude-sonnet-4-5-20250929",
         description="Our smart model for complex agents and coding. Best balance of intelligence, speed, and cost.",
         context_window="200K tokens / 1M tokens (beta)",
-        max_output="64K tokens"
+        max_output="64K tokens",
+        context_budget_tokens=30000,
+        tier=TIER_BALANCED,
+        relative_latency=2.0,
+        input_cost_per_mtok=3.0,
+        output_cost_per_mtok=15.0
     ),
     AnthropicModel(
         name="Claude Haiku 4.5",
         api_id="claude-haiku-4-5-20251001",
         description="Our fastest model with near-frontier intelligence.",
         context_window="200K tokens",
-        max_output="64K tokens"
+        max_output="64K tokens",
+        context_budget_tokens=20000,
+        tier=TIER_FAST,
+        relative_latency=1.0,
+        input_cost_per_mtok=1.0,
+        output_cost_per_mtok=5.0,
+        prompt_cache_min_tokens=4096
     ),
     AnthropicModel(
         name="Claude Opus 4.5",
         api_id="claude-opus-4-5-20251101",
         description="Premium model combining maximum intelligence with practical performance.",
         context_window="200K tokens",
-        max_output="64K tokens"
+        max_output="64K tokens",
+        context_budget_tokens=30000,
+        tier=TIER_PREMIUM,
+        relative_latency=3.0,
+        input_cost_per_mtok=5.0,
+        output_cost_per_mtok=25.0,
+        prompt_cache_min_tokens=4096
     ),
     # Fallback/Legacy models if needed
     AnthropicModel(
@@ -37,7 +77,13 @@ MODELS: List[AnthropicModel] = [
         api_id="claude-3-5-sonnet-20240620",
         description="Previous generation Sonnet model.",
         context_window="200K tokens",
-        max_output="4096 tokens"
+        max_output="4096 tokens",
+        context_budget_tokens=20000,
+        tier=TIER_BALANCED,
+        relative_latency=2.0,
+        input_cost_per_mtok=3.0,
+        output_cost_per_mtok=15.0,
+        legacy=True
     )
 ]
 
@@ -0,0 +1,189 @@
+import threading
+import contextvars
+import streamlit as st
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Any, Tuple
+from modules.clients import get_background_executor
+from modules.llm_client import get_llm_client
+from modules.preview_store import PreviewStore, content_hash
+from modules.query_planner import detect_language
+from modules.model_router import route_model
+
+# Max chars of each chunk sent to the preview model
+PREVIEW_INPUT_CHARS = 1200
+MAX_CACHED_PREVIEWS = 5000
+# Default wait of collect(); late previews still fill the cache
+PREVIEW_WAIT_SECONDS = 5.0
+# How long the app keeps re-rendering the sources for previews after the answer is shown
+PREVIEW_LATE_WAIT_SECONDS = 30.0
+
+
+def chunk_text(source: Dict[str, Any]) -> str:
+    """Text of a search result (document-level results carry their chunks in all_chunks)."""
+    content = source.get('content', '')
+    if not content and source.get('all_chunks'):
+        content = source['all_chunks'][0].get('content', '')
+    return content or ''
+
+
+class PreviewService:
+    """
+    Generates the per-source previews shown under each answer.
+
+    Previews used to be emitted by the main model after the answer, which
+    delayed its completion. They are now produced by a separate Haiku call
+    that runs in parallel with generation. Lookups go memory -> chunk_previews
+    table -> LLM, keyed by (chunk id, language, content hash), so each chunk
+    is previewed once per language rather than once per query.
+    """
+
+    def __init__(self, model_id: str = None, max_entries: int = MAX_CACHED_PREVIEWS, store: PreviewStore = None):
+        self.model_id = model_id or route_model("previews")
+        self.max_entries = max_entries
+        self.store = store or PreviewStore()
+        self._cache: "OrderedDict[Tuple[Any, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_cached(self, key: Tuple[Any, str, str]) -> str:
+        with self._lock:
+            preview = self._cache.get(key)
+            if preview is not None:
+                self._cache.move_to_end(key)
+            return preview
+
+    def _put_cached(self, key: Tuple[Any, str, str], preview: str):
+        with self._lock:
+            self._cache[key] = preview
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def lookup(self, results: List[Dict[str, Any]], language: str) -> Tuple[Dict[Any, str], List[Dict[str, Any]]]:
+        """
+        Previews already known (memory or chunk_previews, one bulk read).
+        Returns ({chunk id: preview}, results still missing a preview).
+        """
+        previews = {}
+        pending = {}
+        for res in results:
+            chunk_id = res.get('id')
+            text = chunk_text(res)
+            if chunk_id is None or not text:
+                continue
+            digest = content_hash(text)
+            cached = self._get_cached((chunk_id, language, digest))
+            if cached is not None:
+                previews[chunk_id] = cached
+            else:
+                pending[chunk_id] = (res, digest)
+
+        if pending:
+            stored = self.store.get_many([(chunk_id, digest) for chunk_id, (_, digest) in pending.items()], language)
+            for chunk_id, (_, digest) in pending.items():
+                if chunk_id in stored:
+                    self._put_cached((chunk_id, language, digest), stored[chunk_id])
+                    previews[chunk_id] = stored[chunk_id]
+
+        missing = [res for chunk_id, (res, _) in pending.items() if chunk_id not in previews]
+        return previews, missing
+
+    def get_previews(self, results: List[Dict[str, Any]], language: str) -> Dict[Any, str]:
+        """
+        Returns {chunk id: preview} for the given results, calling the LLM
+        only for chunks without a stored preview (and storing the new ones).
+        """
+        previews, missing = self.lookup(results, language)
+        if not missing:
+            return previews
+
+        generated = get_llm_client().generate_previews(
+            [{"file_path": r.get('file_path'), "content": chunk_text(r)[:PREVIEW_INPUT_CHARS]} for r in missing],
+            language,
+            model_id=self.model_id
+        )
+        rows = []
+        for i, res in enumerate(missing):
+            preview = generated.get(str(i + 1))
+            if not preview:
+                continue
+            digest = content_hash(chunk_text(res))
+            self._put_cached((res['id'], language, digest), preview)
+            previews[res['id']] = preview
+            rows.append({
+                "chunk_id": res['id'],
+                "language": language,
+                "content_hash": digest,
+                "preview": preview,
+                "model": self.model_id
+            })
+        self.store.upsert_many(rows)
+
+        return previews
+
+    def start(self, results: List[Dict[str, Any]], language: str) -> Future:
+        """Starts get_previews on the background pool (inside the current trace context)."""
+        return get_background_executor().submit(
+            contextvars.copy_context().run,
+            self.get_previews, list(results), language
+        )
+
+    @staticmethod
+    def collect(future: Future, timeout: float = PREVIEW_WAIT_SECONDS) -> Dict[Any, str]:
+        """Waits for a started preview job; returns {} if it is not done in time."""
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Previews not available: {e!r}")
+            return {}
+
+    def apply_when_done(self, future: Future, results: List[Dict[str, Any]]):
+        """
+        Applies the job's previews to `results` whenever it finishes, so sources
+        kept in the session show late previews on the next rerun.
+        """
+        def done(f: Future):
+            if not f.cancelled() and f.exception() is None:
+                self.apply(results, f.result())
+        future.add_done_callback(done)
+
+    @staticmethod
+    def apply(results: List[Dict[str, Any]], previews: Dict[Any, str]):
+        """Stores previews on the results as 'translated_preview' (read by the sources UI)."""
+        for res in results:
+            preview = previews.get(res.get('id'))
+            if preview:
+                res['translated_preview'] = preview
+
+    def fill_known(self, results: List[Dict[str, Any]], language: str):
+        """
+        Applies known previews (memory or chunk_previews) to results that have
+        none, e.g. cached answers saved before their previews finished.
+        Never calls the LLM.
+        """
+        missing = [r for r in results if 'translated_preview' not in r]
+        if missing:
+            self.apply(missing, self.lookup(missing, language)[0])
+
+    def hydrate_messages(self, messages: List[Dict[str, Any]]):
+        """
+        Fills in stored previews for sources of loaded messages that have none
+        (e.g. the preview was still running when the answer was saved).
+        One bulk read per language; never calls the LLM.
+        """
+        by_language: Dict[str, List[Dict[str, Any]]] = {}
+        language = "en"
+        for msg in messages:
+            if msg["role"] == "user":
+                language = detect_language(msg["content"])
+            elif msg.get("sources"):
+                by_language.setdefault(language, []).extend(msg["sources"])
+
+        for language, sources in by_language.items():
+            self.fill_known(sources, language)
+
+
+@st.cache_resource
+def get_preview_service() -> PreviewService:
+    """Returns the process-wide PreviewService shared by all sessions."""
+    return PreviewService()
@@ -0,0 +1,64 @@
+import hashlib
+from typing import List, Dict, Any, Tuple
+from modules.clients import get_supabase_client
+from modules.tracing import get_tracer
+
+# Max ids per `in` filter (keeps the PostgREST URL short)
+BULK_BATCH_SIZE = 200
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's content; a re-ingested chunk with new text gets a new preview."""
+    return hashlib.sha256((text or "").encode('utf-8')).hexdigest()
+
+
+class PreviewStore:
+    """
+    Persistent chunk_previews table (sql/setup_chunk_previews.sql).
+    A preview is written once per (chunk id, language, content hash) and then
+    reused by every later query that retrieves the same chunk.
+    """
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else get_supabase_client()
+
+    def get_many(self, chunks: List[Tuple[Any, str]], language: str) -> Dict[Any, str]:
+        """
+        Bulk lookup. `chunks` is a list of (chunk_id, content_hash).
+        Returns {chunk_id: preview} for the chunks that have a stored preview.
+        """
+        wanted = {chunk_id: digest for chunk_id, digest in chunks}
+        if not wanted:
+            return {}
+
+        previews = {}
+        ids = list(wanted)
+        try:
+            with get_tracer().span("previews.store_get", chunks=len(ids)):
+                for start in range(0, len(ids), BULK_BATCH_SIZE):
+                    response = self.client.table("chunk_previews") \
+                        .select("chunk_id, content_hash, preview") \
+                        .in_("chunk_id", ids[start:start + BULK_BATCH_SIZE]) \
+                        .eq("language", language) \
+                        .execute()
+                    for row in response.data or []:
+                        if wanted.get(row["chunk_id"]) == row["content_hash"]:
+                            previews[row["chunk_id"]] = row["preview"]
+        except Exception as e:
+            print(f"Error reading chunk previews: {e}")
+        return previews
+
+    def upsert_many(self, rows: List[Dict[str, Any]]):
+        """
+        Bulk write. Each row: {chunk_id, language, content_hash, preview, model}.
+        """
+        if not rows:
+            return
+        try:
+            with get_tracer().span("previews.store_put", chunks=len(rows)):
+                for start in range(0, len(rows), BULK_BATCH_SIZE):
+                    self.client.table("chunk_previews") \
+                        .upsert(rows[start:start + BULK_BATCH_SIZE], on_conflict="chunk_id,language,content_hash") \
+                        .execute()
+        except Exception as e:
+            print(f"Error writing chunk previews: {e}")
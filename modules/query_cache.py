@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+from typing import List, Dict, Any, Optional
+
+# Local SQLite store; survives page reloads and new conversations (not redeploys)
+QUERY_CACHE_PATH = os.getenv('QUERY_CACHE_PATH', '.cache/query_cache.sqlite3')
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def normalize_history(history: List[Dict[str, Any]]) -> List[List[str]]:
+    """Reduces history to what the prompts actually use: role + whitespace-normalized content."""
+    if not history:
+        return []
+    return [[msg["role"], " ".join(str(msg["content"]).split())] for msg in history]
+
+
+class QueryCache:
+    """
+    Persistent cache for query rewriting results (optimize_query,
+    expand_query_multilingual). Both run at temperature 0, so the same
+    (query, history, model) always produces the same JSON on the same day:
+    the prompts include today's date to resolve "yesterday" and year-less
+    dates, so the date is part of the key.
+    """
+
+    def __init__(self, path: str = QUERY_CACHE_PATH, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "create table if not exists query_cache ("
+            " key text primary key,"
+            " kind text not null,"
+            " value text not null,"
+            " created_at real not null)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(kind: str, query: str, history: List[Dict[str, Any]], model_id: str, history_summary: str = None) -> str:
+        payload = json.dumps(
+            [kind, query.strip(), normalize_history(history), model_id, history_summary or "", datetime.date.today().isoformat()],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, kind: str, query: str, history: List[Dict[str, Any]], model_id: str, history_summary: str = None) -> Optional[Dict[str, Any]]:
+        key = self.make_key(kind, query, history, model_id, history_summary)
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "select value, created_at from query_cache where key = ?", (key,)
+                ).fetchone()
+            if not row or time.time() - row[1] > self.ttl_seconds:
+                return None
+            return json.loads(row[0])
+        except Exception as e:
+            print(f"Query cache read error: {e}")
+            return None
+
+    def put(self, kind: str, query: str, history: List[Dict[str, Any]], model_id: str, value: Dict[str, Any], history_summary: str = None):
+        key = self.make_key(kind, query, history, model_id, history_summary)
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "insert or replace into query_cache (key, kind, value, created_at) values (?, ?, ?, ?)",
+                    (key, kind, json.dumps(value, ensure_ascii=False), time.time())
+                )
+                # Drop expired rows as we go
+                self._conn.execute("delete from query_cache where created_at < ?", (time.time() - self.ttl_seconds,))
+                self._conn.commit()
+        except Exception as e:
+            print(f"Query cache write error: {e}")
+
+
+_query_cache: Optional[QueryCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """Returns the process-wide query cache."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryCache()
+    return _query_cache
@@ -0,0 +1,162 @@
+import re
+import json
+import math
+import datetime
+import streamlit as st
+from typing import List, Dict, Any, Optional
+from modules.date_parser import extract_date_filter, MONTHS, RANGE_SEPARATOR
+
+# Document-frequency table generated by scripts/build_idf_table.py
+IDF_TABLE_PATH = "docs/search_by_folder/idf_table.json"
+MAX_KEYWORDS = 6
+
+# Tokens: dates, latin words, katakana runs, kanji runs (hiragana is mostly grammar)
+_TOKEN_RE = re.compile(
+    r'\d{4}-\d{2}-\d{2}'
+    r'|[A-Za-z][A-Za-z0-9\'\-]+'
+    r'|[゠-ヿㇰ-ㇿｦ-ﾟ]{2,}'
+    r'|[一-鿿々]{2,}'
+)
+_JAPANESE_RE = re.compile(r'[぀-ヿ一-鿿々ｦ-ﾟ]')
+
+# Generic words that appear in almost every document (same spirit as the LLM prompt)
+STOPWORDS = {
+    "the", "a", "an", "and", "or", "of", "to", "in", "on", "at", "for", "by", "with", "from",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "what", "when", "where",
+    "who", "whom", "which", "why", "how", "about", "any", "there", "have", "has", "had",
+    "can", "could", "would", "should", "we", "you", "me", "my", "our", "your", "i",
+    "meeting", "content", "document", "documents", "email", "emails", "evidence",
+    "happened", "happen", "tell", "show", "find", "said", "say", "regarding",
+    "会議", "内容", "資料", "メール", "証拠", "文書", "場合"
+} | set(MONTHS)  # month names are covered by date_filter
+
+# Words that only make sense with the previous turns
+PRONOUNS_EN = {"he", "she", "they", "it", "him", "her", "them", "his", "hers", "their", "theirs",
+               "this", "those", "these", "same", "above", "former", "latter"}
+PRONOUNS_JA = ["彼女", "彼ら", "彼", "それ", "その", "あれ", "あの", "これ", "この件", "前述", "上記", "同じ", "同日", "その後"]
+
+
+def detect_language(text: str) -> str:
+    """Returns 'ja' if the text is mostly Japanese, otherwise 'en'."""
+    chars = [c for c in text if not c.isspace() and not c.isdigit()]
+    if not chars:
+        return "en"
+    japanese = sum(1 for c in chars if _JAPANESE_RE.match(c))
+    return "ja" if japanese / len(chars) > 0.2 else "en"
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into searchable keyword candidates (lowercased latin tokens)."""
+    return [t.lower() if t.isascii() else t for t in _TOKEN_RE.findall(text)]
+
+
+@st.cache_resource
+def load_idf_table(path: str = IDF_TABLE_PATH) -> Dict[str, Any]:
+    """Loads the corpus document-frequency table ({'num_docs': N, 'df': {token: count}})."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"IDF table not found at {path}; keyword ranking falls back to token length")
+    except Exception as e:
+        print(f"Error loading IDF table: {e}")
+    return {"num_docs": 0, "df": {}}
+
+
+def extract_keywords(text: str, idf_table: Dict[str, Any], max_keywords: int = MAX_KEYWORDS) -> List[str]:
+    """
+    Picks the most distinctive tokens of the query by corpus IDF.
+    Tokens never seen in the corpus are skipped when a table is available
+    (they cannot match the ILIKE keyword search anyway).
+    """
+    num_docs = idf_table.get("num_docs", 0)
+    df = idf_table.get("df", {})
+
+    candidates = []
+    for token in tokenize(text):
+        if token in STOPWORDS or token in candidates:
+            continue
+        candidates.append(token)
+
+    def score(token: str) -> float:
+        if not num_docs:
+            return len(token)
+        return math.log((num_docs + 1) / (df.get(token, 0) + 1)) + 1
+
+    if num_docs:
+        candidates = [t for t in candidates if df.get(t, 0) > 0]
+
+    top = set(sorted(candidates, key=score, reverse=True)[:max_keywords])
+    # Keep the query's word order for readability in the debug panel
+    return [t for t in candidates if t in top]
+
+
+def _with_date_keyword(keywords: List[str], date_filter: Optional[str]) -> List[str]:
+    """Adds a single-day date_filter as the first keyword (ranges are left to search_date)."""
+    if date_filter and RANGE_SEPARATOR not in date_filter and date_filter not in keywords:
+        keywords.insert(0, date_filter)
+    return keywords
+
+
+def needs_history(query: str, history: List[Dict[str, Any]]) -> bool:
+    """True if the query refers back to earlier turns (pronouns, very short follow-ups)."""
+    if not history:
+        return False
+    if any(p in query for p in PRONOUNS_JA):
+        return True
+    words = re.findall(r"[A-Za-z']+", query.lower())
+    if any(w in PRONOUNS_EN for w in words):
+        return True
+    # "And Murakami?" style follow-ups
+    return len(tokenize(query)) <= 2
+
+
+def plan_query(query: str, history: List[Dict[str, Any]] = None, today: datetime.date = None) -> Optional[Dict[str, Any]]:
+    """
+    Builds deep-search variants locally (same keys as LLMClient.expand_query_multilingual).
+
+    Returns None when the LLM expansion is really needed:
+    - the query is a follow-up that depends on the conversation history, or
+    - the query is Japanese with no date or latin anchor, so searching the
+      mostly-English corpus needs a translation.
+    """
+    if needs_history(query, history):
+        return None
+
+    language = detect_language(query)
+    date_filter = extract_date_filter(query, today=today)
+    keywords = _with_date_keyword(extract_keywords(query, load_idf_table()), date_filter)
+
+    if language == "ja" and not date_filter and not any(k.isascii() for k in keywords):
+        return None
+
+    return {
+        "original": query,
+        "original_keywords": " ".join(keywords) or query,
+        # E5 is multilingual, so the original sentence already covers cross-language vector search
+        "translated": None,
+        "translated_keywords": None,
+        "date_filter": date_filter,
+        "planner": "local",
+        "language": language
+    }
+
+
+def local_search_terms(query: str, today: datetime.date = None) -> Dict[str, Optional[str]]:
+    """
+    Keyword string and date that can be searched before any LLM call
+    (used for speculative retrieval while the expansion is in flight).
+    """
+    date_filter = extract_date_filter(query, today=today)
+    keywords = _with_date_keyword(extract_keywords(query, load_idf_table()), date_filter)
+    return {"keywords": " ".join(keywords) or None, "date_filter": date_filter}
+
+
+def plan_standard_query(query: str, history: List[Dict[str, Any]] = None, today: datetime.date = None) -> Optional[Dict[str, Any]]:
+    """
+    Local replacement for LLMClient.optimize_query on standalone questions.
+    Returns None if there is history to resolve.
+    """
+    if history:
+        return None
+    return {"query": query, "date_filter": extract_date_filter(query, today=today)}
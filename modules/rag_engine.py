@@ -1,12 +1,25 @@
 import os
 import streamlit as st
-from supabase import create_client, Client
-from sentence_transformers import SentenceTransformer
+from supabase import Client
+import contextvars
+from concurrent.futures import Future, as_completed
 from typing import List, Dict, Any
+from modules.clients import get_supabase_client, get_search_executor
+from modules.embedding_service import get_embedding_batcher, get_embedding_worker_count
+from modules.tracing import get_tracer
+from modules.date_parser import parse_date_filter
 
 # Configure debug mode - only activates in local development
 DEBUG_MODE = os.getenv('STREAMLIT_ENV') != 'cloud'  # True locally, False on Streamlit Cloud
 
+# Vector/keyword/date searches over-fetch this many times match_count before aggregation
+WIDE_NET_FACTOR = 15
+# A date range ("last week", "December") matches many rows unrelated to the question:
+# it boosts vector results dated inside the range and only fills free slots
+# with at most a few rows of its own
+DATE_RANGE_BOOST = 0.1
+DATE_RANGE_MAX_ROWS = 3
+
 def debug_log(message: str):
     """Print debug messages only in DEBUG_MODE"""
     if DEBUG_MODE:
@@ -20,19 +33,25 @@ class RAGEngine:
     """
     
     def __init__(self):
-        self.url = st.secrets["SUPABASE_URL"]
-        self.key = st.secrets["SUPABASE_KEY"]
-        self.client: Client = create_client(self.url, self.key)
+        self.client: Client = get_supabase_client()
         
         # Load model - using cache to avoid re-downloading on every run
-        # @st.cache_resource ensures this is loaded only once per session
-        self.model = self._load_model()
+        # @st.cache_resource ensures this is loaded only once per process.
+        # In worker mode the model lives in separate processes instead.
+        self.model = None if get_embedding_worker_count() else self._load_model()
+        # All sessions share one batching encoder service
+        self.embedder = get_embedding_batcher(self.model)
 
     @st.cache_resource
     def _load_model(_self):
         """Load the sentence transformer model."""
         # Using E5-Base multilingual model (768 dimensions)
         # Supports excellent multilingual retrieval for Japanese/English
+        if os.getenv("FAKE_EMBEDDER") == "hash":
+            # Offline benchmarks: deterministic embedder, no model download
+            from modules.fake_backend import HashingEmbedder
+            return HashingEmbedder()
+        from sentence_transformers import SentenceTransformer
         return SentenceTransformer('intfloat/multilingual-e5-base')
 
     def get_available_folders(self) -> List[str]:
@@ -55,13 +74,85 @@ class RAGEngine:
             st.error(f"Error fetching folders: {e}")
             return []
 
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Generates the embedding used for vector search.
+        """
+        # Temporarily without prefix to match database
+        # TODO: Add "query: " prefix back after re-ingesting DB with "passage: " prefix
+        with get_tracer().span("search.embed"):
+            return self.embedder.encode(query)
+
+    def _attach_drive_links(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fetches Google Drive links for results whose RPC didn't return them.
+        Continues without links if the lookup fails.
+        """
+        # Check if google_drive_link is missing in the first result
+        if not results or 'google_drive_link' in results[0]:
+            return results
+
+        ids = [r['id'] for r in results]
+        with get_tracer().span("search.link_lookup", ids=len(ids)):
+            try:
+                link_response = self.client.table('evidence_vectors') \
+                    .select('id, google_drive_link') \
+                    .in_('id', ids) \
+                    .execute()
+                
+                # Create a map of id -> link
+                link_map = {item['id']: item.get('google_drive_link') for item in link_response.data}
+                
+                # Merge into results
+                for r in results:
+                    r['google_drive_link'] = link_map.get(r['id'])
+                    
+            except Exception as e:
+                print(f"Error fetching Google Drive links: {e}")
+        return results
+
+    def get_dates(self, ids: List[int]) -> Dict[int, str]:
+        """
+        date_prefix ("YYYY-MM-DD") of the given chunks; the vector RPCs don't
+        return it. Chunks without a date are left out; {} if the lookup fails.
+        """
+        if not ids:
+            return {}
+        with get_tracer().span("search.date_lookup", ids=len(ids)):
+            try:
+                response = self.client.table('evidence_vectors') \
+                    .select('id, date_prefix') \
+                    .in_('id', ids) \
+                    .execute()
+                return {item['id']: str(item['date_prefix'])[:10] for item in response.data if item.get('date_prefix')}
+            except Exception as e:
+                print(f"Error fetching chunk dates: {e}")
+                return {}
+
+    def get_corpus_version(self) -> str:
+        """
+        Returns a cheap fingerprint of the evidence corpus (highest id + row count).
+        It changes whenever documents are re-ingested, so caches keyed on
+        retrieved evidence can be invalidated.
+        """
+        try:
+            response = self.client.table('evidence_vectors') \
+                .select('id', count='exact') \
+                .order('id', desc=True) \
+                .limit(1) \
+                .execute()
+            max_id = response.data[0]['id'] if response.data else 0
+            return f"{max_id}:{response.count}"
+        except Exception as e:
+            print(f"Error fetching corpus version: {e}")
+            return None
+
     def search(self, query: str, match_count: int = 10, threshold: float = 0.3, folder_filter: str = None, folder_filters: List[str] = None) -> List[Dict[str, Any]]:
         """
         Search the vector database for relevant chunks.
         """
-        # 1. Generate embedding (temporarily without prefix to match database)
-        # TODO: Add "query: " prefix back after re-ingesting DB with "passage: " prefix
-        query_embedding = self.model.encode(query).tolist()
+        # 1. Generate embedding
+        query_embedding = self.embed_query(query)
         
         # 2. Query Supabase
         if folder_filters:
@@ -87,8 +178,10 @@ class RAGEngine:
         
         try:
             # Call the RPC function
-            response = self.client.rpc(rpc_name, params).execute()
-            results = response.data
+            with get_tracer().span("search.vector", rpc=rpc_name) as span:
+                response = self.client.rpc(rpc_name, params).execute()
+                results = response.data
+                span["attrs"]["results"] = len(results or [])
             
             if not results:
                 return []
@@ -96,28 +189,7 @@ class RAGEngine:
             # 3. Fetch Google Drive links for these results
             # If using V2, the link is already in the response (if we updated the RPC)
             # But to be safe and backward compatible, we check if it's missing
-            
-            # Check if google_drive_link is missing in the first result
-            if results and 'google_drive_link' not in results[0]:
-                ids = [r['id'] for r in results]
-                try:
-                    link_response = self.client.table('evidence_vectors') \
-                        .select('id, google_drive_link') \
-                        .in_('id', ids) \
-                        .execute()
-                    
-                    # Create a map of id -> link
-                    link_map = {item['id']: item.get('google_drive_link') for item in link_response.data}
-                    
-                    # Merge into results
-                    for r in results:
-                        r['google_drive_link'] = link_map.get(r['id'])
-                        
-                except Exception as e:
-                    print(f"Error fetching Google Drive links: {e}")
-                    # Continue without links if this fails
-                
-            return results
+            return self._attach_drive_links(results)
         except Exception as e:
             st.error(f"Database search error: {e}")
             return []
@@ -131,27 +203,16 @@ class RAGEngine:
                 'query_text': query,
                 'match_count': match_count
             }
-            response = self.client.rpc('kw_match_documents', params).execute()
-            results = response.data
+            with get_tracer().span("search.keyword") as span:
+                response = self.client.rpc('kw_match_documents', params).execute()
+                results = response.data
+                span["attrs"]["results"] = len(results or [])
             
             if not results:
                 return []
                 
             # Fetch Google Drive links (same logic as vector search)
-            if results and 'google_drive_link' not in results[0]:
-                ids = [r['id'] for r in results]
-                try:
-                    link_response = self.client.table('evidence_vectors') \
-                        .select('id, google_drive_link') \
-                        .in_('id', ids) \
-                        .execute()
-                    link_map = {item['id']: item.get('google_drive_link') for item in link_response.data}
-                    for r in results:
-                        r['google_drive_link'] = link_map.get(r['id'])
-                except Exception as e:
-                    print(f"Error fetching Google Drive links: {e}")
-            
-            return results
+            return self._attach_drive_links(results)
         except Exception as e:
             print(f"Keyword search error: {e}")
             return []
@@ -159,33 +220,34 @@ class RAGEngine:
     def search_date(self, date_filter: str, match_count: int = 10) -> List[Dict[str, Any]]:
         """
         Perform a date-based search using the date_prefix column.
+        date_filter is "YYYY-MM-DD" or an inclusive range "YYYY-MM-DD..YYYY-MM-DD"
+        (see date_parser.format_date_filter).
         """
         try:
-            params = {
-                'filter_date': date_filter,
-                'match_count': match_count
-            }
-            response = self.client.rpc('match_documents_by_date', params).execute()
-            results = response.data
+            start_date, end_date = parse_date_filter(date_filter)
+            if start_date == end_date:
+                rpc_name = 'match_documents_by_date'
+                params = {
+                    'filter_date': start_date,
+                    'match_count': match_count
+                }
+            else:
+                rpc_name = 'match_documents_by_date_range'
+                params = {
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'match_count': match_count
+                }
+            with get_tracer().span("search.date", date=date_filter) as span:
+                response = self.client.rpc(rpc_name, params).execute()
+                results = response.data
+                span["attrs"]["results"] = len(results or [])
             
             if not results:
                 return []
                 
             # Fetch Google Drive links
-            if results and 'google_drive_link' not in results[0]:
-                ids = [r['id'] for r in results]
-                try:
-                    link_response = self.client.table('evidence_vectors') \
-                        .select('id, google_drive_link') \
-                        .in_('id', ids) \
-                        .execute()
-                    link_map = {item['id']: item.get('google_drive_link') for item in link_response.data}
-                    for r in results:
-                        r['google_drive_link'] = link_map.get(r['id'])
-                except Exception as e:
-                    print(f"Error fetching Google Drive links: {e}")
-            
-            return results
+            return self._attach_drive_links(results)
         except Exception as e:
             print(f"Date search error: {e}")
             return []
@@ -227,19 +289,7 @@ class RAGEngine:
                 return []
 
             # Fetch Google Drive links
-            ids = [r['id'] for r in results]
-            try:
-                link_response = self.client.table('evidence_vectors') \
-                    .select('id, google_drive_link') \
-                    .in_('id', ids) \
-                    .execute()
-                link_map = {item['id']: item.get('google_drive_link') for item in link_response.data}
-                for r in results:
-                    r['google_drive_link'] = link_map.get(r['id'])
-            except Exception as e:
-                print(f"Error fetching Google Drive links: {e}")
-
-            return results
+            return self._attach_drive_links(results)
             
         except Exception as e:
             st.error(f"Find similar error: {e}")
@@ -257,7 +307,8 @@ class RAGEngine:
             
         Returns:
             List of top documents with their best chunk as representative,
-            enriched with doc_score and chunk_count metadata
+            enriched with doc_score and chunk_count metadata (the other chunks
+            are dropped, so pack_context has nothing to merge for deep search)
         """
         import math
         from collections import defaultdict
@@ -294,84 +345,11 @@ class RAGEngine:
         
         return doc_scores[:top_k]
 
-    def search_multilingual(self, queries: Dict[str, str], match_count: int = 10, threshold: float = 0.3, folder_filters: List[str] = None) -> List[Dict[str, Any]]:
+    def _fuse_rrf(self, search_results_map: Dict[str, List[Dict[str, Any]]], limit: int) -> List[Dict[str, Any]]:
         """
-        Executes parallel searches for multiple query variants and aggregates results using RRF.
-        Then applies document-level aggregation to surface comprehensive multi-chunk documents.
+        Merges ranked result lists using Reciprocal Rank Fusion (RRF).
+        Returns the top `limit` chunks, each tagged with 'found_by_methods'.
         """
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-
-        # Retrieve MORE chunks initially for better document-level aggregation
-        # We'll retrieve 15x the requested amount (Wide Net Strategy)
-        # This ensures that for a 60-chunk document, we have a statistical chance 
-        # of catching enough chunks to form a high document score.
-        initial_match_count = match_count * 15  # e.g., 150 if user wants 10
-        
-        debug_log(f"Starting multilingual search: {len(queries)} variants + keyword search, retrieving {initial_match_count} chunks each")
-        
-        # Helper function for a single search
-        def _single_search(query_text, query_type):
-            if not query_text:
-                return query_type, []
-            # Use expanded retrieval for better recall
-            debug_log(f"Searching variant '{query_type}': {query_text}")
-            results = self.search(query_text, initial_match_count, threshold, folder_filters=folder_filters)
-            debug_log(f"  → Found {len(results)} results for '{query_type}'")
-            return query_type, results
-
-        # Helper function for keyword search
-        def _single_keyword_search(query_text, query_type):
-            if not query_text:
-                return query_type, []
-            debug_log(f"Searching keyword variant '{query_type}': {query_text}")
-            results = self.search_keyword(query_text, initial_match_count)
-            debug_log(f"  → Found {len(results)} keyword results for '{query_type}'")
-            return query_type, results
-
-        # Helper function for date search
-        def _single_date_search(date_str, query_type):
-            if not date_str:
-                return query_type, []
-            debug_log(f"Searching date variant '{query_type}': {date_str}")
-            results = self.search_date(date_str, initial_match_count)
-            debug_log(f"  → Found {len(results)} date results for '{query_type}'")
-            return query_type, results
-
-        # Run searches in parallel
-        search_results_map = {}
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            future_to_query = {}
-            
-            # 1. Vector Search (only for full sentence queries)
-            for q_type in ['original', 'translated']:
-                q_text = queries.get(q_type)
-                if q_text:
-                    future_to_query[executor.submit(_single_search, q_text, q_type)] = q_type
-
-            # 2. Keyword Search
-            # FIX: Use extracted keywords (if available) instead of the full sentence
-            # This ensures "2025年12月18日" is searched as a keyword, not the whole sentence
-            kw_query_original = queries.get('original_keywords', queries.get('original'))
-            if kw_query_original:
-                future_to_query[executor.submit(_single_keyword_search, kw_query_original, 'keyword_original')] = 'keyword_original'
-            
-            kw_query_translated = queries.get('translated_keywords', queries.get('translated'))
-            if kw_query_translated:
-                future_to_query[executor.submit(_single_keyword_search, kw_query_translated, 'keyword_translated')] = 'keyword_translated'
-            
-            # 3. Date Search
-            date_filter = queries.get('date_filter')
-            if date_filter:
-                future_to_query[executor.submit(_single_date_search, date_filter, 'date_match')] = 'date_match'
-
-            for future in as_completed(future_to_query):
-                try:
-                    q_type, results = future.result()
-                    search_results_map[q_type] = results
-                except Exception as e:
-                    print(f"Search error for {future_to_query[future]}: {e}")
-
-        # Aggregate results using Reciprocal Rank Fusion (RRF)
         # RRF score = 1 / (k + rank)
         # Lower k (e.g., 10) rewards high rankings more aggressively
         debug_log(f"Applying RRF aggregation across {len(search_results_map)} query variants")
@@ -398,16 +376,123 @@ class RAGEngine:
         # Get more results for document-level aggregation
         # We want ~5x match_count for good aggregation (e.g., 50 chunks for 10 results)
         rrf_results = []
-        for doc_id in sorted_ids[:initial_match_count]:
+        for doc_id in sorted_ids[:limit]:
             doc = doc_data[doc_id]
             # Convert set to list for JSON serialization/display
             doc['found_by_methods'] = list(doc['found_by_methods'])
             rrf_results.append(doc)
         
+        return rrf_results
+
+    def _run_variant(self, kind: str, text: str, query_type: str, initial_match_count: int, threshold: float, folder_filters: List[str] = None):
+        """
+        Runs one search variant ('vector', 'keyword' or 'date') with the wide-net match count.
+        Returns (query_type, results).
+        """
+        if not text:
+            return query_type, []
+        debug_log(f"Searching {kind} variant '{query_type}': {text}")
+        if kind == 'vector':
+            # Use expanded retrieval for better recall
+            results = self.search(text, initial_match_count, threshold, folder_filters=folder_filters)
+        elif kind == 'keyword':
+            results = self.search_keyword(text, initial_match_count)
+        else:
+            results = self.search_date(text, initial_match_count)
+        debug_log(f"  → Found {len(results)} {kind} results for '{query_type}'")
+        return query_type, results
+
+    def _submit_variant(self, kind: str, text: str, query_type: str, initial_match_count: int, threshold: float, folder_filters: List[str] = None) -> Future:
+        """Submits a search variant to the shared pool, inside a copy of the current (trace) context."""
+        return get_search_executor().submit(
+            contextvars.copy_context().run,
+            self._run_variant, kind, text, query_type, initial_match_count, threshold, folder_filters
+        )
+
+    def start_speculative_search(self, query: str, match_count: int = 10, threshold: float = 0.3, folder_filters: List[str] = None, keywords: str = None, date_filter: str = None) -> Dict[str, tuple]:
+        """
+        Starts the searches that don't need the LLM expansion (raw-query vector
+        search, plus local keyword/date fast paths) so they run while the
+        expansion call is in flight. Pass the result to search_multilingual(speculative=...).
+
+        Returns {query_type: (kind, text, Future)}.
+        """
+        initial_match_count = match_count * WIDE_NET_FACTOR
+        planned = [('original', 'vector', query), ('keyword_original', 'keyword', keywords), ('date_match', 'date', date_filter)]
+        debug_log(f"Starting speculative search for: {query}")
+        return {
+            q_type: (kind, text, self._submit_variant(kind, text, q_type, initial_match_count, threshold, folder_filters))
+            for q_type, kind, text in planned if text
+        }
+
+    def search_multilingual(self, queries: Dict[str, str], match_count: int = 10, threshold: float = 0.3, folder_filters: List[str] = None, speculative: Dict[str, tuple] = None) -> List[Dict[str, Any]]:
+        """
+        Executes parallel searches for multiple query variants and aggregates results using RRF.
+        Then applies document-level aggregation to surface comprehensive multi-chunk documents.
+
+        `speculative` (from start_speculative_search) supplies searches already in flight:
+        a variant with identical text reuses that search, and speculative searches that
+        no variant matches are still merged into the RRF pool.
+        """
+        # Retrieve MORE chunks initially for better document-level aggregation
+        # We'll retrieve 15x the requested amount (Wide Net Strategy)
+        # This ensures that for a 60-chunk document, we have a statistical chance 
+        # of catching enough chunks to form a high document score.
+        initial_match_count = match_count * WIDE_NET_FACTOR  # e.g., 150 if user wants 10
+        
+        debug_log(f"Starting multilingual search: {len(queries)} variants + keyword search, retrieving {initial_match_count} chunks each")
+
+        planned = []
+        # 1. Vector Search (only for full sentence queries)
+        for q_type in ['original', 'translated']:
+            planned.append((q_type, 'vector', queries.get(q_type)))
+
+        # 2. Keyword Search
+        # FIX: Use extracted keywords (if available) instead of the full sentence
+        # This ensures "2025年12月18日" is searched as a keyword, not the whole sentence
+        planned.append(('keyword_original', 'keyword', queries.get('original_keywords', queries.get('original'))))
+        planned.append(('keyword_translated', 'keyword', queries.get('translated_keywords', queries.get('translated'))))
+        
+        # 3. Date Search
+        planned.append(('date_match', 'date', queries.get('date_filter')))
+
+        # Run searches in parallel on the process-wide pool (bounded across all sessions).
+        # Each task runs in a copy of the current context so its spans join this trace.
+        search_results_map = {}
+        future_to_query = {}
+        speculative = dict(speculative or {})
+
+        for q_type, kind, text in planned:
+            if not text:
+                continue
+            spec = speculative.get(q_type)
+            if spec and spec[0] == kind and spec[1] == text:
+                # Already running (or done) since before the expansion finished
+                future_to_query[spec[2]] = q_type
+                del speculative[q_type]
+            else:
+                future_to_query[self._submit_variant(kind, text, q_type, initial_match_count, threshold, folder_filters)] = q_type
+
+        # Speculative searches the variants didn't reuse still add evidence to the pool
+        for q_type, (kind, text, future) in speculative.items():
+            future_to_query[future] = f"speculative_{q_type}"
+
+        for future in as_completed(future_to_query):
+            try:
+                _, results = future.result()
+                search_results_map[future_to_query[future]] = results
+            except Exception as e:
+                print(f"Search error for {future_to_query[future]}: {e}")
+
+        # Aggregate results using Reciprocal Rank Fusion (RRF)
+        with get_tracer().span("search.rrf", variants=len(search_results_map)):
+            rrf_results = self._fuse_rrf(search_results_map, initial_match_count)
+        
         debug_log(f"Top {len(rrf_results)} RRF chunks ready for document aggregation")
         
         # Apply document-level aggregation to surface multi-chunk documents
-        final_results = self.aggregate_by_document(rrf_results, match_count)
+        with get_tracer().span("search.aggregate", chunks=len(rrf_results)):
+            final_results = self.aggregate_by_document(rrf_results, match_count)
         
         if DEBUG_MODE:
             print("\n" + "="*60)
@@ -422,3 +507,48 @@ class RAGEngine:
             print("="*60 + "\n")
             
         return final_results
+
+
+def merge_date_results(results: List[Dict[str, Any]], date_results: List[Dict[str, Any]], date_filter: str, match_count: int = 10, result_dates: Dict[int, str] = None) -> List[Dict[str, Any]]:
+    """
+    Merges search_date rows into the vector results of standard mode.
+    A single day is specific enough to put its rows first (they come back with
+    the boosted date score). For a range the vector ranking stays in charge:
+    results dated inside the range (`result_dates`, see RAGEngine.get_dates)
+    get DATE_RANGE_BOOST, and date-only rows only take slots the vector
+    search left free, at most DATE_RANGE_MAX_ROWS of them.
+    """
+    start_date, end_date = parse_date_filter(date_filter)
+    merged = [dict(r) for r in results]
+    by_id = {r['id']: r for r in merged}
+
+    if start_date == end_date:
+        for dr in date_results:
+            if dr['id'] in by_id:
+                by_id[dr['id']]['similarity'] = max(by_id[dr['id']]['similarity'], dr['similarity'])
+            else:
+                merged.insert(0, dict(dr))
+                by_id[dr['id']] = merged[0]
+        merged.sort(key=lambda x: x['similarity'], reverse=True)
+        return merged[:match_count]
+
+    # date_results only holds a few rows of the range; a result's own date decides
+    in_range = {dr['id'] for dr in date_results}
+    in_range.update(i for i, day in (result_dates or {}).items() if start_date <= day <= end_date)
+    for r in merged:
+        if r['id'] in in_range:
+            r['similarity'] += DATE_RANGE_BOOST
+    merged.sort(key=lambda x: x['similarity'], reverse=True)
+    merged = merged[:match_count]
+
+    free = min(match_count - len(merged), DATE_RANGE_MAX_ROWS)
+    extra = [dr for dr in date_results if dr['id'] not in by_id][:max(0, free)]
+    # Ranked below the vector results, not at the date score
+    floor = merged[-1]['similarity'] if merged else 0.0
+    return merged + [dict(dr, similarity=floor) for dr in extra]
+
+
+@st.cache_resource
+def get_rag_engine() -> RAGEngine:
+    """Returns the process-wide RAGEngine shared by all sessions."""
+    return RAGEngine()
@@ -0,0 +1,114 @@
+import time
+import random
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Any, Dict
+from anthropic import APIConnectionError, APIStatusError
+
+# Overloaded (529), rate limited (429), lock timeout (409), request timeout (408), server errors
+RETRYABLE_STATUS = {408, 409, 429}
+MAX_RETRY_AFTER_SECONDS = 10.0
+
+
+class CallPolicy:
+    """
+    Time budget for one kind of LLM call.
+
+    timeout:     per-attempt HTTP timeout (seconds)
+    attempts:    max attempts including the first
+    deadline:    total budget across attempts and backoff (seconds)
+    base_delay:  first backoff step; doubles per retry, full jitter
+    hedge_after: if set, a duplicate request is started when the first
+                 one hasn't answered after this many seconds
+    """
+
+    def __init__(self, timeout: float, attempts: int, deadline: float, base_delay: float = 0.5, max_delay: float = 4.0, hedge_after: float = None):
+        self.timeout = timeout
+        self.attempts = attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+
+
+CALL_POLICIES: Dict[str, CallPolicy] = {
+    "optimize_query": CallPolicy(timeout=10.0, attempts=3, deadline=20.0),
+    # Short call on the critical path of deep search: hedge slow tail responses
+    "expand_query": CallPolicy(timeout=10.0, attempts=3, deadline=20.0, hedge_after=3.0),
+    "summarize_history": CallPolicy(timeout=20.0, attempts=2, deadline=30.0),
+    "previews": CallPolicy(timeout=20.0, attempts=2, deadline=30.0),
+    # Per-read timeout for streaming; past the deadline the app shows sources only
+    "generate": CallPolicy(timeout=60.0, attempts=2, deadline=90.0, base_delay=1.0),
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a call's total time budget is used up."""
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Connection errors, timeouts, 408/409/429 and 5xx (incl. 529 overloaded) are worth retrying."""
+    if isinstance(exc, APIConnectionError):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS or exc.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, policy: CallPolicy, exc: Exception = None) -> float:
+    """Full-jitter exponential backoff; honours a server retry-after header if present."""
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_RETRY_AFTER_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * (2 ** attempt)))
+
+
+def call_with_retries(fn: Callable[[float], Any], policy: CallPolicy, name: str, should_retry: Callable[[Exception], bool] = is_retryable) -> Any:
+    """
+    Calls fn(timeout) until it succeeds, the error is not retryable, the
+    attempts run out or the deadline passes. Each attempt gets the smaller
+    of policy.timeout and the remaining budget.
+    """
+    started = time.monotonic()
+    for attempt in range(policy.attempts):
+        remaining = policy.deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{name}: deadline of {policy.deadline}s exceeded")
+        try:
+            return fn(min(policy.timeout, remaining))
+        except Exception as e:
+            if attempt == policy.attempts - 1 or not should_retry(e):
+                raise
+            delay = backoff_delay(attempt, policy, e)
+            if time.monotonic() - started + delay >= policy.deadline:
+                raise
+            print(f"{name}: attempt {attempt + 1} failed ({e!r}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def hedged_call(fn: Callable[[], Any], hedge_after: float, executor: ThreadPoolExecutor) -> Any:
+    """
+    Runs fn on the executor; if it hasn't finished after hedge_after seconds,
+    starts an identical second call and returns whichever succeeds first.
+    The slower call is left to finish (its result is discarded).
+
+    Must not be called from a task running on the same executor.
+    """
+    futures = [executor.submit(contextvars.copy_context().run, fn)]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        futures.append(executor.submit(contextvars.copy_context().run, fn))
+
+    error = None
+    while futures:
+        done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+        futures = list(pending)
+    raise error
@@ -1,7 +1,22 @@
 import os
+import json
+import time
+import threading
 import streamlit as st
-from supabase import create_client, Client
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from supabase import Client
+from typing import List, Dict, Any, Optional, Tuple
+from modules.clients import get_supabase_client
+from modules.tracing import get_tracer
+from modules.storage_manifest import BucketManifest, STORAGE_MANIFEST_PATH, MANIFEST_OBJECT, pdf_candidate
+
+# Signed URLs are reused until this fraction of their lifetime has passed
+SIGNED_URL_REUSE_FRACTION = 0.8
+MAX_CACHED_URLS = 5000
+# Paths per batch signing request
+SIGN_BATCH_SIZE = 100
+# How often the bucket manifest is re-read (file or bucket copy)
+MANIFEST_TTL_SECONDS = 600
 
 class StorageClient:
     """
@@ -9,10 +24,76 @@ class StorageClient:
     """
     
     def __init__(self):
-        self.url = st.secrets["SUPABASE_URL"]
-        self.key = st.secrets["SUPABASE_KEY"]
         self.bucket_name = "evidence-files" # Must match the bucket created in Supabase
-        self.client: Client = create_client(self.url, self.key)
+        self.client: Client = get_supabase_client()
+        # (storage path, expiry) -> (signed URL, reuse until); shared by all sessions
+        self._url_cache: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Separate from _lock: a manifest download must not hold up URL lookups
+        self._manifest_lock = threading.Lock()
+        self._manifest: Optional[BucketManifest] = None
+        self._manifest_checked_at: Optional[float] = None
+
+    def get_manifest(self) -> Optional[BucketManifest]:
+        """
+        The bucket manifest (see modules/storage_manifest.py), re-read every
+        MANIFEST_TTL_SECONDS: the newer (by generated_at) of STORAGE_MANIFEST_PATH
+        and the copy in the bucket, so a file deployed with the app doesn't hide
+        later uploads. None when neither exists.
+
+        The manifest can still lag behind the bucket, so links are never
+        withheld because of it; it answers existence checks and the folder
+        listing of get_debug_info without Storage API calls.
+        """
+        now = time.monotonic()
+        if self._manifest_checked_at is not None and now - self._manifest_checked_at < MANIFEST_TTL_SECONDS:
+            return self._manifest
+        with self._manifest_lock:
+            if self._manifest_checked_at is None or now - self._manifest_checked_at >= MANIFEST_TTL_SECONDS:
+                copies = [m for m in (BucketManifest.load(STORAGE_MANIFEST_PATH), self._download_manifest()) if m is not None]
+                if copies:
+                    # A failed refresh keeps the previous manifest
+                    self._manifest = max(copies, key=lambda m: m.generated_at or "")
+                self._manifest_checked_at = now
+        return self._manifest
+
+    def _download_manifest(self) -> Optional[BucketManifest]:
+        try:
+            with get_tracer().span("storage.manifest_download"):
+                data = self.client.storage.from_(self.bucket_name).download(MANIFEST_OBJECT)
+            return BucketManifest.from_json(json.loads(data))
+        except Exception as e:
+            print(f"Storage manifest not available: {e}")
+            return None
+
+    def exists(self, file_path: str) -> Optional[bool]:
+        """
+        Whether a file is in the bucket according to the manifest; None without
+        a manifest. False may be stale (uploaded after the manifest was written).
+        """
+        manifest = self.get_manifest()
+        return None if manifest is None else file_path in manifest
+
+    def get_display_links(self, file_paths: List[str], expiry_duration: int = 3600) -> Dict[str, Tuple[str, Optional[str]]]:
+        """
+        File to link for each evidence chunk path, with its signed URL:
+        the PDF rendition of .md files (xxx/pdf/file.pdf), or the original
+        when the PDF can't be signed (not uploaded) but the original can.
+
+        Returns {file_path: (display path, URL or None)}.
+        """
+        candidates = {path: pdf_candidate(path) for path in file_paths}
+        urls = self.get_signed_urls([pdf_path for pdf_path, _ in candidates.values()], expiry_duration)
+        fallback = [path for path, (pdf_path, converted) in candidates.items() if converted and not urls.get(pdf_path)]
+        original_urls = self.get_signed_urls(fallback, expiry_duration) if fallback else {}
+
+        links = {}
+        for path, (pdf_path, _) in candidates.items():
+            if original_urls.get(path):
+                links[path] = (path, original_urls[path])
+            else:
+                links[path] = (pdf_path, urls.get(pdf_path))
+        return links
 
     def get_signed_url(self, file_path: str, expiry_duration: int = 3600) -> Optional[str]:
         """
@@ -25,40 +106,79 @@ class StorageClient:
         Returns:
             Signed URL string or None if error
         """
+        return self.get_signed_urls([file_path], expiry_duration).get(file_path)
+
+    def get_signed_urls(self, file_paths: List[str], expiry_duration: int = 3600) -> Dict[str, Optional[str]]:
+        """
+        Signed URLs for many files: cached URLs are reused until
+        SIGNED_URL_REUSE_FRACTION of expiry_duration has passed, the rest are
+        signed with one batch request per SIGN_BATCH_SIZE paths.
+
+        Returns {file_path: URL or None if it could not be signed}.
+        """
+        # Paths are stored in the bucket with the same structure, minus any leading slash
+        storage_paths = {path: path.lstrip('/') for path in file_paths}
+        # Not filtered by the manifest: a file uploaded after it was written
+        # would never get a link. Missing files come back as per-path errors.
+        urls: Dict[str, Optional[str]] = {}
+        now = time.monotonic()
+        with self._lock:
+            for storage_path in set(storage_paths.values()):
+                cached = self._url_cache.get((storage_path, expiry_duration))
+                if cached and cached[1] > now:
+                    self._url_cache.move_to_end((storage_path, expiry_duration))
+                    urls[storage_path] = cached[0]
+
+        missing = sorted(set(storage_paths.values()) - set(urls))
+        for start in range(0, len(missing), SIGN_BATCH_SIZE):
+            batch = missing[start:start + SIGN_BATCH_SIZE]
+            urls.update(self._sign_batch(batch, expiry_duration))
+
+        return {path: urls.get(storage_path) for path, storage_path in storage_paths.items()}
+
+    def _sign_batch(self, storage_paths: List[str], expiry_duration: int) -> Dict[str, str]:
+        """Signs paths with the batch endpoint and caches the results."""
         try:
-            # The file_path in DB might be 'data/harassment/folder/file.md'
-            # We need to ensure it matches how we uploaded it to Storage.
-            # Assuming we upload preserving the structure under 'data/'.
-            
-            # Clean path if necessary (remove leading slash)
-            storage_path = file_path.lstrip('/')
-            
-            response = self.client.storage.from_(self.bucket_name).create_signed_url(
-                storage_path, 
-                expiry_duration
-            )
-            
-            # Supabase-py v2 returns a dict or object depending on version, 
-            # usually {'signedURL': '...'} or an object with .signedURL
-            if isinstance(response, dict):
-                return response.get('signedURL')
-            elif hasattr(response, 'signedURL'):
-                return response.signedURL
-            # Fallback for some versions might return the URL directly as string (unlikely)
-            return str(response)
-            
+            with get_tracer().span("storage.sign_urls", paths=len(storage_paths)):
+                response = self.client.storage.from_(self.bucket_name).create_signed_urls(
+                    storage_paths,
+                    expiry_duration
+                )
         except Exception as e:
-            print(f"Error generating signed URL for {file_path}: {e}")
-            return None
+            print(f"Error generating signed URLs for {len(storage_paths)} files: {e}")
+            return {}
+
+        signed = {}
+        for requested, item in zip(storage_paths, response):
+            url = item.get('signedURL') or item.get('signedUrl')
+            if item.get('error') or not url:
+                print(f"Error generating signed URL for {requested}: {item.get('error')}")
+                continue
+            signed[item.get('path') or requested] = url
+
+        reuse_until = time.monotonic() + expiry_duration * SIGNED_URL_REUSE_FRACTION
+        with self._lock:
+            for storage_path, url in signed.items():
+                self._url_cache[(storage_path, expiry_duration)] = (url, reuse_until)
+                self._url_cache.move_to_end((storage_path, expiry_duration))
+            while len(self._url_cache) > MAX_CACHED_URLS:
+                self._url_cache.popitem(last=False)
+        return signed
 
     def get_debug_info(self, file_path: str) -> str:
         """Returns debug info about why a link might be unavailable."""
         try:
             storage_path = file_path.lstrip('/')
-            # Check if file exists (list files in that folder)
             folder = os.path.dirname(storage_path)
             filename = os.path.basename(storage_path)
-            
+
+            manifest = self.get_manifest()
+            if manifest is not None:
+                if storage_path in manifest:
+                    return "File exists in bucket."
+                return f"File '{filename}' not found in folder '{folder}' (manifest of {manifest.generated_at}). Available: {manifest.list_folder(folder)[:20]}"
+
+            # No manifest: list the folder
             files = self.client.storage.from_(self.bucket_name).list(folder)
             
             found = any(f['name'] == filename for f in files)
@@ -68,3 +188,9 @@ class StorageClient:
                 return f"File '{filename}' not found in folder '{folder}'. Available: {[f['name'] for f in files]}"
         except Exception as e:
             return f"Error checking file: {e}"
+
+
+@st.cache_resource
+def get_storage_client() -> StorageClient:
+    """Returns the process-wide StorageClient shared by all sessions."""
+    return StorageClient()
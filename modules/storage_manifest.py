@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import datetime
+from pathlib import Path
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+# Where the manifest lives: a JSON file next to the app (like ingested_folders.json)
+# and a copy inside the bucket for deployments without the file.
+STORAGE_MANIFEST_PATH = os.getenv('STORAGE_MANIFEST_PATH', 'docs/storage_manifest.json')
+MANIFEST_OBJECT = "_manifest.json"
+LIST_PAGE_SIZE = 1000
+
+
+class BucketManifest:
+    """
+    In-memory index of the objects in the evidence bucket: {path: {size, hash}}
+    plus the file names per folder, so existence checks and folder listings
+    are dictionary lookups instead of Storage API calls.
+
+    Written by scripts/sync_storage.py (from the uploaded files, or from a
+    full bucket listing with --manifest-only).
+    """
+
+    def __init__(self, objects: Iterable[Dict[str, Any]], generated_at: str = None):
+        self.generated_at = generated_at
+        self.objects: Dict[str, Dict[str, Any]] = {}
+        self._folders: Dict[str, set] = defaultdict(set)
+        for entry in objects:
+            path = entry["path"].lstrip('/')
+            self.objects[path] = entry
+            folder, name = os.path.split(path)
+            self._folders[folder].add(name)
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def __contains__(self, path: str) -> bool:
+        return path.lstrip('/') in self.objects
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        return self.objects.get(path.lstrip('/'))
+
+    def list_folder(self, folder: str) -> List[str]:
+        """File names directly inside a folder, sorted."""
+        return sorted(self._folders.get(folder.strip('/'), ()))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "generated_at": self.generated_at,
+            "objects": sorted(self.objects.values(), key=lambda e: e["path"])
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "BucketManifest":
+        return cls(data.get("objects", []), data.get("generated_at"))
+
+    @classmethod
+    def load(cls, path: str = STORAGE_MANIFEST_PATH) -> Optional["BucketManifest"]:
+        """Reads a manifest file; None if it doesn't exist or is unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_json(json.load(f))
+        except Exception as e:
+            print(f"Error loading storage manifest {path}: {e}")
+            return None
+
+    def save(self, path: str = STORAGE_MANIFEST_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=1)
+
+    def merged(self, other: "BucketManifest") -> "BucketManifest":
+        """This manifest with the entries of `other` added or replaced."""
+        objects = dict(self.objects)
+        objects.update(other.objects)
+        return BucketManifest(objects.values(), now_iso())
+
+
+def now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_entry(storage_path: str, local_path: Path) -> Dict[str, Any]:
+    """Manifest entry for a local file uploaded to storage_path."""
+    return {"path": storage_path, "size": local_path.stat().st_size, "hash": file_sha256(local_path)}
+
+
+def build_from_bucket(client, bucket_name: str, prefix: str = "") -> BucketManifest:
+    """
+    Lists the whole bucket (recursively, paged). Hashes are the object ETags,
+    since listing does not expose content hashes.
+    """
+    entries = []
+    folders: List[str] = [prefix.strip('/')]
+    while folders:
+        folder = folders.pop()
+        offset = 0
+        while True:
+            items = client.storage.from_(bucket_name).list(folder, {"limit": LIST_PAGE_SIZE, "offset": offset})
+            for item in items:
+                path = f"{folder}/{item['name']}" if folder else item['name']
+                if item.get('id') is None:
+                    folders.append(path)  # folder placeholder
+                elif item['name'] != MANIFEST_OBJECT:
+                    metadata = item.get('metadata') or {}
+                    entries.append({"path": path, "size": metadata.get('size'), "hash": (metadata.get('eTag') or '').strip('"') or None})
+            if len(items) < LIST_PAGE_SIZE:
+                break
+            offset += LIST_PAGE_SIZE
+    return BucketManifest(entries, now_iso())
+
+
+def pdf_candidate(file_path: str) -> Tuple[str, bool]:
+    """
+    PDF rendition path of an evidence file: xxx/file.md -> xxx/pdf/file.pdf.
+    Returns (path, converted); other formats map to themselves.
+    """
+    if file_path.endswith('.md'):
+        path_obj = Path(file_path)
+        return str(path_obj.parent / 'pdf' / path_obj.with_suffix('.pdf').name), True
+    return file_path, False
@@ -0,0 +1,175 @@
+import os
+import json
+import math
+import time
+import uuid
+import queue
+import atexit
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# Durations kept per span name for the in-memory histograms
+MAX_SAMPLES_PER_SPAN = 2000
+# Set TRACE_EXPORT_PATH to append every finished span to a JSONL file
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH')
+# How long shutdown waits for queued spans to be written
+EXPORT_FLUSH_SECONDS = 5.0
+
+_current_trace_id: contextvars.ContextVar = contextvars.ContextVar('trace_id', default=None)
+
+
+class Tracer:
+    """
+    Lightweight per-stage latency tracing for the chat pipeline.
+
+    Usage:
+        with tracer.trace("chat_turn"):
+            with tracer.span("llm.expand_query", model=model_id):
+                ...
+
+    Spans opened in worker threads don't inherit the caller's trace; submit the
+    task via `contextvars.copy_context().run` or pass `trace_id=current_trace_id()`.
+
+    With an export path, finished spans are queued and appended to the file by
+    one background thread, so the traced threads never wait on disk I/O.
+    """
+
+    def __init__(self, export_path: Optional[str] = TRACE_EXPORT_PATH, max_samples: int = MAX_SAMPLES_PER_SPAN):
+        self.export_path = export_path
+        self._lock = threading.Lock()
+        self._durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_samples))
+        self._records: deque = deque(maxlen=max_samples)
+        self._export_queue: queue.Queue = queue.Queue()
+        self._export_thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Starts a new trace (e.g. one chat turn) and records it as a root span."""
+        token = _current_trace_id.set(uuid.uuid4().hex[:12])
+        try:
+            with self.span(name, **attrs) as record:
+                yield record
+        finally:
+            _current_trace_id.reset(token)
+
+    @contextmanager
+    def span(self, name: str, trace_id: str = None, **attrs):
+        """
+        Times the enclosed block. Yields the (mutable) record so callers can add
+        attributes discovered during the stage, e.g. record['attrs']['results'] = n.
+        """
+        record = {
+            "trace_id": trace_id or _current_trace_id.get(),
+            "span": name,
+            "start": time.time(),
+            "duration_ms": None,
+            "attrs": attrs,
+            "error": None
+        }
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = repr(e)
+            raise
+        finally:
+            record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self._finish(record)
+
+    def _finish(self, record: Dict[str, Any]):
+        with self._lock:
+            self._durations[record["span"]].append(record["duration_ms"])
+            self._records.append(record)
+            if self.export_path and self._export_thread is None:
+                self._export_thread = threading.Thread(target=self._export_loop, name="trace-export", daemon=True)
+                self._export_thread.start()
+                atexit.register(self.flush)
+        if self.export_path:
+            self._export_queue.put(record)
+
+    def _export_loop(self):
+        while True:
+            batch = [self._export_queue.get()]
+            while True:
+                try:
+                    batch.append(self._export_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.export_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch)
+            except Exception as e:
+                print(f"Trace export error: {e}")
+            finally:
+                for _ in batch:
+                    self._export_queue.task_done()
+
+    def flush(self, timeout: float = EXPORT_FLUSH_SECONDS) -> bool:
+        """Waits until the queued spans are written to the export file. False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._export_queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns {span_name: {count, p50, p95, p99, max}} in milliseconds."""
+        with self._lock:
+            snapshot = {name: list(values) for name, values in self._durations.items()}
+        return {name: summarize_durations(values) for name, values in snapshot.items() if values}
+
+    def recent(self, trace_id: str = None) -> List[Dict[str, Any]]:
+        """Returns the buffered span records, optionally for a single trace."""
+        with self._lock:
+            records = list(self._records)
+        if trace_id:
+            records = [r for r in records if r["trace_id"] == trace_id]
+        return records
+
+    def export_jsonl(self, path: str):
+        """Writes the buffered span records to a JSONL file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.recent():
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize_durations(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1]
+    }
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the calling thread/context (None outside a trace)."""
+    return _current_trace_id.get()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Returns the process-wide tracer."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
@@ -21,6 +21,10 @@ TRANSLATIONS = {
         "searching": "🔍 Searching evidence database...",
         "analyzing": "🤔 Analyzing documents with {model}...",
         "no_results": "I couldn't find any relevant evidence in the database matching your query.",
+        "cached_answer": "⚡ Cached answer from a similar earlier question: \"{query}\"",
+        "cached_marker": "⚡ Cached answer",
+        "degraded_answer": "⚠️ The AI model did not respond in time, so no answer was generated. The most relevant sources found for your question are listed below.",
+        "partial_answer": "⚠️ *The answer was cut off before it was complete. Please ask again for the full answer.*",
         "open_file": "Open File ↗️",
         "link_unavailable": "Link unavailable",
         "docs_title": "📚 Application Documentation",
@@ -55,6 +59,11 @@ TRANSLATIONS = {
         "delete_this_chat": "Delete this chat",
         "enable_delete_mode": "Enable delete mode",
         "no_recent_chats": "No recent chats.",
+        "load_older": "⬆️ Load older messages ({count} more)",
+        "search_history": "Search conversations",
+        "search_history_placeholder": "Names, terms, phrases...",
+        "search_history_no_results": "No matching conversations.",
+        "search_history_more": "More results",
         "navigation": "Navigation",
         "reload_folders": "Reload Folders",
         "filter_by_folder": "Filter by Folder",
@@ -113,6 +122,10 @@ TRANSLATIONS = {
         "searching": "🔍 証拠データベースを検索中...",
         "analyzing": "🤔 {model} で文書を分析中...",
         "no_results": "クエリに一致する関連証拠がデータベースに見つかりませんでした。",
+        "cached_answer": "⚡ 以前の類似した質問のキャッシュ済み回答: 「{query}」",
+        "cached_marker": "⚡ キャッシュ済み回答",
+        "degraded_answer": "⚠️ AIモデルが時間内に応答しなかったため、回答を生成できませんでした。質問に関連性の高い資料を以下に表示します。",
+        "partial_answer": "⚠️ *回答は途中で途切れました。完全な回答を得るには、もう一度質問してください。*",
         "open_file": "ファイルを開く ↗️",
         "link_unavailable": "リンク利用不可",
         "docs_title": "📚 アプリケーションドキュメント",
@@ -147,6 +160,11 @@ TRANSLATIONS = {
         "delete_this_chat": "このチャットを削除",
         "enable_delete_mode": "削除モードを有効化",
         "no_recent_chats": "最近のチャットはありません。",
+        "load_older": "⬆️ 以前のメッセージを読み込む（残り{count}件）",
+        "search_history": "会話を検索",
+        "search_history_placeholder": "名前、用語、フレーズ...",
+        "search_history_no_results": "一致する会話はありません。",
+        "search_history_more": "さらに表示",
         "navigation": "ナビゲーション",
         "reload_folders": "フォルダを再読み込み",
         "filter_by_folder": "フォルダでフィルタ",
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Pre-computes translated previews for every evidence chunk.
+
+Walks evidence_vectors, skips chunks that already have a preview for the
+current content hash in chunk_previews, and writes the rest in batches
+using the same Haiku prompt as the app. Safe to re-run (only missing
+previews are generated); run after ingesting new evidence.
+
+Usage:
+    python scripts/backfill_previews.py --languages en ja
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+
+from anthropic import Anthropic
+from supabase import create_client
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.llm_client import LLMClient
+from modules.preview_store import PreviewStore, content_hash
+from modules.preview_service import PREVIEW_INPUT_CHARS
+from modules.model_router import route_model
+
+# Load env vars (same precedence as ingest_vectors.py)
+if os.path.exists('.env.cloud'):
+    load_dotenv('.env.cloud')
+else:
+    load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+PAGE_SIZE = 500
+
+
+def backfill(languages, batch_size: int, model_id: str, limit: int = None):
+    if not SUPABASE_URL or not SUPABASE_KEY or not ANTHROPIC_API_KEY:
+        print("Error: SUPABASE_URL, SUPABASE_KEY and ANTHROPIC_API_KEY must be set.")
+        return
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    store = PreviewStore(client)
+    llm = LLMClient(Anthropic(api_key=ANTHROPIC_API_KEY))
+
+    written = 0
+    seen = 0
+    offset = 0
+    while True:
+        response = client.table("evidence_vectors") \
+            .select("id, file_path, content") \
+            .order("id") \
+            .range(offset, offset + PAGE_SIZE - 1) \
+            .execute()
+        rows = [r for r in response.data or [] if r.get("content")]
+        seen += len(response.data or [])
+
+        for language in languages:
+            existing = store.get_many([(r["id"], content_hash(r["content"])) for r in rows], language)
+            missing = [r for r in rows if r["id"] not in existing]
+
+            for start in range(0, len(missing), batch_size):
+                batch = missing[start:start + batch_size]
+                previews = llm.generate_previews(
+                    [{"file_path": r["file_path"], "content": r["content"][:PREVIEW_INPUT_CHARS]} for r in batch],
+                    language,
+                    model_id=model_id
+                )
+                new_rows = [{
+                    "chunk_id": r["id"],
+                    "language": language,
+                    "content_hash": content_hash(r["content"]),
+                    "preview": previews[str(i + 1)],
+                    "model": model_id
+                } for i, r in enumerate(batch) if previews.get(str(i + 1))]
+                store.upsert_many(new_rows)
+                written += len(new_rows)
+
+        print(f"  Processed {seen} chunks, {written} previews written...")
+        if len(response.data or []) < PAGE_SIZE or (limit and seen >= limit):
+            break
+        offset += PAGE_SIZE
+
+    print(f"Done. {written} previews written.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the chunk_previews table")
+    parser.add_argument("--languages", nargs="+", default=["en", "ja"], choices=["en", "ja"])
+    parser.add_argument("--batch-size", type=int, default=10, help="Chunks per LLM call")
+    parser.add_argument("--model", default=route_model("previews"))
+    parser.add_argument("--limit", type=int, default=None, help="Stop after roughly this many chunks")
+    args = parser.parse_args()
+    backfill(args.languages, args.batch_size, args.model, args.limit)
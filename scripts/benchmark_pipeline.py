@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the chat pipeline against the in-process fake backend.
+
+Runs the real RAGEngine, LLMClient, PreviewService and ChatHistoryManager
+(Deep Search flow, as in app.py) for N concurrent simulated users, with
+Supabase and Anthropic replaced by modules/fake_backend.py. Prints turn
+latency and throughput plus the per-stage tracing summary.
+
+Usage:
+    python scripts/benchmark_pipeline.py --users 8 --turns 5
+    python scripts/benchmark_pipeline.py --corpus snapshot.jsonl --real-embedder
+    FAKE_LATENCY="llm_ttft=1200,rpc_keyword=400" python scripts/benchmark_pipeline.py
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+QUESTIONS = [
+    "What did {person} say about the {topic}?",
+    "When did {person} first mention the {topic}?",
+    "Summarize the emails about the {topic} from last month",
+    "{person}さんは{topic}について何と言いましたか？",
+    "Was there a meeting about the {topic} in December 2025?",
+    "Who was involved in the {topic} discussion with {person}?",
+]
+PEOPLE = ["Murakami", "Iwabuchi", "Tanaka", "Sato", "Suzuki"]
+TOPICS = ["resignation", "ultimatum", "contract", "salary", "audit", "settlement"]
+
+
+def configure(args):
+    """Environment must be set before the app modules are imported."""
+    os.environ["FAKE_BACKEND"] = "1"
+    if not args.real_embedder:
+        os.environ["FAKE_EMBEDDER"] = "hash"
+    if args.corpus:
+        os.environ["FAKE_CORPUS_PATH"] = args.corpus
+    if args.latency_scale is not None:
+        os.environ["FAKE_LATENCY_SCALE"] = str(args.latency_scale)
+    # Fresh LLM query cache so earlier runs don't turn into cache hits
+    os.environ.setdefault("QUERY_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "query_cache.sqlite3"))
+
+
+def run(args):
+    configure(args)
+    from modules.rag_engine import get_rag_engine
+    from modules.llm_client import get_llm_client
+    from modules.chat_history import ChatHistoryManager
+    from modules.preview_service import get_preview_service
+    from modules.query_planner import plan_query, local_search_terms, detect_language
+    from modules.model_router import route_model
+    from modules.models import DEFAULT_MODEL_ID
+    from modules.tracing import get_tracer, summarize_durations
+
+    print("Loading engine and fake corpus...")
+    rag = get_rag_engine()
+    llm = get_llm_client()
+    history_manager = ChatHistoryManager()
+    preview_service = get_preview_service()
+    tracer = get_tracer()
+
+    turn_durations = []
+    errors = []
+    lock = threading.Lock()
+
+    def simulate_user(user: int):
+        rng = random.Random(args.seed + user)
+        conversation_id = history_manager.create_conversation(f"Benchmark user {user}")
+        history = []
+        for _ in range(args.turns):
+            prompt = rng.choice(QUESTIONS).format(person=rng.choice(PEOPLE), topic=rng.choice(TOPICS))
+            started = time.monotonic()
+            try:
+                with tracer.trace("chat_turn", benchmark=True):
+                    history_manager.add_message(conversation_id, "user", prompt)
+                    variants = plan_query(prompt, history)
+                    speculative = None
+                    if variants is None:
+                        local_terms = local_search_terms(prompt)
+                        speculative = rag.start_speculative_search(
+                            prompt, match_count=args.match_count,
+                            keywords=local_terms["keywords"], date_filter=local_terms["date_filter"]
+                        )
+                        variants = llm.expand_query_multilingual(
+                            prompt, history, model_id=route_model("expand_query", DEFAULT_MODEL_ID)
+                        )
+                        if local_terms["date_filter"]:
+                            variants = dict(variants, date_filter=local_terms["date_filter"])
+                    with tracer.span("search.multilingual"):
+                        results = rag.search_multilingual(variants, match_count=args.match_count, speculative=speculative)
+
+                    answer = None
+                    if results:
+                        job = preview_service.start(results, detect_language(prompt))
+                        answer, _ = llm.generate_response_stream(prompt, results, history=history, model_id=DEFAULT_MODEL_ID)
+                        # As in app.py: the turn doesn't wait for previews
+                        preview_service.apply_when_done(job, results)
+                    history_manager.add_message(conversation_id, "assistant", answer or "", results)
+                history.extend([{"role": "user", "content": prompt}, {"role": "assistant", "content": answer or ""}])
+                with lock:
+                    turn_durations.append((time.monotonic() - started) * 1000)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+    print(f"Running {args.users} users x {args.turns} turns...")
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="user") as pool:
+        list(pool.map(simulate_user, range(args.users)))
+    wall = time.monotonic() - started
+
+    turns = summarize_durations(turn_durations)
+    print(f"\n{turns['count']} turns in {wall:.1f}s ({turns['count'] / wall:.2f} turns/s), {len(errors)} errors")
+    print(f"turn latency ms: p50 {turns['p50']:.0f}  p95 {turns['p95']:.0f}  p99 {turns['p99']:.0f}  max {turns['max']:.0f}\n")
+    for error in errors[:5]:
+        print(f"  error: {error}")
+
+    print(f"{'span':28s} {'count':>6s} {'p50 ms':>10s} {'p95 ms':>10s} {'p99 ms':>10s} {'max ms':>10s}")
+    print("-" * 78)
+    for name, s in sorted(tracer.summary().items(), key=lambda item: item[1]['p50'], reverse=True):
+        print(f"{name:28s} {s['count']:6d} {s['p50']:10.1f} {s['p95']:10.1f} {s['p99']:10.1f} {s['max']:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the chat pipeline against fake Supabase/Anthropic backends")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="Chat turns per user")
+    parser.add_argument("--match-count", type=int, default=10)
+    parser.add_argument("--corpus", default=None, help="JSONL snapshot from export_corpus_snapshot.py (default: synthetic)")
+    parser.add_argument("--latency-scale", type=float, default=None, help="Multiplier for injected latencies (0 = none)")
+    parser.add_argument("--real-embedder", action="store_true", help="Use the E5 model instead of the hashing embedder")
+    parser.add_argument("--seed", type=int, default=0)
+    run(parser.parse_args())
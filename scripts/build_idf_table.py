@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Builds the keyword IDF table used by the local query planner.
+
+Reads every chunk in evidence_vectors, counts in how many documents
+(file_path) each token appears, and writes docs/search_by_folder/idf_table.json.
+Re-run after ingesting new evidence.
+
+Usage:
+    python scripts/build_idf_table.py
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from supabase import create_client
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.query_planner import tokenize, IDF_TABLE_PATH
+
+# Load env vars (same precedence as ingest_vectors.py)
+if os.path.exists('.env.cloud'):
+    load_dotenv('.env.cloud')
+else:
+    load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+PAGE_SIZE = 1000
+
+
+def build_idf_table(output_path: str):
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("Error: SUPABASE_URL and SUPABASE_KEY must be set.")
+        return
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    doc_tokens = defaultdict(set)
+    offset = 0
+    while True:
+        response = client.table("evidence_vectors") \
+            .select("id, file_path, content") \
+            .order("id") \
+            .range(offset, offset + PAGE_SIZE - 1) \
+            .execute()
+        rows = response.data or []
+        for row in rows:
+            doc_tokens[row["file_path"]].update(tokenize(row.get("content") or ""))
+        print(f"  Read {offset + len(rows)} chunks...")
+        if len(rows) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    df = Counter()
+    for tokens in doc_tokens.values():
+        df.update(tokens)
+
+    table = {
+        "num_docs": len(doc_tokens),
+        "df": dict(df)
+    }
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False)
+
+    print(f"Wrote {len(table['df'])} tokens from {table['num_docs']} documents to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the keyword IDF table for the local query planner")
+    parser.add_argument("--output", default=IDF_TABLE_PATH)
+    args = parser.parse_args()
+    build_idf_table(args.output)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Exports evidence_vectors (content, metadata and embeddings) to a JSONL
+snapshot for the fake backend (FAKE_CORPUS_PATH / benchmark_pipeline.py --corpus).
+
+Usage:
+    python scripts/export_corpus_snapshot.py snapshot.jsonl --limit 5000
+"""
+
+import os
+import json
+import argparse
+
+from supabase import create_client
+from dotenv import load_dotenv
+
+# Load env vars (same precedence as ingest_vectors.py)
+if os.path.exists('.env.cloud'):
+    load_dotenv('.env.cloud')
+else:
+    load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+PAGE_SIZE = 500
+COLUMNS = "id, content, file_path, folder, document_type, google_drive_link, date_prefix, embedding"
+
+
+def export(path: str, limit: int = None):
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("Error: SUPABASE_URL and SUPABASE_KEY must be set.")
+        return
+
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    written = 0
+    offset = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while True:
+            response = client.table("evidence_vectors") \
+                .select(COLUMNS) \
+                .order("id") \
+                .range(offset, offset + PAGE_SIZE - 1) \
+                .execute()
+            rows = response.data or []
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            written += len(rows)
+            print(f"  Exported {written} chunks...")
+            if len(rows) < PAGE_SIZE or (limit and written >= limit):
+                break
+            offset += PAGE_SIZE
+
+    print(f"Done. {written} chunks written to {path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export evidence_vectors to a JSONL snapshot")
+    parser.add_argument("path")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after roughly this many chunks")
+    args = parser.parse_args()
+    export(args.path, args.limit)
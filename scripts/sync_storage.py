@@ -1,9 +1,16 @@
 import os
+import sys
+import json
 import argparse
 from pathlib import Path
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.storage_manifest import (
+    BucketManifest, STORAGE_MANIFEST_PATH, MANIFEST_OBJECT, build_from_bucket, manifest_entry
+)
+
 # Load environment variables
 # Prefer .env.cloud for this script as it's intended for the cloud chatbot
 if os.path.exists('.env.cloud'):
@@ -13,26 +20,41 @@ else:
     load_dotenv()
     print("Loaded configuration from .env")
 
-def sync_to_storage(
-    mappings: list,
-    bucket_name: str = "evidence-files",
-    supabase_url: str = None,
-    supabase_key: str = None
-):
+def publish_manifest(client: Client, bucket_name: str, manifest: BucketManifest):
     """
-    Syncs local directories to a Supabase Storage bucket with specific path mappings.
-    
-    Args:
-        mappings: List of tuples (local_path, storage_prefix)
-        bucket_name: Name of the Supabase bucket
+    Writes the manifest to STORAGE_MANIFEST_PATH and uploads a copy to the
+    bucket (the app reads whichever it finds; see StorageClient.get_manifest).
     """
+    manifest.save(STORAGE_MANIFEST_PATH)
+    print(f"Manifest with {len(manifest)} objects written to {STORAGE_MANIFEST_PATH}")
+    try:
+        client.storage.from_(bucket_name).upload(
+            path=MANIFEST_OBJECT,
+            file=json.dumps(manifest.to_json(), ensure_ascii=False).encode('utf-8'),
+            file_options={"content-type": "application/json", "upsert": "true"}
+        )
+        print(f"✅ Uploaded: {MANIFEST_OBJECT}")
+    except Exception as e:
+        print(f"❌ Failed to upload {MANIFEST_OBJECT}: {e}")
+
+
+def download_manifest(client: Client, bucket_name: str):
+    """The manifest copy stored in the bucket, or None."""
+    try:
+        return BucketManifest.from_json(json.loads(client.storage.from_(bucket_name).download(MANIFEST_OBJECT)))
+    except Exception as e:
+        print(f"No manifest in bucket ({e}); starting a new one")
+        return None
+
+
+def connect(supabase_url: str = None, supabase_key: str = None) -> Client:
     url = supabase_url or os.getenv("SUPABASE_URL")
     # Prefer Service Role Key for admin tasks (uploads), fall back to provided key or env var
     key = supabase_key or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_LEGACY_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
     
     if not url or not key:
         print("Error: SUPABASE_URL and SUPABASE_KEY (or SUPABASE_SERVICE_ROLE_KEY) must be set.")
-        return
+        return None
 
     print(f"Connecting to Supabase at: {url}")
     if os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_LEGACY_SERVICE_ROLE_KEY"):
@@ -40,7 +62,35 @@ def sync_to_storage(
     else:
         print("Using Standard/Anon Key (Check RLS policies if upload fails)")
 
-    client: Client = create_client(url, key)
+    return create_client(url, key)
+
+
+def refresh_manifest(bucket_name: str = "evidence-files", supabase_url: str = None, supabase_key: str = None):
+    """Rebuilds the manifest from a full listing of the bucket (no uploads)."""
+    client = connect(supabase_url, supabase_key)
+    if client is None:
+        return
+    print(f"Listing '{bucket_name}'...")
+    publish_manifest(client, bucket_name, build_from_bucket(client, bucket_name))
+
+
+def sync_to_storage(
+    mappings: list,
+    bucket_name: str = "evidence-files",
+    supabase_url: str = None,
+    supabase_key: str = None
+):
+    """
+    Syncs local directories to a Supabase Storage bucket with specific path mappings,
+    then updates the bucket manifest with the uploaded files (path, size, sha256).
+    
+    Args:
+        mappings: List of tuples (local_path, storage_prefix)
+        bucket_name: Name of the Supabase bucket
+    """
+    client = connect(supabase_url, supabase_key)
+    if client is None:
+        return
     
     # Check bucket
     try:
@@ -57,6 +107,7 @@ def sync_to_storage(
     total_count = 0
     total_errors = 0
     error_log = []
+    uploaded = []
 
     for local_dir, storage_prefix in mappings:
         base_path = Path(local_dir)
@@ -87,6 +138,7 @@ def sync_to_storage(
                             file_options={"content-type": "text/markdown", "upsert": "true"}
                         )
                     print(f"✅ Uploaded: {storage_path}")
+                    uploaded.append(manifest_entry(storage_path, file_path))
                     total_count += 1
                 except Exception as e:
                     print(f"❌ Failed: {storage_path} - {e}")
@@ -102,7 +154,16 @@ def sync_to_storage(
             f.write("\n".join(error_log))
         print("Errors written to sync_errors.log")
 
+    if uploaded:
+        # Files uploaded by earlier runs (other mappings) stay in the manifest
+        previous = BucketManifest.load(STORAGE_MANIFEST_PATH) or download_manifest(client, bucket_name) or BucketManifest([])
+        publish_manifest(client, bucket_name, previous.merged(BucketManifest(uploaded)))
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync evidence files to Supabase Storage and maintain the bucket manifest")
+    parser.add_argument("--manifest-only", action="store_true", help="Only rebuild the manifest from a bucket listing")
+    args = parser.parse_args()
+
     # Hardcoded mappings based on user request
     # (local_path, storage_prefix)
     # The storage_prefix should match the path structure in the vector DB (relative to project root)
@@ -112,7 +173,9 @@ if __name__ == "__main__":
         # ("/local/path/to/data", "data/evidence")
     ]
     
-    if not MAPPINGS:
+    if args.manifest_only:
+        refresh_manifest()
+    elif not MAPPINGS:
         print("No mappings configured. Please edit MAPPINGS in sync_storage.py")
     else:
         sync_to_storage(MAPPINGS)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Per-stage latency report from a trace export.
+
+Reads the JSONL file written when TRACE_EXPORT_PATH is set and prints
+p50/p95/p99 per span, slowest stages first.
+
+Usage:
+    TRACE_EXPORT_PATH=traces.jsonl streamlit run app.py
+    python scripts/trace_report.py traces.jsonl
+"""
+
+import sys
+import json
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.tracing import summarize_durations
+
+
+def main(path: str):
+    durations = defaultdict(list)
+    traces = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            durations[record['span']].append(record['duration_ms'])
+            if record.get('trace_id'):
+                traces.add(record['trace_id'])
+
+    print(f"{len(traces)} traces, {sum(len(v) for v in durations.values())} spans\n")
+    print(f"{'span':28s} {'count':>6s} {'p50 ms':>10s} {'p95 ms':>10s} {'p99 ms':>10s} {'max ms':>10s}")
+    print("-" * 78)
+    stats = {name: summarize_durations(values) for name, values in durations.items()}
+    for name, s in sorted(stats.items(), key=lambda item: item[1]['p50'], reverse=True):
+        print(f"{name:28s} {s['count']:6d} {s['p50']:10.1f} {s['p95']:10.1f} {s['p99']:10.1f} {s['max']:10.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python scripts/trace_report.py <traces.jsonl>")
+        sys.exit(1)
+    main(sys.argv[1])
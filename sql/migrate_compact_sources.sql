@@ -0,0 +1,25 @@
+-- Shrink messages.sources to compact references (see SOURCE_REF_FIELDS in modules/chat_history.py)
+-- Older rows stored the full search results, including chunk content. The app now
+-- re-reads chunk text from evidence_vectors when needed, so only these fields are kept.
+-- Idempotent: rows already in the compact form are skipped.
+-- Afterwards run sql/vacuum_messages.sql as a separate statement: VACUUM cannot
+-- run inside a transaction block, which is how the SQL editor runs a script.
+update messages m
+set sources = (
+    select coalesce(jsonb_agg(jsonb_strip_nulls(jsonb_build_object(
+        'id', s -> 'id',
+        'file_path', s -> 'file_path',
+        'similarity', s -> 'similarity',
+        'doc_score', s -> 'doc_score',
+        'chunk_count', s -> 'chunk_count',
+        'translated_preview', s -> 'translated_preview',
+        'google_drive_link', s -> 'google_drive_link'
+    )) order by ord), '[]'::jsonb)
+    from jsonb_array_elements(m.sources) with ordinality as e(s, ord)
+)
+where jsonb_typeof(m.sources) = 'array'
+  and exists (
+      select 1
+      from jsonb_array_elements(m.sources) s
+      where s ?| array['content', 'all_chunks', 'found_by_methods', 'folder', 'document_type']
+  );
@@ -22,3 +22,103 @@ create table if not exists messages (
 -- Index for faster retrieval of chat history
 create index if not exists idx_messages_conversation_id on messages(conversation_id);
 create index if not exists idx_conversations_updated_at on conversations(updated_at desc);
+
+-- Rolling summary of older turns (long conversations keep only the last few messages verbatim)
+alter table conversations add column if not exists summary text;
+alter table conversations add column if not exists summary_message_count int not null default 0;
+
+-- Keep conversations.updated_at current when messages are inserted (the app writes
+-- messages in batches from a background queue and no longer touches the conversation).
+-- Statement-level, so a batched insert updates each conversation once.
+create or replace function touch_conversations_on_message_insert()
+returns trigger
+language plpgsql
+as $$
+begin
+    update conversations c
+    set updated_at = now()
+    from (select distinct conversation_id from new_messages) m
+    where c.id = m.conversation_id;
+    return null;
+end;
+$$;
+
+drop trigger if exists messages_touch_conversation on messages;
+create trigger messages_touch_conversation
+    after insert on messages
+    referencing new table as new_messages
+    for each statement
+    execute function touch_conversations_on_message_insert();
+
+-- Ordered reads of a conversation (created_at is set by the client; id breaks ties)
+create index if not exists idx_messages_conversation_created on messages(conversation_id, created_at, id);
+
+-- Keyset pagination of a conversation (newest page first, "load older" by id)
+create index if not exists idx_messages_conversation_id_id on messages(conversation_id, id);
+
+-- Full-text search across past conversations (ChatHistoryManager.search)
+-- tsvector ('simple' config: no stemming, works for English names and terms) plus
+-- trigram indexes so substring matches also work for Japanese, which has no word breaks.
+create extension if not exists pg_trgm;
+
+alter table messages add column if not exists content_tsv tsvector
+    generated always as (to_tsvector('simple', coalesce(content, ''))) stored;
+
+create index if not exists idx_messages_content_tsv on messages using gin (content_tsv);
+create index if not exists idx_messages_content_trgm on messages using gin (content gin_trgm_ops);
+create index if not exists idx_conversations_title_trgm on conversations using gin (title gin_trgm_ops);
+
+-- Ranked conversations matching the query in their title or any message.
+-- One row per conversation with the best-matching message as snippet; paginate with match_offset.
+create or replace function search_conversations (
+    search_query text,
+    match_count int default 20,
+    match_offset int default 0
+)
+returns table (
+    id uuid,
+    title text,
+    updated_at timestamptz,
+    message_id bigint,
+    snippet text,
+    rank real
+)
+language sql stable
+as $$
+    with q as (
+        select
+            websearch_to_tsquery('simple', search_query) as tsq,
+            '%' || replace(replace(replace(search_query, '\', '\\'), '%', '\%'), '_', '\_') || '%' as pattern
+    ),
+    message_hits as (
+        select distinct on (m.conversation_id)
+            m.conversation_id,
+            m.id as message_id,
+            m.content,
+            ts_rank(m.content_tsv, q.tsq) + case when m.content ilike q.pattern then 0.5 else 0 end as rank
+        from messages m, q
+        where m.content_tsv @@ q.tsq or m.content ilike q.pattern
+        order by m.conversation_id, rank desc, m.id desc
+    ),
+    title_hits as (
+        select c.id as conversation_id,
+               similarity(c.title, search_query) + case when c.title ilike q.pattern then 1.0 else 0 end as rank
+        from conversations c, q
+        where c.title ilike q.pattern or c.title % search_query
+    )
+    select
+        c.id,
+        c.title,
+        c.updated_at,
+        mh.message_id,
+        case when mh.content is null then null
+             else substr(mh.content, greatest(1, strpos(lower(mh.content), lower(search_query)) - 60), 200)
+        end as snippet,
+        (coalesce(th.rank, 0) + coalesce(mh.rank, 0))::real as rank
+    from conversations c
+    left join message_hits mh on mh.conversation_id = c.id
+    left join title_hits th on th.conversation_id = c.id
+    where mh.conversation_id is not null or th.conversation_id is not null
+    order by rank desc, c.updated_at desc
+    limit match_count offset match_offset;
+$$;
@@ -0,0 +1,11 @@
+-- Translated previews of evidence chunks (one per chunk, language and chunk content)
+-- Filled lazily by the app (modules/preview_service.py) or by scripts/backfill_previews.py
+create table if not exists chunk_previews (
+    chunk_id bigint not null references evidence_vectors(id) on delete cascade,
+    language text not null,
+    content_hash text not null, -- sha256 of the chunk content the preview was written for
+    preview text not null,
+    model text,
+    created_at timestamptz default now(),
+    primary key (chunk_id, language, content_hash)
+);
@@ -0,0 +1,7 @@
+-- Run on its own after sql/migrate_compact_sources.sql (VACUUM cannot run inside
+-- a transaction block, so not in the same script or an explicit BEGIN).
+-- A plain VACUUM marks the dead pre-migration row versions (and their TOAST data)
+-- reusable for new messages and refreshes the planner statistics; it does not
+-- return disk space to the operating system. That needs VACUUM FULL (exclusive
+-- lock, rewrites the table) or pg_repack.
+vacuum (analyze) messages;
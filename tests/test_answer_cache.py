@@ -0,0 +1,107 @@
+"""
+SemanticAnswerCache scoping: near-identical questions about different dates,
+names or search settings must not share an answer. ResponseCache keys,
+expiry and eviction.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import modules.answer_cache as cache_module
+from modules.answer_cache import ResponseCache, SemanticAnswerCache, query_entities
+
+SETTINGS = {"deep_search": False, "match_count": 10, "threshold": 0.5}
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticAnswerCache()
+    cache.store("What happened on Dec 18?", [1.0, 0.0], None, "model", "Answer", [], SETTINGS)
+    return cache
+
+
+def test_paraphrase_hits(cache):
+    hit = cache.lookup("what happened on December 18th", [1.0, 0.01], None, "model", SETTINGS)
+    assert hit and hit["answer"] == "Answer"
+
+
+def test_different_date_misses(cache):
+    # Same embedding on purpose: E5 scores these two above the threshold
+    assert cache.lookup("What happened on Dec 19?", [1.0, 0.0], None, "model", SETTINGS) is None
+
+
+def test_different_settings_miss(cache):
+    assert cache.lookup("What happened on Dec 18?", [1.0, 0.0], None, "model", dict(SETTINGS, deep_search=True)) is None
+    assert cache.lookup("What happened on Dec 18?", [1.0, 0.0], None, "model", dict(SETTINGS, match_count=20)) is None
+
+
+def test_other_language_misses(cache):
+    # Same date and entities, but the cached answer is in English
+    assert query_entities("12月18日に何があった？") == query_entities("What happened on Dec 18?")
+    assert cache.lookup("12月18日に何があった？", [1.0, 0.0], None, "model", SETTINGS) is None
+
+
+def test_entities_are_numbers_and_katakana_names():
+    assert query_entities("Did they sign the 3 contracts?")[1:] == (("3",), ())
+    assert query_entities("スミスさんは3件の契約に署名した？")[1:] == (("3",), ("スミス",))
+    assert query_entities("ジョーンズさんは3件の契約に署名した？") != query_entities("スミスさんは3件の契約に署名した？")
+
+
+def test_common_nouns_are_not_names():
+    assert query_entities("What did the Board decide?") == query_entities("what did the board decide")
+    assert query_entities("契約書には何が書いてあった？")[2] == ()
+
+
+RESULTS = [{"id": 1, "content": "alpha"}, {"id": 2, "content": "beta"}]
+HISTORY = [{"role": "user", "content": "Who is Murakami?"}, {"role": "assistant", "content": "Opposing counsel."}]
+
+
+def response_key(query="What did Murakami say?", results=RESULTS, model_id="model", language="en", history=None, history_summary=None):
+    return ResponseCache.make_key(query, results, model_id, language, history, history_summary)
+
+
+def test_response_key_ignores_case_spacing_and_punctuation():
+    assert response_key("  what did   MURAKAMI say ？") == response_key()
+    assert response_key(history=[{"role": "user", "content": "Who is  Murakami?"}]) == response_key(history=HISTORY[:1])
+
+
+@pytest.mark.parametrize("changed", [
+    {"query": "What did Tanaka say?"},
+    {"results": RESULTS[::-1]},  # order reaches the prompt
+    {"results": RESULTS[:1]},
+    {"results": [RESULTS[0], {"id": 2, "content": "beta, re-ingested"}]},
+    {"model_id": "other-model"},
+    {"language": "ja"},
+    {"history": HISTORY},
+    {"history_summary": "Earlier: Murakami is opposing counsel."},
+])
+def test_response_key_covers_the_whole_context(changed):
+    assert response_key(**changed) != response_key()
+
+
+def test_response_cache_expires_evicts_and_invalidates(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now[0]))
+    cache = ResponseCache(ttl_seconds=60, max_entries=2)
+
+    cache.put("a", "Answer A", {1: "preview"})
+    hit = cache.get("a")
+    assert hit == {"answer": "Answer A", "previews": {1: "preview"}}
+    hit["previews"][1] = "changed"  # callers get a copy
+    assert cache.get("a")["previews"] == {1: "preview"}
+
+    now[0] += 61
+    assert cache.get("a") is None
+
+    # Least recently used goes first
+    cache.put("a", "A")
+    cache.put("b", "B")
+    cache.get("a")
+    cache.put("c", "C")
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+
+    cache.invalidate()
+    assert cache.get("a") is None and cache.get("c") is None
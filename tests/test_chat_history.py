@@ -0,0 +1,93 @@
+"""
+Compact source references in messages.sources and their rehydration on load.
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+import modules.chat_history as chat_history_module
+from modules.chat_history import ChatHistoryManager, compact_sources
+from modules.fake_backend import FakeCorpus, FakeLatency, FakeSupabase
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    db = FakeSupabase(FakeCorpus.synthetic(num_docs=3, chunks_per_doc=2), FakeLatency(scale=0))
+    monkeypatch.setattr(chat_history_module, "get_supabase_client", lambda: db)
+    manager = ChatHistoryManager()
+    yield manager
+    manager.writer.close()
+
+
+def result(chunk_id, **extra):
+    return dict({
+        "id": chunk_id, "file_path": "data/emails/a.md", "content": "long evidence text " * 100,
+        "similarity": 0.8, "doc_score": 1.1, "chunk_count": 2, "folder": "data/emails",
+        "found_by_methods": ["vector_original"], "google_drive_link": None
+    }, **extra)
+
+
+def test_compact_sources_drops_content():
+    compact = compact_sources([result(1, translated_preview="A preview")])
+    assert compact == [{"id": 1, "file_path": "data/emails/a.md", "similarity": 0.8, "doc_score": 1.1,
+                        "chunk_count": 2, "translated_preview": "A preview"}]
+
+
+def test_sources_round_trip(manager):
+    conversation_id = manager.create_conversation()
+    manager.add_message(conversation_id, "assistant", "Answer", [result(1, translated_preview="Preview one"), result(2)])
+
+    messages = manager.get_messages(conversation_id)
+    stored = messages[0]["sources"]
+    assert all("content" not in s for s in stored)
+
+    manager.hydrate_sources(messages)
+    # Sources with a preview stay compact; the rest get their chunk text back
+    assert "content" not in stored[0]
+    assert stored[1]["content"] == manager.client.tables["evidence_vectors"][1]["content"]
+
+
+def test_messages_are_paginated_newest_first(manager):
+    conversation_id = manager.create_conversation()
+    for i in range(7):
+        manager.add_message(conversation_id, "user", f"m{i}")
+
+    page, older = manager.get_messages_page(conversation_id, limit=3)
+    assert [m["content"] for m in page] == ["m4", "m5", "m6"]
+    assert older == 4
+
+    page, older = manager.get_messages_page(conversation_id, before_id=page[0]["id"], limit=3)
+    assert [m["content"] for m in page] == ["m1", "m2", "m3"]
+    assert older == 1
+
+
+def test_conversation_list_is_cached_until_a_write(manager):
+    first = manager.create_conversation("First")
+    assert [c["id"] for c in manager.get_recent_conversations()] == [first]
+    assert set(manager.get_recent_conversations()[0]) == {"id", "title", "updated_at"}
+
+    # Another process writes directly: served from cache until the TTL expires
+    manager.client.table("conversations").insert({"title": "Elsewhere"}).execute()
+    assert len(manager.get_recent_conversations()) == 1
+
+    # Our own writes invalidate immediately
+    second = manager.create_conversation("Second")
+    assert {c["id"] for c in manager.get_recent_conversations()} >= {first, second}
+
+
+def test_search_ranks_and_paginates(manager):
+    contract = manager.create_conversation("Contract review")
+    other = manager.create_conversation("Misc")
+    manager.add_message(other, "user", "Did Murakami mention the contract renewal?")
+    manager.add_message(manager.create_conversation("Unrelated"), "user", "Schedule for Friday")
+
+    results, has_more = manager.search("contract", limit=1)
+    # Title match outranks a message match
+    assert [r["id"] for r in results] == [contract] and has_more
+
+    results, has_more = manager.search("contract", limit=1, offset=1)
+    assert results[0]["id"] == other and "contract renewal" in results[0]["snippet"]
+    assert not has_more
+    assert manager.search("  ") == ([], False)
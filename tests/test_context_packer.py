@@ -0,0 +1,54 @@
+"""
+pack_context: merging of overlapping chunks and the token budget.
+"""
+
+from modules.context_packer import pack_context, estimate_tokens, _merge_file_chunks
+
+MODEL = "claude-sonnet-4-5-20250929"
+TEXT = "".join(f"Sentence {i} of the minutes. " for i in range(80))
+
+
+def chunk(path, start, end):
+    return {"file_path": path, "content": TEXT[start:end]}
+
+
+def test_overlapping_chunks_are_merged():
+    # Ingest-style chunks: 1000 chars with 200 chars of overlap, retrieved out of order
+    chunks = [chunk("a.md", 800, 1800), chunk("b.md", 0, 300), chunk("a.md", 0, 1000)]
+    context = pack_context(chunks, MODEL)
+
+    assert "--- SOURCE 1, 3: a.md ---" in context
+    assert "--- SOURCE 2: b.md ---" in context
+    # The overlap appears once
+    assert context.count(TEXT[800:1000]) == 1
+    assert TEXT[:1800] in context
+
+
+def test_distant_chunks_stay_separate():
+    sections = _merge_file_chunks([
+        {"number": 1, "text": TEXT[:500]},
+        {"number": 2, "text": TEXT[1000:1500]},
+    ])
+    assert [s["numbers"] for s in sections] == [[1], [2]]
+
+
+def test_short_coincidental_overlap_is_ignored():
+    sections = _merge_file_chunks([
+        {"number": 1, "text": "alpha beta gamma the"},
+        {"number": 2, "text": "the delta epsilon"},
+    ])
+    assert len(sections) == 2
+
+
+def test_budget_keeps_best_ranked_sections():
+    chunks = [chunk(f"{i}.md", 0, 1000) for i in range(5)]
+    block_tokens = estimate_tokens(pack_context(chunks[:1], MODEL))
+    context = pack_context(chunks, MODEL, token_budget=block_tokens * 2 + 1)
+
+    assert "SOURCE 1: 0.md" in context and "SOURCE 2: 1.md" in context
+    assert "SOURCE 3" not in context and "SOURCE 5" not in context
+
+
+def test_first_section_is_kept_even_over_budget():
+    context = pack_context([chunk("a.md", 0, 2000)], MODEL, token_budget=10)
+    assert "SOURCE 1: a.md" in context
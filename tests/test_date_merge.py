@@ -0,0 +1,57 @@
+"""
+Merging date-search rows into the vector results (standard mode).
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+from modules.rag_engine import DATE_RANGE_BOOST, DATE_RANGE_MAX_ROWS, merge_date_results
+
+
+def rows(ids, similarity):
+    return [{"id": i, "similarity": similarity} for i in ids]
+
+
+def test_single_day_rows_go_first():
+    results = rows([1, 2, 3], 0.6)
+    merged = merge_date_results(results, rows([9, 2], 2.0), "2025-12-18", match_count=3)
+    assert [r["id"] for r in merged] == [9, 2, 1]
+    assert results[1]["similarity"] == 0.6  # inputs are not modified
+
+
+def test_range_boosts_results_dated_inside_it():
+    results = [{"id": i, "similarity": 0.8 - i / 100} for i in range(10)]
+    # The date search returned other (longer) rows of the range; 7 is dated inside it anyway
+    date_rows = rows([5] + list(range(100, 120)), 2.0)
+    result_dates = {7: "2025-12-24", 8: "2026-01-02"}
+    merged = merge_date_results(results, date_rows, "2025-12-01..2025-12-31", match_count=10, result_dates=result_dates)
+
+    ids = [r["id"] for r in merged]
+    assert ids[:2] == [5, 7]
+    assert merged[1]["similarity"] == pytest.approx(0.73 + DATE_RANGE_BOOST)
+    # A full page of vector results leaves no room for date-only rows
+    assert sorted(ids) == list(range(10))
+
+
+def test_range_fills_free_slots_only():
+    merged = merge_date_results(rows([1], 0.5), rows([7, 8, 9, 10], 2.0), "2025-12-01..2025-12-31", match_count=10)
+    assert [r["id"] for r in merged] == [1] + [7, 8, 9][:DATE_RANGE_MAX_ROWS]
+    # Below the vector results, not at the date score
+    assert all(r["similarity"] == 0.5 for r in merged)
+
+    merged = merge_date_results(rows([1, 2, 3], 0.5), rows([7, 8], 2.0), "2025-12-01..2025-12-31", match_count=4)
+    assert [r["id"] for r in merged] == [1, 2, 3, 7]
+
+
+def test_chunk_dates_from_the_fake_backend():
+    from modules.rag_engine import RAGEngine
+    from modules.fake_backend import FakeCorpus, FakeLatency, FakeSupabase
+    db = FakeSupabase(FakeCorpus([
+        {"id": 1, "content": "a", "file_path": "a.md", "date_prefix": "2025-12-18", "embedding": [1.0, 0.0]},
+        {"id": 2, "content": "b", "file_path": "b.md", "date_prefix": None, "embedding": [0.0, 1.0]},
+    ]), FakeLatency(scale=0))
+    engine = RAGEngine.__new__(RAGEngine)  # no embedding model needed
+    engine.client = db
+    assert engine.get_dates([1, 2, 3]) == {1: "2025-12-18"}
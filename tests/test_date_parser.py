@@ -0,0 +1,213 @@
+"""
+Table tests for the local date-expression parser (modules/date_parser.py).
+All cases resolve relative to a fixed "today": Tuesday 2025-12-30.
+"""
+
+import datetime
+
+import pytest
+
+from modules.date_parser import (
+    extract_date,
+    extract_date_filter,
+    extract_date_range,
+    parse_date_filter,
+)
+
+TODAY = datetime.date(2025, 12, 30)
+
+
+def d(iso: str) -> datetime.date:
+    return datetime.date.fromisoformat(iso)
+
+
+SINGLE_DATES = [
+    # ISO and numeric
+    ("What happened on 2025-12-18?", "2025-12-18"),
+    ("2025/12/18 meeting notes", "2025-12-18"),
+    ("Emails from 2025.12.18", "2025-12-18"),
+    ("2024-2-3 invoice", "2024-02-03"),
+    ("Meeting on 12/18", "2025-12-18"),
+    ("Emails 12/18 (Thu)", "2025-12-18"),
+    ("12/18に何があった？", "2025-12-18"),
+    # Japanese
+    ("2025年12月18日の会議の内容は？", "2025-12-18"),
+    ("2025年 12月 18日", "2025-12-18"),
+    ("12月18日の会議", "2025-12-18"),
+    ("1月5日に何があった？", "2025-01-05"),
+    # English month names
+    ("What happened on Dec 18th?", "2025-12-18"),
+    ("Dec 18", "2025-12-18"),
+    ("dec. 18", "2025-12-18"),
+    ("December 18, 2024", "2024-12-18"),
+    ("December 1st 2025", "2025-12-01"),
+    ("Sept 2nd", "2025-09-02"),
+    ("18 December 2025", "2025-12-18"),
+    ("the 3rd of March", "2025-03-03"),
+    ("on 22nd Nov", "2025-11-22"),
+    # Year inference: most recent non-future occurrence
+    ("Dec 31", "2024-12-31"),
+    ("12月31日", "2024-12-31"),
+    ("Dec 30", "2025-12-30"),
+    # Relative days
+    ("What did Murakami say today?", "2025-12-30"),
+    ("yesterday's email", "2025-12-29"),
+    ("the day before yesterday", "2025-12-28"),
+    ("3 days ago", "2025-12-27"),
+    ("two days ago", "2025-12-28"),
+    ("a day ago", "2025-12-29"),
+    ("今日の会議", "2025-12-30"),
+    ("本日", "2025-12-30"),
+    ("昨日のメール", "2025-12-29"),
+    ("一昨日", "2025-12-28"),
+    ("おととい", "2025-12-28"),
+    ("5日前", "2025-12-25"),
+    # Weekdays (today is a Tuesday)
+    ("last Friday", "2025-12-26"),
+    ("last Tuesday", "2025-12-23"),
+    ("on Monday", "2025-12-29"),
+    ("this Monday", "2025-12-29"),
+    ("this Friday", "2025-12-26"),  # still ahead this week: the one just past
+    ("先週の金曜日", "2025-12-26"),
+    ("先週月曜", "2025-12-22"),
+    ("今週の月曜日", "2025-12-29"),
+    ("今週の金曜日", "2025-12-26"),
+]
+
+RANGES = [
+    # Months and years
+    ("December 2025", "2025-12-01", "2025-12-31"),
+    ("Feb 2024", "2024-02-01", "2024-02-29"),
+    ("2025年11月の資料", "2025-11-01", "2025-11-30"),
+    ("2025-11", "2025-11-01", "2025-11-30"),
+    ("11月の会議", "2025-11-01", "2025-11-30"),
+    ("in November", "2025-11-01", "2025-11-30"),
+    ("during march", "2025-03-01", "2025-03-31"),
+    ("2024年", "2024-01-01", "2024-12-31"),
+    ("emails in 2024", "2024-01-01", "2024-12-31"),
+    # Explicit ranges
+    ("Dec 18-20", "2025-12-18", "2025-12-20"),
+    ("Dec 18 to 20", "2025-12-18", "2025-12-20"),
+    ("from Dec 18 to Dec 22", "2025-12-18", "2025-12-22"),
+    ("between 2025-12-01 and 2025-12-15", "2025-12-01", "2025-12-15"),
+    ("2025-12-01 ~ 2025-12-15", "2025-12-01", "2025-12-15"),
+    ("2025-12-01 – 2025-12-15", "2025-12-01", "2025-12-15"),
+    ("12月18日〜20日", "2025-12-18", "2025-12-20"),
+    ("emails 12/18 to 12/20", "2025-12-18", "2025-12-20"),
+    ("12月18日から12月22日まで", "2025-12-18", "2025-12-22"),
+    ("12月18日から20日", "2025-12-18", "2025-12-20"),
+    ("2025年12月1日～2025年12月15日", "2025-12-01", "2025-12-15"),
+    ("November to December", None, None),  # bare month names without a preposition are ignored
+    ("from November 2025 to December 2025", "2025-11-01", "2025-12-31"),
+    ("11月から12月", "2025-11-01", "2025-12-31"),
+    # Ranges across the new year without a year
+    ("Dec 28 - Jan 3", "2024-12-28", "2025-01-03"),
+    ("12月28日から1月3日", "2024-12-28", "2025-01-03"),
+    # Open-ended ("since")
+    ("since Dec 18", "2025-12-18", "2025-12-30"),
+    ("emails after 2025-12-20", "2025-12-20", "2025-12-30"),
+    ("12月18日以降", "2025-12-18", "2025-12-30"),
+    ("since December", "2025-12-01", "2025-12-30"),
+    # Relative periods (weeks start on Monday)
+    ("last week", "2025-12-22", "2025-12-28"),
+    ("this week", "2025-12-29", "2025-12-30"),
+    ("2 weeks ago", "2025-12-15", "2025-12-21"),
+    ("last weekend", "2025-12-27", "2025-12-28"),
+    ("last month", "2025-11-01", "2025-11-30"),
+    ("this month", "2025-12-01", "2025-12-30"),
+    ("3 months ago", "2025-09-01", "2025-09-30"),
+    ("last year", "2024-01-01", "2024-12-31"),
+    ("this year", "2025-01-01", "2025-12-30"),
+    ("past 7 days", "2025-12-24", "2025-12-30"),
+    ("last 3 days", "2025-12-28", "2025-12-30"),
+    ("先週", "2025-12-22", "2025-12-28"),
+    ("今週", "2025-12-29", "2025-12-30"),
+    ("先週末", "2025-12-27", "2025-12-28"),
+    ("2週間前", "2025-12-15", "2025-12-21"),
+    ("先月の会議", "2025-11-01", "2025-11-30"),
+    ("先々月", "2025-10-01", "2025-10-31"),
+    ("今月", "2025-12-01", "2025-12-30"),
+    ("3ヶ月前", "2025-09-01", "2025-09-30"),
+    ("2か月前", "2025-10-01", "2025-10-31"),
+    ("過去7日間", "2025-12-24", "2025-12-30"),
+    ("去年", "2024-01-01", "2024-12-31"),
+    ("昨年の契約", "2024-01-01", "2024-12-31"),
+    ("一昨年", "2023-01-01", "2023-12-31"),
+    ("今年", "2025-01-01", "2025-12-30"),
+]
+
+NO_DATE = [
+    "Who is Murakami?",
+    "What did the lawyer say about the ultimatum?",
+    "村上さんは何と言いましたか？",
+    "May I see the contract?",
+    "Show me the 2 documents",
+    "Page 13/40 of the draft",  # not a valid month/day pair
+    "Summarize 1/2 of the emails",  # fractions and section numbers
+    "What does section 3/4 say?",
+    "Invoice 2025-13-40",
+    "Section 12.5 of the agreement",
+    "会議の内容",
+    "",
+]
+
+
+@pytest.mark.parametrize("text,expected", SINGLE_DATES)
+def test_single_dates(text, expected):
+    assert extract_date(text, today=TODAY) == expected
+    assert extract_date_filter(text, today=TODAY) == expected
+
+
+@pytest.mark.parametrize("text,start,end", RANGES)
+def test_ranges(text, start, end):
+    expected = (d(start), d(end)) if start else None
+    assert extract_date_range(text, today=TODAY) == expected
+    # Ranges are not single dates
+    if start != end:
+        assert extract_date(text, today=TODAY) is None
+
+
+@pytest.mark.parametrize("text", NO_DATE)
+def test_no_date(text):
+    assert extract_date_range(text, today=TODAY) is None
+    assert extract_date_filter(text, today=TODAY) is None
+
+
+def test_date_filter_round_trip():
+    assert extract_date_filter("Dec 18-20", today=TODAY) == "2025-12-18..2025-12-20"
+    assert parse_date_filter("2025-12-18..2025-12-20") == ("2025-12-18", "2025-12-20")
+    assert parse_date_filter("2025-12-18") == ("2025-12-18", "2025-12-18")
+
+
+def test_first_mention_wins_when_not_a_range():
+    # Two unrelated dates: the query is about the first one
+    assert extract_date("Compare 2025-12-18 with the email of 2025-11-02", today=TODAY) == "2025-12-18"
+
+
+def test_defaults_to_current_date():
+    assert extract_date("today") == datetime.date.today().isoformat()
+
+
+# Ordinary text that looks like dates, and dates the broad patterns missed
+LATER_TODAY = datetime.date(2026, 10, 19)
+AMBIGUOUS = [
+    ("Did he say we may 3 times?", None),
+    ("I want to march 5 miles", None),
+    ("Tom and May met", None),
+    ("November to December", None),
+    ("May 3", "2026-05-03"),
+    ("may 3rd meeting", "2026-05-03"),
+    ("the 3rd of may", "2026-05-03"),
+    ("dec 18", "2025-12-18"),
+    ("Feb 29", "2024-02-29"),  # no Feb 29 in 2026 or 2025
+    ("from March to May", "2026-03-01..2026-05-31"),
+    ("between March and May", "2026-03-01..2026-05-31"),
+    ("今年5月", "2026-05-01..2026-05-31"),
+    ("去年の12月18日", "2025-12-18"),
+    ("一昨年5月のメール", "2024-05-01..2024-05-31"),
+]
+
+
+@pytest.mark.parametrize("text,expected", AMBIGUOUS)
+def test_ambiguous_text(text, expected):
+    assert extract_date_filter(text, today=LATER_TODAY) == expected
@@ -0,0 +1,21 @@
+"""
+EmbeddingBatcher failure handling: requests never hang on a bad encoder result.
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+from modules.embedding_service import EmbeddingBatcher
+
+
+def test_short_encoder_result_fails_every_request():
+    batcher = EmbeddingBatcher(lambda texts: [[0.0, 1.0]] * (len(texts) - 1))
+    with pytest.raises(RuntimeError, match="embeddings for"):
+        batcher.encode("query: a", timeout=5)
+
+
+def test_results_match_requests():
+    batcher = EmbeddingBatcher(lambda texts: [[float(len(t))] for t in texts])
+    futures = [batcher.submit("x" * n) for n in range(1, 5)]
+    assert [f.result(timeout=5) for f in futures] == [[1.0], [2.0], [3.0], [4.0]]
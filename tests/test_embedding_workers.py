@@ -0,0 +1,86 @@
+"""
+Out-of-process embedding workers (modules/embedding_workers.py) with the
+offline HashingEmbedder (FAKE_EMBEDDER=hash): real spawned processes.
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+import modules.embedding_workers as workers_module
+from modules.embedding_workers import EmbeddingWorkerPool
+from modules.fake_backend import HashingEmbedder
+
+
+def wait_until(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("FAKE_EMBEDDER", "hash")
+    monkeypatch.setattr(workers_module, "WATCH_INTERVAL", 0.2)
+    pool = EmbeddingWorkerPool(2)
+    assert pool.wait_ready(timeout=60)
+    yield pool
+    pool.shutdown()
+
+
+def test_encode_matches_the_embedder(pool):
+    texts = ["query: Murakami ultimatum", "query: 村上さんの契約書", "passage: settlement"]
+    embeddings = pool.encode(texts)
+    assert embeddings.shape == (3, workers_module.EMBEDDING_DIM) and embeddings.dtype == np.float32
+    np.testing.assert_allclose(embeddings, HashingEmbedder().encode(texts), rtol=1e-6)
+    assert pool.encode([]).shape == (0, workers_module.EMBEDDING_DIM)
+
+
+def test_killed_worker_is_respawned(pool):
+    pool.encode(["query: warm up"])
+    victim = pool._processes[0]
+    victim.kill()
+
+    # The other worker keeps serving while worker 0 restarts
+    assert pool.encode(["query: still works"]).shape == (1, workers_module.EMBEDDING_DIM)
+    assert wait_until(lambda: pool._processes[0] is not victim and 0 in pool._ready)
+    assert pool._processes[0].is_alive()
+
+    # Both workers busy at once, including the new one
+    for _ in range(5):
+        assert pool.encode([f"query: text {i}" for i in range(8)]).shape == (8, workers_module.EMBEDDING_DIM)
+
+
+def test_request_of_a_dying_worker_is_retried(pool, monkeypatch):
+    # Worker 0 dies right after it is handed the request
+    with pool._cond:
+        conn, victim = pool._conns[0], pool._processes[0]
+    send = conn.send
+
+    def send_and_die(task):
+        send(task)
+        victim.kill()
+    monkeypatch.setattr(conn, "send", send_and_die)
+    assert wait_until(lambda: pool._idle == {0, 1})
+
+    started = time.monotonic()
+    embeddings = pool.encode(["query: doomed"])
+    assert time.monotonic() - started < workers_module.REQUEST_TIMEOUT
+    np.testing.assert_allclose(embeddings, HashingEmbedder().encode(["query: doomed"]), rtol=1e-6)
+    assert wait_until(lambda: pool._processes[0] is not victim and len(pool._ready) == 2)
+
+
+def test_failure_after_retry_is_raised(pool, monkeypatch):
+    attempts = []
+
+    def dies(*args):
+        attempts.append(args)
+        raise workers_module.WorkerDied("gone")
+    monkeypatch.setattr(pool, "_run", dies)
+    with pytest.raises(workers_module.WorkerDied):
+        pool.encode(["query: x"])
+    assert len(attempts) == 2
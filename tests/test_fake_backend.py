@@ -0,0 +1,92 @@
+"""
+The in-process fake backend (modules/fake_backend.py) driving the real
+ChatHistoryManager and LLMClient.
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+anthropic = pytest.importorskip("anthropic")
+
+import modules.chat_history as chat_history_module
+import modules.llm_client as llm_module
+from modules.chat_history import ChatHistoryManager
+from modules.fake_backend import FakeAnthropic, FakeCorpus, FakeLatency, FakeSupabase, HashingEmbedder
+from modules.llm_client import LLMClient
+from modules.resilience import CallPolicy
+
+NO_LATENCY = FakeLatency(scale=0)
+
+
+class NoQueryCache:
+    def get(self, *args, **kwargs):
+        return None
+
+    def put(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return FakeCorpus.synthetic(num_docs=20, chunks_per_doc=2)
+
+
+@pytest.fixture
+def supabase(corpus):
+    return FakeSupabase(corpus, NO_LATENCY)
+
+
+def test_search_rpcs(supabase, corpus):
+    row = corpus.rows[0]
+    embedding = HashingEmbedder().encode(row["content"]).tolist()
+
+    vector = supabase.rpc("match_evidence_vectors_v2", {
+        "query_embedding": embedding, "match_threshold": 0.3, "match_count": 5,
+        "filter_folders": [row["folder"]]
+    }).execute().data
+    assert vector[0]["id"] == row["id"]
+    assert all(r["folder"] == row["folder"] for r in vector)
+
+    keyword = supabase.rpc("kw_match_documents", {"query_text": "Murakami contract", "match_count": 3}).execute().data
+    assert len(keyword) <= 3 and all(r["similarity"] == 1.0 for r in keyword)
+
+    date = supabase.rpc("match_documents_by_date_range", {
+        "start_date": row["date_prefix"], "end_date": row["date_prefix"], "match_count": 10
+    }).execute().data
+    assert row["id"] in {r["id"] for r in date}
+
+
+def test_chat_history_round_trip(supabase, monkeypatch):
+    monkeypatch.setattr(chat_history_module, "get_supabase_client", lambda: supabase)
+    manager = ChatHistoryManager()
+
+    conversation_id = manager.create_conversation("Case notes")
+    manager.add_message(conversation_id, "user", "Who attended?")
+    manager.add_message(conversation_id, "assistant", "Murakami.", [{"id": 1}])
+    assert [m["role"] for m in manager.get_messages(conversation_id)] == ["user", "assistant"]
+    assert manager.get_recent_conversations()[0]["id"] == conversation_id
+
+    manager.delete_conversation(conversation_id)
+    assert manager.get_messages(conversation_id) == []
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(llm_module, "get_query_cache", lambda: NoQueryCache())
+    return LLMClient(FakeAnthropic(NO_LATENCY))
+
+
+def test_llm_client_parses_fake_responses(llm):
+    chunks = [{"id": 1, "file_path": "data/emails/a.md", "content": "Evidence A"},
+              {"id": 2, "file_path": "data/emails/b.md", "content": "Evidence B"}]
+    assert llm.expand_query_multilingual("What did Murakami say?", [])["original"] == "What did Murakami say?"
+    answer, complete = llm.generate_response_stream("What did Murakami say?", chunks)
+    assert "a.md" in answer and complete
+    assert llm.generate_previews(chunks, "en") == {"1": "Preview of source 1.", "2": "Preview of source 2."}
+
+
+def test_injected_latency_triggers_timeouts(monkeypatch):
+    monkeypatch.setattr(llm_module, "get_query_cache", lambda: NoQueryCache())
+    monkeypatch.setitem(llm_module.CALL_POLICIES, "generate", CallPolicy(timeout=0.05, attempts=1, deadline=0.1))
+    slow = LLMClient(FakeAnthropic(FakeLatency({"llm_ttft": 500}, jitter=0)))
+    assert slow.generate_response("Who attended?", [{"id": 1, "file_path": "a.md", "content": "A"}]) is None
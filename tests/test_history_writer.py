@@ -0,0 +1,158 @@
+"""
+Write-behind message queue (modules/history_writer.py) against the fake Supabase.
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+import httpx
+import modules.history_writer as writer_module
+from modules.fake_backend import FakeCorpus, FakeLatency, FakeSupabase
+from modules.history_writer import HistoryWriter
+from modules.resilience import CallPolicy
+
+
+class RecordingSupabase:
+    """Wraps FakeSupabase, counting message inserts and failing the first `failures` of them."""
+
+    def __init__(self, db, failures=0, error=None):
+        self.db = db
+        self.failures = failures
+        self.error = error or ConnectionError("connection reset")
+        self.inserts = []
+
+    def table(self, name):
+        query = self.db.table(name)
+        if name != "messages":
+            return query
+        recorder = self
+        original_insert = query.insert
+
+        def insert(rows):
+            original_insert(rows)
+            execute = query.execute
+
+            def failing_execute():
+                if recorder.failures:
+                    recorder.failures -= 1
+                    raise recorder.error
+                recorder.inserts.append(rows)
+                return execute()
+            query.execute = failing_execute
+            return query
+        query.insert = insert
+        return query
+
+
+@pytest.fixture
+def db():
+    db = FakeSupabase(FakeCorpus([]), FakeLatency(scale=0))
+    db.table("conversations").insert({"id": "c1"}).execute()
+    return db
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(writer_module, "WRITE_POLICY", CallPolicy(timeout=1.0, attempts=3, deadline=5.0, base_delay=0.01))
+
+
+def row(content, conversation_id="c1"):
+    return {"conversation_id": conversation_id, "role": "user", "content": content}
+
+
+def test_rows_are_batched_and_flushed(db):
+    client = RecordingSupabase(db)
+    writer = HistoryWriter(client, window=0.2)
+    for i in range(5):
+        writer.enqueue(row(f"m{i}"))
+    assert writer.flush("c1", timeout=5)
+    assert len(client.inserts) == 1
+    assert [m["content"] for m in db.tables["messages"]] == ["m0", "m1", "m2", "m3", "m4"]
+    writer.close()
+
+
+def test_transient_failures_are_retried(db):
+    client = RecordingSupabase(db, failures=2)
+    writer = HistoryWriter(client, window=0.01)
+    writer.enqueue(row("hello"))
+    assert writer.flush(timeout=5)
+    assert [m["content"] for m in db.tables["messages"]] == ["hello"]
+    writer.close()
+
+
+def test_bad_row_does_not_drop_the_batch(db):
+    class ForeignKeyViolation(Exception):
+        code = "23503"
+
+    client = RecordingSupabase(db, failures=1, error=ForeignKeyViolation("conversation is gone"))
+    writer = HistoryWriter(client, window=0.2)
+    writer.enqueue(row("kept"))
+    writer.enqueue(row("also kept"))
+    assert writer.flush(timeout=5)
+    # Not retried as a batch; written row by row instead
+    assert [m["content"] for m in db.tables["messages"]] == ["kept", "also kept"]
+    writer.close()
+
+
+def test_close_writes_queued_rows(db):
+    writer = HistoryWriter(db, window=1.0)
+    writer.enqueue(row("before shutdown"))
+    writer.close()
+    writer.enqueue(row("after shutdown"))
+    assert [m["content"] for m in db.tables["messages"]] == ["before shutdown", "after shutdown"]
+    assert writer.pending() == 0
+
+
+def test_inserts_touch_conversation(db):
+    db.tables["conversations"][0]["updated_at"] = "2025-01-01T00:00:00+00:00"
+    writer = HistoryWriter(db, window=0.01)
+    writer.enqueue(row("hi"))
+    writer.flush(timeout=5)
+    # Emulated messages_touch_conversation trigger
+    assert db.tables["conversations"][0]["updated_at"] > "2025-01-01T00:00:00+00:00"
+    writer.close()
+
+
+class FakeAPIError(Exception):
+    """Shaped like postgrest.exceptions.APIError."""
+
+    def __init__(self, code):
+        super().__init__(f"error {code}")
+        self.code = code
+
+
+@pytest.mark.parametrize("exc,transient", [
+    (ConnectionError("connection reset"), True),
+    (TimeoutError(), True),
+    (httpx.ConnectError("refused"), True),
+    (httpx.ReadTimeout("slow"), True),
+    (httpx.HTTPStatusError("bad gateway", request=httpx.Request("POST", "http://x"), response=httpx.Response(502)), True),
+    (httpx.HTTPStatusError("unauthorized", request=httpx.Request("POST", "http://x"), response=httpx.Response(401)), False),
+    (FakeAPIError(503), True),  # non-JSON body: code is the HTTP status
+    (FakeAPIError("40001"), True),  # serialization failure
+    (FakeAPIError("40P01"), True),  # deadlock
+    (FakeAPIError("08006"), True),
+    (FakeAPIError("PGRST001"), True),  # PostgREST could not connect to the database
+    (FakeAPIError("23503"), False),  # foreign key: the conversation was deleted
+    (FakeAPIError("42501"), False),  # permission denied (RLS)
+    (FakeAPIError("42P01"), False),  # missing table
+    (FakeAPIError("PGRST204"), False),  # unknown column
+    (FakeAPIError("PGRST301"), False),  # bad JWT
+    (FakeAPIError(401), False),
+    (ValueError("bad row"), False),
+])
+def test_transient_error_classification(exc, transient):
+    assert writer_module.is_transient_db_error(exc) is transient
+
+
+def test_permanent_errors_are_not_retried(db):
+    client = RecordingSupabase(db, failures=1, error=FakeAPIError("42501"))
+    writer = HistoryWriter(client, window=0.01)
+    writer.enqueue(row("denied"))
+    assert writer.flush(timeout=5)
+    # One failed attempt, then dropped and logged
+    assert client.failures == 0 and client.inserts == []
+    assert db.tables.get("messages", []) == []
+    writer.close()
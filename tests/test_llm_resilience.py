@@ -0,0 +1,251 @@
+"""
+Timeouts, retries, hedging and degraded mode of LLMClient, exercised through
+the real Anthropic SDK against a local fake HTTP server.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("streamlit")
+anthropic = pytest.importorskip("anthropic")
+
+import modules.llm_client as llm_module
+from modules.llm_client import LLMClient
+from modules.resilience import CallPolicy
+
+
+class FakeAnthropicServer:
+    """
+    Serves POST /v1/messages. Each request pops the next scripted behaviour:
+    ("ok", text), ("status", code), ("sleep", seconds, text),
+    ("stream", seconds_between_chunks, [chunks]) or ("stream_break", [chunks])
+    (server-sent events; the latter drops the connection after the chunks).
+    When the script runs out, the last behaviour is repeated.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Chunked transfer, so a dropped stream is an error and not a normal EOF
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                with server._lock:
+                    server.requests += 1
+                    step = server.script.pop(0) if len(server.script) > 1 else server.script[0]
+
+                if step[0] in ("stream", "stream_break"):
+                    self._stream(step)
+                    return
+                if step[0] == "status":
+                    self._send(step[1], {"type": "error", "error": {"type": "overloaded_error", "message": "busy"}})
+                    return
+                if step[0] == "sleep":
+                    time.sleep(step[1])
+                self._send(200, {
+                    "id": "msg_test",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": "claude-haiku-4-5-20251001",
+                    "content": [{"type": "text", "text": step[-1]}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": 10, "output_tokens": 5}
+                })
+
+            def _stream(self, step):
+                delay, chunks = (step[1], step[2]) if step[0] == "stream" else (0, step[1])
+                events = [("message_start", {"type": "message_start", "message": {
+                    "id": "msg_test", "type": "message", "role": "assistant", "model": "claude-haiku-4-5-20251001",
+                    "content": [], "stop_reason": None, "stop_sequence": None,
+                    "usage": {"input_tokens": 10, "output_tokens": 0}}}),
+                    ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})]
+                events += [("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": c}}) for c in chunks]
+                if step[0] == "stream":
+                    events += [
+                        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                        ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 5}}),
+                        ("message_stop", {"type": "message_stop"})
+                    ]
+                try:
+                    self.send_response(200)
+                    self.send_header("content-type", "text/event-stream")
+                    self.send_header("transfer-encoding", "chunked")
+                    self.end_headers()
+                    for name, data in events:
+                        payload = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+                        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+                        self.wfile.flush()
+                        if name == "content_block_delta":
+                            time.sleep(delay)
+                    if step[0] == "stream":
+                        self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (deadline)
+                self.close_connection = True
+
+            def _send(self, code, payload):
+                body = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(code)
+                    self.send_header("content-type", "application/json")
+                    self.send_header("content-length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (timeout)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class NoQueryCache:
+    def get(self, *args, **kwargs):
+        return None
+
+    def put(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    servers = []
+    monkeypatch.setattr(llm_module, "get_query_cache", lambda: NoQueryCache())
+
+    def make(script, **policies):
+        for name, policy in policies.items():
+            monkeypatch.setitem(llm_module.CALL_POLICIES, name, policy)
+        server = FakeAnthropicServer(script)
+        servers.append(server)
+        sdk = anthropic.Anthropic(api_key="test-key", base_url=server.url, max_retries=0)
+        return LLMClient(sdk), server
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+OPTIMIZED = '{"query": "Dec 18 meeting attendees", "date_filter": "2025-12-18"}'
+EXPANDED = json.dumps({
+    "original": "q", "original_keywords": "q", "translated": "t",
+    "translated_keywords": "t", "date_filter": None
+})
+CHUNKS = [{"id": 1, "file_path": "data/a.md", "content": "Evidence A"}]
+
+
+def test_retries_overloaded_then_succeeds(make_client):
+    client, server = make_client(
+        [("status", 529), ("status", 503), ("ok", OPTIMIZED)],
+        optimize_query=CallPolicy(timeout=2.0, attempts=3, deadline=5.0, base_delay=0.01)
+    )
+    result = client.optimize_query("Who attended?", [])
+    assert result["date_filter"] == "2025-12-18"
+    assert server.requests == 3
+
+
+def test_non_retryable_error_is_not_retried(make_client):
+    client, server = make_client(
+        [("status", 400)],
+        optimize_query=CallPolicy(timeout=2.0, attempts=3, deadline=5.0, base_delay=0.01)
+    )
+    result = client.optimize_query("Who attended?", [])
+    # Falls back to the raw query
+    assert result == {"query": "Who attended?", "date_filter": None}
+    assert server.requests == 1
+
+
+def test_slow_response_times_out_and_retries(make_client):
+    client, server = make_client(
+        [("sleep", 2.0, OPTIMIZED), ("ok", OPTIMIZED)],
+        optimize_query=CallPolicy(timeout=0.3, attempts=2, deadline=3.0, base_delay=0.01)
+    )
+    started = time.monotonic()
+    result = client.optimize_query("Who attended?", [])
+    assert result["query"] == "Dec 18 meeting attendees"
+    assert server.requests == 2
+    assert time.monotonic() - started < 1.5
+
+
+def test_hedged_expansion_returns_the_faster_response(make_client):
+    client, server = make_client(
+        [("sleep", 2.0, EXPANDED), ("ok", EXPANDED)],
+        expand_query=CallPolicy(timeout=5.0, attempts=1, deadline=5.0, hedge_after=0.2)
+    )
+    started = time.monotonic()
+    result = client.expand_query_multilingual("q", [])
+    assert result["translated"] == "t"
+    assert server.requests == 2
+    assert time.monotonic() - started < 1.5
+
+
+def test_generation_degrades_when_budget_is_exceeded(make_client):
+    client, server = make_client(
+        [("sleep", 2.0, "<root><answer>late</answer></root>")],
+        generate=CallPolicy(timeout=0.3, attempts=2, deadline=0.5, base_delay=0.01)
+    )
+    started = time.monotonic()
+    assert client.generate_response("Who attended?", CHUNKS) is None
+    assert client.generate_response_stream("Who attended?", CHUNKS) == (None, False)
+    assert time.monotonic() - started < 2.0
+
+
+def test_generation_answer_after_transient_error(make_client):
+    client, server = make_client(
+        [("status", 529), ("ok", "<root><answer>A meeting took place.</answer></root>")],
+        generate=CallPolicy(timeout=2.0, attempts=2, deadline=5.0, base_delay=0.01)
+    )
+    assert client.generate_response("Who attended?", CHUNKS) == "A meeting took place."
+    assert server.requests == 2
+
+
+def test_trickling_stream_stops_at_the_deadline(make_client):
+    # Every read arrives well within the per-read timeout; only the total budget stops it
+    chunks = ["<root><answer>", "The meeting "] + ["went on. "] * 50 + ["</answer></root>"]
+    client, server = make_client(
+        [("stream", 0.05, chunks)],
+        generate=CallPolicy(timeout=1.0, attempts=2, deadline=0.5, base_delay=0.01)
+    )
+    started = time.monotonic()
+    answer, complete = client.generate_response_stream("Who attended?", CHUNKS)
+    assert time.monotonic() - started < 1.5
+    assert answer.startswith("The meeting") and not complete
+    assert server.requests == 1
+
+
+def test_broken_stream_returns_partial_answer(make_client):
+    shown = []
+    client, server = make_client(
+        [("stream_break", ["<root><answer>", "A meeting took ", "place on"])],
+        generate=CallPolicy(timeout=2.0, attempts=2, deadline=5.0, base_delay=0.01)
+    )
+    answer, complete = client.generate_response_stream("Who attended?", CHUNKS, on_answer=shown.append)
+    assert answer == "A meeting took place on" and not complete
+    assert shown[-1] == answer
+    # Not retried: the user is already reading the first attempt
+    assert server.requests == 1
+
+
+def test_complete_stream(make_client):
+    client, server = make_client(
+        [("stream", 0, ["<root><answer>A meeting ", "took place.</answer></root>"])],
+        generate=CallPolicy(timeout=2.0, attempts=2, deadline=5.0, base_delay=0.01)
+    )
+    assert client.generate_response_stream("Who attended?", CHUNKS) == ("A meeting took place.", True)
@@ -0,0 +1,56 @@
+"""
+Per-task model routing (modules/model_router.py): defaults and the
+MODEL_ROUTING / MODEL_ROUTE_<TASK> overrides.
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import modules.model_router as router_module
+from modules.model_router import TASK_MIN_TIER, fastest_adequate_model, route_model
+from modules.models import DEFAULT_MODEL_ID, MODELS, TIER_FAST, TIER_PREMIUM
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = {}
+    monkeypatch.setattr(router_module, "get_setting", lambda name, default=None: settings.get(name, default))
+    return settings
+
+
+def test_fastest_adequate_model():
+    fast = fastest_adequate_model(TIER_FAST)
+    assert not fast.legacy and fast.relative_latency == min(m.relative_latency for m in MODELS if not m.legacy)
+    assert fastest_adequate_model(TIER_PREMIUM).tier == TIER_PREMIUM
+
+
+@pytest.mark.parametrize("task", sorted(TASK_MIN_TIER))
+def test_auxiliary_tasks_use_the_fastest_model(settings, task):
+    assert route_model(task, "selected-model") == fastest_adequate_model(TASK_MIN_TIER[task]).api_id
+
+
+def test_answers_keep_the_selected_model(settings):
+    assert route_model("answer", "selected-model") == "selected-model"
+    assert route_model("answer") == DEFAULT_MODEL_ID
+
+
+@pytest.mark.parametrize("overrides,task,expected", [
+    ({"MODEL_ROUTING": {"expand_query": "table-model"}}, "expand_query", "table-model"),
+    ({"MODEL_ROUTE_EXPAND_QUERY": "env-model"}, "expand_query", "env-model"),
+    # The secrets table wins over the environment
+    ({"MODEL_ROUTING": {"expand_query": "table-model"}, "MODEL_ROUTE_EXPAND_QUERY": "env-model"}, "expand_query", "table-model"),
+    # ...but only for the tasks it lists
+    ({"MODEL_ROUTING": {"previews": "table-model"}, "MODEL_ROUTE_EXPAND_QUERY": "env-model"}, "expand_query", "env-model"),
+    # The answer model can be pinned too
+    ({"MODEL_ROUTE_ANSWER": "env-model"}, "answer", "env-model"),
+])
+def test_overrides(settings, overrides, task, expected):
+    settings.update(overrides)
+    assert route_model(task, "selected-model") == expected
+
+
+def test_overrides_apply_per_task(settings):
+    settings["MODEL_ROUTING"] = {"summary": "table-model"}
+    assert route_model("summary") == "table-model"
+    assert route_model("previews") == fastest_adequate_model(TASK_MIN_TIER["previews"]).api_id
@@ -0,0 +1,128 @@
+"""
+Source previews (modules/preview_service.py, modules/preview_store.py):
+memory -> chunk_previews table -> LLM, against the fake Supabase.
+"""
+
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+import modules.preview_service as preview_module
+import modules.preview_store as store_module
+from modules.fake_backend import FakeCorpus, FakeLatency, FakeSupabase
+from modules.preview_service import PreviewService
+from modules.preview_store import PreviewStore, content_hash
+
+
+class FakePreviewLLM:
+    def __init__(self):
+        self.calls = []
+
+    def generate_previews(self, chunks, language, model_id=None):
+        self.calls.append([c["content"] for c in chunks])
+        return {str(i + 1): f"[{language}] {c['content'][:10]}" for i, c in enumerate(chunks)}
+
+
+class CountingStore(PreviewStore):
+    def __init__(self, client):
+        super().__init__(client)
+        self.reads = 0
+
+    def get_many(self, chunks, language):
+        self.reads += 1
+        return super().get_many(chunks, language)
+
+
+@pytest.fixture
+def db():
+    return FakeSupabase(FakeCorpus([]), FakeLatency(scale=0))
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = FakePreviewLLM()
+    monkeypatch.setattr(preview_module, "get_llm_client", lambda: llm)
+    return llm
+
+
+def results(*texts):
+    return [{"id": i + 1, "file_path": f"{i + 1}.md", "content": text} for i, text in enumerate(texts)]
+
+
+def test_lookup_order_memory_table_llm(db, llm):
+    store = CountingStore(db)
+    service = PreviewService(model_id="preview-model", store=store)
+    first = service.get_previews(results("alpha chunk", "beta chunk"), "en")
+    assert first == {1: "[en] alpha chun", 2: "[en] beta chunk"}
+    assert len(llm.calls) == 1 and store.reads == 1
+    # Written once per (chunk, language, content hash)
+    assert {(r["chunk_id"], r["language"], r["model"]) for r in db.tables["chunk_previews"]} == {(1, "en", "preview-model"), (2, "en", "preview-model")}
+
+    # Memory: no table read, no LLM
+    assert service.get_previews(results("alpha chunk", "beta chunk"), "en") == first
+    assert len(llm.calls) == 1 and store.reads == 1
+
+    # Another process (empty memory): one table read, still no LLM
+    other = PreviewService(model_id="preview-model", store=CountingStore(db))
+    assert other.get_previews(results("alpha chunk", "beta chunk"), "en") == first
+    assert other.store.reads == 1 and len(llm.calls) == 1
+    # ...and the table hits are now in memory
+    assert other.get_previews(results("alpha chunk"), "en") == {1: first[1]}
+    assert other.store.reads == 1
+
+
+def test_only_missing_chunks_go_to_the_llm(db, llm):
+    service = PreviewService(model_id="m", store=PreviewStore(db))
+    service.get_previews(results("alpha chunk"), "en")
+    service.get_previews(results("alpha chunk", "beta chunk"), "en")
+    assert llm.calls == [["alpha chunk"], ["beta chunk"]]
+
+
+def test_language_and_content_are_part_of_the_key(db, llm):
+    service = PreviewService(model_id="m", store=PreviewStore(db))
+    service.get_previews(results("alpha chunk"), "en")
+    assert service.get_previews(results("alpha chunk"), "ja") == {1: "[ja] alpha chun"}
+    # Re-ingested chunk with new text
+    assert service.get_previews(results("alpha, revised"), "en") == {1: "[en] alpha, rev"}
+    assert len(llm.calls) == 3
+
+
+def test_fill_known_never_calls_the_llm(db, llm):
+    service = PreviewService(model_id="m", store=PreviewStore(db))
+    service.get_previews(results("alpha chunk"), "en")
+    sources = results("alpha chunk", "beta chunk")
+    sources[1]["translated_preview"] = "kept"
+    service.fill_known(sources, "en")
+    assert [s.get("translated_preview") for s in sources] == ["[en] alpha chun", "kept"]
+
+    unknown = results("gamma chunk")
+    service.fill_known(unknown, "en")
+    assert "translated_preview" not in unknown[0] and len(llm.calls) == 1
+
+
+def test_late_previews_are_applied_when_the_job_finishes(db):
+    sources = results("alpha chunk")
+    job = Future()
+    PreviewService(model_id="m", store=PreviewStore(db)).apply_when_done(job, sources)
+    assert "translated_preview" not in sources[0]
+    job.set_result({1: "late"})
+    assert sources[0]["translated_preview"] == "late"
+
+
+def test_store_ignores_stale_hashes_and_batches(db, monkeypatch):
+    monkeypatch.setattr(store_module, "BULK_BATCH_SIZE", 2)
+    store = PreviewStore(db)
+    store.upsert_many([
+        {"chunk_id": i, "language": "en", "content_hash": content_hash(f"text {i}"), "preview": f"p{i}", "model": "m"}
+        for i in range(5)
+    ])
+    wanted = [(i, content_hash(f"text {i}")) for i in range(4)] + [(4, content_hash("changed"))]
+    assert store.get_many(wanted, "en") == {0: "p0", 1: "p1", 2: "p2", 3: "p3"}
+    assert store.get_many(wanted, "ja") == {}
+    # Upserting the same key replaces the row
+    store.upsert_many([{"chunk_id": 0, "language": "en", "content_hash": content_hash("text 0"), "preview": "new", "model": "m"}])
+    assert store.get_many([(0, content_hash("text 0"))], "en") == {0: "new"}
+    assert len(db.tables["chunk_previews"]) == 5
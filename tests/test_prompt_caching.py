@@ -0,0 +1,147 @@
+"""
+Prompt caching for generate_response, checked against a local stand-in for the
+Anthropic messages API that echoes cache usage the way the real API reports it.
+"""
+
+import json
+import types
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("anthropic")
+
+import modules.llm_client as llm_module
+from modules.llm_client import LLMClient
+from modules.history_compactor import compact_history, update_rolling_summary, start_summary_update, empty_summary_state
+
+
+class EchoUsageMessages:
+    """
+    Minimal messages API: remembers every prefix that ended at a cache_control
+    breakpoint and reports cache reads/writes in `usage` (1 token ~ 4 chars).
+    Like the real API, prefixes shorter than the model's minimum are not cached.
+    """
+
+    def __init__(self, min_tokens: int = 1024):
+        self.min_tokens = min_tokens
+        self.cached_prefixes = set()
+        self.requests = []
+
+    @staticmethod
+    def _blocks(system, messages):
+        blocks = list(system) if isinstance(system, list) else [{"type": "text", "text": system or ""}]
+        for msg in messages:
+            content = msg["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            for block in content:
+                blocks.append(dict(block, role=msg["role"]))
+        return blocks
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        blocks = self._blocks(kwargs.get("system"), kwargs["messages"])
+        keys = [json.dumps({k: v for k, v in b.items() if k != "cache_control"}, sort_keys=True) for b in blocks]
+        sizes = [len(b["text"]) // 4 for b in blocks]
+
+        read = 0
+        for end in range(len(keys), 0, -1):
+            if tuple(keys[:end]) in self.cached_prefixes:
+                read = sum(sizes[:end])
+                break
+
+        breakpoint_end = max((i + 1 for i, b in enumerate(blocks) if "cache_control" in b), default=0)
+        written = 0
+        if breakpoint_end and sum(sizes[:breakpoint_end]) >= self.min_tokens:
+            self.cached_prefixes.add(tuple(keys[:breakpoint_end]))
+            written = max(0, sum(sizes[:breakpoint_end]) - read)
+
+        usage = types.SimpleNamespace(
+            input_tokens=sum(sizes) - read - written,
+            output_tokens=10,
+            cache_creation_input_tokens=written,
+            cache_read_input_tokens=read
+        )
+        text = "<root><answer>ok</answer><previews></previews></root>"
+        return types.SimpleNamespace(content=[types.SimpleNamespace(text=text)], usage=usage)
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.calls = 0
+
+    def summarize_history(self, previous_summary, messages, model_id=None):
+        self.calls += 1
+        return f"Summary {self.calls} of {len(messages)} more messages"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = types.SimpleNamespace(messages=EchoUsageMessages())
+    monkeypatch.setattr(llm_module, "get_anthropic_client", lambda: fake)
+    return LLMClient()
+
+
+CHUNKS = [{"file_path": "data/a.md", "content": "Evidence A " * 50}]
+
+
+def test_short_prefix_gets_no_breakpoint(client):
+    history = [
+        {"role": "user", "content": "What happened on Dec 18?"},
+        {"role": "assistant", "content": "A meeting took place."},
+    ]
+    client.generate_response("Who attended?", CHUNKS, history=history, history_summary="Earlier: Dec 17")
+
+    request = client.client.messages.requests[-1]
+    # Below the minimum cacheable length a breakpoint would be ignored
+    assert all("cache_control" not in b for b in request["system"])
+    assert all("cache_control" not in b for m in request["messages"][:-1] for b in m["content"])
+    # The summary travels with the current turn, after any cached prefix
+    assert len(request["system"]) == 1
+    assert request["messages"][-1]["content"].startswith("Summary of the earlier part")
+
+
+def test_long_history_gets_breakpoint_on_last_message(client):
+    history = [
+        {"role": "user", "content": "What happened on Dec 18? " * 100},
+        {"role": "assistant", "content": "A meeting took place. " * 100},
+    ]
+    client.generate_response("Who attended?", CHUNKS, history=history)
+
+    request = client.client.messages.requests[-1]
+    assert request["messages"][1]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    # The current turn (context + question) is never part of the cached prefix
+    assert isinstance(request["messages"][-1]["content"], str)
+
+
+def test_growing_conversation_reads_cache(client):
+    """Replays a conversation the way app.py builds each turn's history."""
+    messages, state, reads = [], empty_summary_state(), []
+    summarizer = FakeSummarizer()
+    for turn in range(10):
+        question = f"Question {turn}: what did Murakami write? " + "detail " * 150
+        recent, summary = compact_history(messages, state)
+        before = client.usage_totals["cache_read_input_tokens"]
+        client.generate_response(question, CHUNKS, history=recent, history_summary=summary)
+        reads.append(client.usage_totals["cache_read_input_tokens"] > before)
+        messages += [{"role": "user", "content": question}, {"role": "assistant", "content": "Answer " * 150}]
+        state = update_rolling_summary(summarizer, messages, state)
+
+    # Turns 0-1 are below the minimum, turn 2 writes the first prefix;
+    # the window steps (and the prefix is rewritten) on turns 6 and 9
+    assert reads == [False, False, False, True, True, True, False, True, True, False]
+    # One summary call per window step, not per turn
+    assert summarizer.calls == 2
+
+
+def test_summary_update_runs_in_background():
+    summarizer = FakeSummarizer()
+    messages = [{"role": "user", "content": f"m{i}"} for i in range(12)]
+    saved = []
+    assert start_summary_update(summarizer, messages[:6], empty_summary_state()) is None
+
+    future = start_summary_update(summarizer, messages, empty_summary_state(), on_updated=saved.append)
+    messages.append({"role": "user", "content": "next turn"})  # does not affect the job
+    state = future.result(timeout=5)
+    assert state["summary_message_count"] == 6 and saved == [state]
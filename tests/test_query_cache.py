@@ -0,0 +1,26 @@
+"""
+QueryCache (modules/query_cache.py): persistent cache of query rewrites.
+"""
+
+import datetime
+from types import SimpleNamespace
+
+import modules.query_cache as query_cache_module
+from modules.query_cache import QueryCache
+
+
+def test_round_trip(tmp_path):
+    cache = QueryCache(str(tmp_path / "q.sqlite3"))
+    cache.put("optimize_query", "what happened yesterday", [], "model", {"date_filter": "2026-10-18"})
+    assert cache.get("optimize_query", "what happened yesterday ", [], "model") == {"date_filter": "2026-10-18"}
+    assert cache.get("optimize_query", "what happened yesterday", [], "other-model") is None
+
+
+def test_key_changes_with_the_date(tmp_path, monkeypatch):
+    today = [datetime.date(2026, 10, 19)]
+    monkeypatch.setattr(query_cache_module, "datetime", SimpleNamespace(date=SimpleNamespace(today=lambda: today[0])))
+    cache = QueryCache(str(tmp_path / "q.sqlite3"))
+    cache.put("optimize_query", "what happened yesterday", [], "model", {"date_filter": "2026-10-18"})
+    # "yesterday" was resolved against Monday's date; on Tuesday it is a different day
+    today[0] = datetime.date(2026, 10, 20)
+    assert cache.get("optimize_query", "what happened yesterday", [], "model") is None
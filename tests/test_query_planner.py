@@ -0,0 +1,114 @@
+"""
+Local query planning (modules/query_planner.py): which questions skip the LLM
+rewrite, and the keywords/date they are searched with.
+"""
+
+import datetime
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import modules.query_planner as planner_module
+from modules.query_planner import detect_language, extract_keywords, needs_history, plan_query, plan_standard_query
+
+TODAY = datetime.date(2025, 12, 30)
+IDF_TABLE = {
+    "num_docs": 100,
+    "df": {"murakami": 5, "tanaka": 3, "ultimatum": 2, "settlement": 8, "contract": 40, "村上": 4, "契約書": 10}
+}
+HISTORY = [
+    {"role": "user", "content": "Who is Murakami?"},
+    {"role": "assistant", "content": "Murakami is the opposing counsel."}
+]
+
+
+@pytest.fixture(autouse=True)
+def idf_table(monkeypatch):
+    monkeypatch.setattr(planner_module, "load_idf_table", lambda path=None: IDF_TABLE)
+
+
+@pytest.mark.parametrize("text,language", [
+    ("What did Murakami say?", "en"),
+    ("村上さんは何と言いましたか？", "ja"),
+    ("Murakami の契約書について", "ja"),
+    ("What does 契約書 mean?", "en"),  # mostly English
+    ("2025-12-18", "en"),
+    ("", "en"),
+])
+def test_detect_language(text, language):
+    assert detect_language(text) == language
+
+
+@pytest.mark.parametrize("text,keywords", [
+    ("What did Murakami say about the ultimatum?", ["murakami", "ultimatum"]),
+    ("Murakami の契約書について", ["murakami", "契約書"]),
+    ("Show me the meeting emails", []),  # stopwords only
+    ("What did Suzuki say?", []),  # not in the corpus: can't match the keyword search
+])
+def test_extract_keywords(text, keywords):
+    assert extract_keywords(text, IDF_TABLE) == keywords
+
+
+def test_keywords_ranked_by_idf():
+    # "contract" is the most common token and drops out first
+    assert extract_keywords("contract settlement ultimatum Murakami", IDF_TABLE, max_keywords=3) == ["settlement", "ultimatum", "murakami"]
+
+
+def test_keywords_without_table_prefer_long_tokens():
+    assert extract_keywords("Murakami sent the ultimatum", {"num_docs": 0, "df": {}}, max_keywords=1) == ["ultimatum"]
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("What did he say?", True),
+    ("Did they sign it?", True),
+    ("And Tanaka?", True),  # short follow-up
+    ("その後どうなった？", True),
+    ("彼女は何と言った？", True),
+    ("上記のメールについて教えて", True),
+    ("What did Murakami say about the ultimatum?", False),
+    ("What did Murakami say about the settlement on Dec 18?", False),
+])
+def test_needs_history(text, expected):
+    assert needs_history(text, HISTORY) is expected
+
+
+def test_no_history_needed_without_history():
+    assert needs_history("What did he say?", []) is False
+
+
+@pytest.mark.parametrize("text,history,keywords,date_filter", [
+    ("What did Murakami say about the ultimatum?", HISTORY, "murakami ultimatum", None),
+    ("What did Murakami say about the settlement on Dec 18?", None, "2025-12-18 murakami settlement", "2025-12-18"),
+    # Mixed JP/EN: the latin name anchors the search
+    ("Murakami の契約書について", None, "murakami 契約書", None),
+    # Japanese with a date: searchable without translation
+    ("12月18日に村上さんは何と言った？", None, "2025-12-18 村上", "2025-12-18"),
+    # A range is left to search_date, not the keyword search
+    ("Murakami emails from Dec 18 to Dec 20", None, "murakami", "2025-12-18..2025-12-20"),
+])
+def test_planned_locally(text, history, keywords, date_filter):
+    plan = plan_query(text, history, today=TODAY)
+    assert plan["planner"] == "local"
+    assert plan["original"] == text
+    assert plan["original_keywords"] == keywords
+    assert plan["date_filter"] == date_filter
+    assert plan["translated"] is None
+
+
+@pytest.mark.parametrize("text,history", [
+    ("What did he say?", HISTORY),  # follow-up
+    ("And Tanaka?", HISTORY),
+    ("その後どうなった？", HISTORY),
+    ("村上さんは何と言いましたか？", None),  # Japanese without a date or latin anchor: needs translation
+    ("契約書の内容は？", None),
+])
+def test_falls_back_to_the_llm(text, history):
+    assert plan_query(text, history, today=TODAY) is None
+
+
+def test_plan_standard_query():
+    assert plan_standard_query("What happened on Dec 18?", today=TODAY) == {"query": "What happened on Dec 18?", "date_filter": "2025-12-18"}
+    assert plan_standard_query("What happened?", today=TODAY)["date_filter"] is None
+    # Any history may need resolving
+    assert plan_standard_query("What happened on Dec 18?", HISTORY, today=TODAY) is None
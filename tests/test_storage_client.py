@@ -0,0 +1,159 @@
+"""
+Batched, cached signed URLs in StorageClient (against the fake Supabase storage).
+"""
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+import modules.storage_client as storage_module
+from modules.fake_backend import FakeCorpus, FakeLatency, FakeSupabase
+from modules.storage_client import StorageClient
+
+
+class CountingBucket:
+    def __init__(self, bucket, calls, missing):
+        self.bucket = bucket
+        self.calls = calls
+        self.missing = missing
+
+    def create_signed_urls(self, paths, expires_in):
+        self.calls.append(list(paths))
+        signed = self.bucket.create_signed_urls(paths, expires_in)
+        # Like Supabase: per-path errors for objects that don't exist
+        return [{"path": item["path"], "signedURL": None, "error": "Object not found"} if item["path"] in self.missing else item for item in signed]
+
+
+class ListingBucket:
+    def __init__(self, names, listed):
+        self.names = names
+        self.listed = listed
+
+    def list(self, folder):
+        self.listed.append(folder)
+        return [{"name": name} for name in self.names]
+
+
+@pytest.fixture
+def storage(monkeypatch, tmp_path):
+    db = FakeSupabase(FakeCorpus([]), FakeLatency(scale=0))
+    calls, missing = [], set()
+    from_ = db.storage.from_
+    monkeypatch.setattr(db.storage, "from_", lambda bucket: CountingBucket(from_(bucket), calls, missing))
+    monkeypatch.setattr(storage_module, "get_supabase_client", lambda: db)
+    monkeypatch.setattr(storage_module, "STORAGE_MANIFEST_PATH", str(tmp_path / "no_manifest.json"))
+    client = StorageClient()
+    client.calls = calls
+    client.missing = missing
+    return client
+
+
+def test_one_request_for_many_paths(storage):
+    paths = [f"data/emails/pdf/{i}.pdf" for i in range(50)] + ["/data/emails/pdf/0.pdf"]
+    urls = storage.get_signed_urls(paths)
+    assert len(storage.calls) == 1 and len(storage.calls[0]) == 50
+    assert all(urls[p] for p in paths)
+    assert urls["/data/emails/pdf/0.pdf"] == urls["data/emails/pdf/0.pdf"]
+
+
+def test_cached_until_most_of_the_expiry(storage, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(storage_module.time, "monotonic", lambda: now[0])
+    first = storage.get_signed_url("data/a.pdf", expiry_duration=100)
+    now[0] += 79
+    assert storage.get_signed_url("data/a.pdf", expiry_duration=100) == first
+    assert len(storage.calls) == 1
+
+    now[0] += 2  # past 80% of the lifetime: re-signed
+    storage.get_signed_url("data/a.pdf", expiry_duration=100)
+    assert len(storage.calls) == 2
+
+
+def test_batches_are_split(storage, monkeypatch):
+    monkeypatch.setattr(storage_module, "SIGN_BATCH_SIZE", 20)
+    storage.get_signed_urls([f"data/{i}.pdf" for i in range(45)])
+    assert [len(c) for c in storage.calls] == [20, 20, 5]
+
+
+@pytest.fixture
+def manifest_storage(storage, tmp_path, monkeypatch):
+    from modules.storage_manifest import BucketManifest
+    path = tmp_path / "storage_manifest.json"
+    BucketManifest([
+        {"path": "data/emails/pdf/a.pdf", "size": 10, "hash": "x"},
+        {"path": "data/emails/b.md", "size": 20, "hash": "y"},
+        {"path": "data/emails/c.txt", "size": 30, "hash": "z"},
+    ], "2025-12-30T00:00:00+00:00").save(str(path))
+    monkeypatch.setattr(storage_module, "STORAGE_MANIFEST_PATH", str(path))
+    return storage
+
+
+def test_display_links_fall_back_to_the_original(storage):
+    # b.md and c.txt have no PDF rendition (never uploaded, whatever a manifest says)
+    storage.missing.update({"data/emails/pdf/b.pdf"})
+    links = storage.get_display_links(["data/emails/a.md", "data/emails/b.md", "data/emails/c.txt"])
+    assert links["data/emails/a.md"][0] == "data/emails/pdf/a.pdf" and links["data/emails/a.md"][1]
+    assert links["data/emails/b.md"][0] == "data/emails/b.md" and links["data/emails/b.md"][1]
+    assert links["data/emails/c.txt"][0] == "data/emails/c.txt" and links["data/emails/c.txt"][1]
+    # One batch for the PDFs, one for the originals whose PDF failed
+    assert storage.calls == [
+        ["data/emails/c.txt", "data/emails/pdf/a.pdf", "data/emails/pdf/b.pdf"],
+        ["data/emails/b.md"]
+    ]
+
+
+def test_display_links_ignore_a_stale_manifest(manifest_storage):
+    # The manifest (no d.pdf) predates the upload of the PDF
+    links = manifest_storage.get_display_links(["data/emails/d.md"])
+    assert links["data/emails/d.md"][0] == "data/emails/pdf/d.pdf" and links["data/emails/d.md"][1]
+
+
+def test_display_link_missing_everywhere(storage):
+    storage.missing.update({"data/emails/pdf/e.pdf", "data/emails/e.md"})
+    assert storage.get_display_links(["data/emails/e.md"]) == {"data/emails/e.md": ("data/emails/pdf/e.pdf", None)}
+
+
+def test_manifest_exists(manifest_storage):
+    assert manifest_storage.exists("/data/emails/c.txt") is True
+    assert manifest_storage.exists("data/emails/d.md") is False
+
+
+def test_manifest_miss_is_still_signed(manifest_storage):
+    # Uploaded after the manifest was written: the Storage API decides
+    urls = manifest_storage.get_signed_urls(["data/emails/pdf/a.pdf", "data/emails/pdf/new.pdf"])
+    assert urls["data/emails/pdf/a.pdf"] and urls["data/emails/pdf/new.pdf"]
+    assert manifest_storage.calls == [["data/emails/pdf/a.pdf", "data/emails/pdf/new.pdf"]]
+
+
+def test_debug_info_from_the_manifest(manifest_storage, monkeypatch):
+    listed = []
+    monkeypatch.setattr(manifest_storage.client.storage, "from_", lambda bucket: ListingBucket(["a.pdf"], listed))
+    assert manifest_storage.get_debug_info("data/emails/pdf/a.pdf") == "File exists in bucket."
+    info = manifest_storage.get_debug_info("data/emails/pdf/missing.pdf")
+    assert "not found" in info and "a.pdf" in info
+    # Dictionary lookups only
+    assert listed == []
+
+
+def test_debug_info_lists_without_a_manifest(storage, monkeypatch):
+    listed = []
+    monkeypatch.setattr(storage.client.storage, "from_", lambda bucket: ListingBucket(["a.pdf"], listed))
+    assert "not found" in storage.get_debug_info("data/emails/pdf/missing.pdf")
+    assert listed == ["data/emails/pdf"]
+
+
+def test_newer_bucket_manifest_wins(manifest_storage, monkeypatch):
+    from modules.storage_manifest import BucketManifest
+    bucket_copy = BucketManifest([{"path": "data/emails/pdf/new.pdf", "size": 1, "hash": "n"}], "2026-01-05T00:00:00+00:00")
+    monkeypatch.setattr(manifest_storage, "_download_manifest", lambda: bucket_copy)
+    assert manifest_storage.get_manifest() is bucket_copy
+
+
+def test_manifest_from_bucket_listing():
+    from modules.storage_manifest import build_from_bucket
+    db = FakeSupabase(FakeCorpus([]), FakeLatency(scale=0))
+    db.storage_objects.update({"data/emails/pdf/a.pdf", "data/emails/b.md", "top.txt"})
+    manifest = build_from_bucket(db, "evidence-files")
+    assert set(manifest.objects) == {"data/emails/pdf/a.pdf", "data/emails/b.md", "top.txt"}
+    assert manifest.list_folder("data/emails") == ["b.md"]
@@ -0,0 +1,95 @@
+"""
+Span tracing (modules/tracing.py): nesting, trace propagation, percentiles and export.
+"""
+
+import json
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules.tracing import Tracer, current_trace_id, percentile, summarize_durations
+
+
+def test_spans_nest_inside_a_trace():
+    tracer = Tracer(export_path=None)
+    with tracer.trace("chat_turn") as root:
+        trace_id = current_trace_id()
+        with tracer.span("search", query="q") as outer:
+            with tracer.span("search.vector") as inner:
+                inner["attrs"]["results"] = 3
+    assert current_trace_id() is None
+
+    records = tracer.recent(trace_id)
+    # Recorded as they finish: innermost first
+    assert [r["span"] for r in records] == ["search.vector", "search", "chat_turn"]
+    assert {r["trace_id"] for r in records} == {trace_id}
+    assert records[0]["attrs"] == {"results": 3} and outer["attrs"] == {"query": "q"}
+    assert root["duration_ms"] >= outer["duration_ms"] >= inner["duration_ms"] >= 0
+
+
+def test_errors_are_recorded_and_raised():
+    tracer = Tracer(export_path=None)
+    with pytest.raises(ValueError):
+        with tracer.span("llm.generate"):
+            raise ValueError("boom")
+    assert tracer.recent()[0]["error"] == "ValueError('boom')"
+
+
+def test_worker_threads_join_the_trace_via_context():
+    tracer = Tracer(export_path=None)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with tracer.trace("chat_turn"):
+            trace_id = current_trace_id()
+            with_context = pool.submit(contextvars.copy_context().run, current_trace_id).result()
+            without_context = pool.submit(current_trace_id).result()
+    assert with_context == trace_id
+    assert without_context is None
+
+
+@pytest.mark.parametrize("values,pct,expected", [
+    ([], 50, 0.0),
+    ([7.0], 99, 7.0),
+    ([1.0, 2.0], 50, 1.0),
+    ([1.0, 2.0], 51, 2.0),
+    (list(map(float, range(1, 101))), 50, 50.0),
+    (list(map(float, range(1, 101))), 95, 95.0),
+    (list(map(float, range(1, 101))), 99, 99.0),
+    (list(map(float, range(1, 101))), 100, 100.0),
+    (list(map(float, range(1, 11))), 95, 10.0),  # nearest rank rounds up
+])
+def test_percentile(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+def test_summary():
+    summary = summarize_durations([5.0, 1.0, 3.0, 2.0, 4.0])
+    assert summary == {"count": 5, "p50": 3.0, "p95": 5.0, "p99": 5.0, "max": 5.0}
+
+    tracer = Tracer(export_path=None, max_samples=3)
+    for _ in range(5):
+        with tracer.span("a"):
+            pass
+    # Histograms keep the last max_samples durations
+    assert tracer.summary()["a"]["count"] == 3
+
+
+def test_export_is_written_in_the_background(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracer = Tracer(export_path=str(path))
+
+    def work(i):
+        with tracer.trace("turn", n=i):
+            pass
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert tracer.flush(timeout=5)
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert sorted(r["attrs"]["n"] for r in lines) == list(range(20))
+    assert tracer._export_thread.name == "trace-export"